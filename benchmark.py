@@ -0,0 +1,1058 @@
+import argparse
+import asyncio
+import json
+import gc
+import heapq
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from array import array
+import tracemalloc
+from collections import deque
+from itertools import islice
+
+import platform
+
+from dataSet import city_names, cities, generate_dataset, write_dataset
+from main import Flight, FlightManagementSystem, SymbolTable, TicketBook
+from metrics import Metrics
+from service import FlightService
+from test_booking import stress_booking
+from test_graph import build_flight_graph_naive, check_incremental_graph, random_flight
+
+
+#生成指定数量的航班对象
+def make_flights(n, seed=0):
+    random.seed(seed)
+    return [Flight(*line.split()) for line in generate_dataset(n)]
+
+
+#比较新旧建图算法的耗时(两者边集合一致由test_graph.py校验)
+def bench_graph_build(sizes, naive_max):
+    print(f"{'航班数':>8} {'边数':>12} {'旧算法(s)':>10} {'新算法(s)':>10}")
+    for n in sizes:
+        fms = FlightManagementSystem()
+        fms.flights = make_flights(n)
+
+        t0 = time.perf_counter()
+        fms.build_flight_graph()
+        t_new = time.perf_counter() - t0
+        edges = sum(len(v) for v in fms.flight_graph.values())
+
+        t_old = None
+        if n <= naive_max:
+            t0 = time.perf_counter()
+            build_flight_graph_naive(fms.flights)
+            t_old = time.perf_counter() - t0
+
+        old_str = f"{t_old:.3f}" if t_old is not None else "跳过"
+        print(f"{n:>8} {edges:>12} {old_str:>10} {t_new:>10.3f}")
+
+
+#批量增删改：增量维护与每次全量重建的耗时对比
+def bench_incremental(sizes, ops):
+    print(f"{'航班数':>8} {'操作数':>8} {'全量重建(s)':>12} {'增量维护(s)':>12}")
+    for n in sizes:
+        random.seed(1)
+        fms = FlightManagementSystem()
+        fms.flights = make_flights(n)
+        fms.build_flight_graph()
+        t0 = time.perf_counter()
+        check_incremental_graph(fms, ops)
+        t_inc = time.perf_counter() - t0
+
+        fms = FlightManagementSystem()
+        fms.flights = make_flights(n)
+        t0 = time.perf_counter()
+        for i in range(ops):
+            fms.flights.append(random_flight(f"X{i}"))
+            fms.build_flight_graph()
+        t_full = time.perf_counter() - t0
+        print(f"{n:>8} {ops:>8} {t_full:>12.3f} {t_inc:>12.3f}")
+
+
+#两种建图模式的内存占用与查询延迟对比
+def bench_graph_modes(sizes, queries=5):
+    print(f"{'航班数':>8} {'模式':>14} {'建图(s)':>9} {'内存(MB)':>10} {'后继(us)':>10} {'替代航班(ms)':>13}")
+    for n in sizes:
+        flights = make_flights(n)
+        random.seed(2)
+        pairs = [tuple(random.sample(cities, 2)) for _ in range(queries)]
+        for mode in ("materialized", "lazy"):
+            fms = FlightManagementSystem(mode)
+            fms.flights = flights
+            gc.collect()
+            t0 = time.perf_counter()
+            fms.build_flight_graph()
+            t_build = time.perf_counter() - t0
+            #建图的内存单独测量，避免tracemalloc影响计时
+            del fms
+            fms = FlightManagementSystem(mode)
+            fms.flights = flights
+            tracemalloc.start()
+            fms.build_flight_graph()
+            mem = tracemalloc.get_traced_memory()[0] / 2 ** 20
+            tracemalloc.stop()
+
+            t0 = time.perf_counter()
+            for f in flights:
+                fms.successors(f.flight_id)
+            t_succ = (time.perf_counter() - t0) / n * 1e6
+
+            t0 = time.perf_counter()
+            for dep, des in pairs:
+                fms.alternate_flights(dep, des)
+            t_alt = (time.perf_counter() - t0) / queries * 1e3
+            print(f"{n:>8} {mode:>14} {t_build:>9.3f} {mem:>10.1f} {t_succ:>10.1f} {t_alt:>13.1f}")
+
+
+#每个航班对象的内存占用与构造耗时
+def bench_flight_memory(n):
+    random.seed(0)
+    rows = [line.split() for line in generate_dataset(n)]
+    gc.collect()
+    t0 = time.perf_counter()
+    flights = [Flight(*parts) for parts in rows]
+    t_parse = time.perf_counter() - t0
+    del rows
+    #对象本身加上它引用的属性值，被多个航班共享的对象只计一次
+    seen = set()
+    total = 0
+    for f in flights:
+        total += sys.getsizeof(f)
+        for name in Flight.__slots__:
+            v = getattr(f, name)
+            if id(v) not in seen:
+                seen.add(id(v))
+                total += sys.getsizeof(v)
+    print(f"{n} 个航班: 每个航班 {total / n:.0f} 字节, 构造 {t_parse:.2f}s "
+          f"({t_parse / n * 1e6:.2f} us/个)")
+
+
+#构造对象期间新分配的内存(MB)；build返回的对象保持存活直到测量结束
+def traced_mb(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        obj = build()
+        mem = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+    del obj
+    return mem
+
+
+#航班ID编码为整数前后的内存对比：城市有序数组与先后序号(lazy模式下图的全部内容)、
+#materialized模式的邻接表(按边计，航班数取graph_flights)以及持票记录
+#旧结构按原来的布局(ID字符串列表、引用航班属性的时刻列表、字典)从同一份数据重新构造，
+#ID字符串与航班对象两边共用，不计入
+def bench_interning(n_flights, records, per_user=5, graph_flights=20000):
+    fms = FlightManagementSystem("lazy")
+    fms.flights = make_flights(n_flights)
+    fms.build_flight_graph()
+    names, flight_at = fms.flight_ids.names, fms.flight_at
+    print(f"{'结构':>12} {'记录数':>10} {'旧(MB)':>9} {'编码后(MB)':>11} {'字节/条(旧/新)':>15}")
+
+    def row(label, count, old, new):
+        print(f"{label:>12} {count:>10} {old:>9.1f} {new:>11.1f} "
+              f"{old * 2 ** 20 / count:>7.1f}/{new * 2 ** 20 / count:<7.1f}")
+
+    old = traced_mb(lambda: (
+        {city: [flight_at[c].actual_dep_min for c in ids] for city, ids in fms.city_dep_ids.items()},
+        {city: [names[c] for c in ids] for city, ids in fms.city_dep_ids.items()},
+        {city: [flight_at[c].actual_arr_min for c in ids] for city, ids in fms.city_arr_ids.items()},
+        {city: [names[c] for c in ids] for city, ids in fms.city_arr_ids.items()},
+        {f.flight_id: i for i, f in enumerate(fms.flights)}))
+
+    def encoded_graph():
+        table = SymbolTable()
+        for f in fms.flights:
+            table.encode(f.flight_id)
+        return (table, {city: array('q', a) for city, a in fms.city_dep_times.items()},
+                {city: array('i', a) for city, a in fms.city_dep_ids.items()},
+                {city: array('q', a) for city, a in fms.city_arr_times.items()},
+                {city: array('i', a) for city, a in fms.city_arr_ids.items()},
+                array('q', fms.flight_seq), list(fms.flight_at))
+    row("航班图(lazy)", n_flights, old, traced_mb(encoded_graph))
+
+    dense = FlightManagementSystem("materialized")
+    dense.flights = make_flights(graph_flights)
+    dense.build_flight_graph()
+    dense_names = dense.flight_ids.names
+    edges = sum(len(nxt) for nxt in dense.flight_graph.values())
+    old = traced_mb(lambda: {dense_names[c]: [dense_names[n] for n in nxt]
+                             for c, nxt in dense.flight_graph.items()})
+    new = traced_mb(lambda: {c: array('i', nxt) for c, nxt in dense.flight_graph.items()})
+    row("邻接表(边)", edges, old, new)
+    del dense
+
+    #每位用户per_user个航班，航班随机
+    rng = random.Random(24)
+    ids = [f.flight_id for f in fms.flights]
+    users = [f"U{u}" for u in range(records // per_user)]
+    held = [rng.sample(ids, per_user) for _ in users]
+
+    def dict_tickets():
+        user_tickets, flight_holders = {}, {}
+        for uid, fids in zip(users, held):
+            owned = user_tickets[uid] = {}
+            for fid in fids:
+                owned[fid] = 1
+                flight_holders.setdefault(fid, {})[uid] = 1
+        return user_tickets, flight_holders
+
+    def ticket_book():
+        book = TicketBook(fms.flight_ids)
+        for uid, fids in zip(users, held):
+            for fid in fids:
+                book.set(uid, fid, 1)
+        return book
+    n = len(users) * per_user
+    row("持票记录", n, traced_mb(dict_tickets), traced_mb(ticket_book))
+
+    book = ticket_book()
+    sample = [(users[i], held[i][i % per_user])
+              for i in rng.sample(range(len(users)), min(100000, len(users)))]
+    t0 = time.perf_counter()
+    for uid, fid in sample:
+        book.count(uid, fid)
+    t_count = (time.perf_counter() - t0) / len(sample) * 1e6
+    t0 = time.perf_counter()
+    for uid, _ in sample[:10000]:
+        book.flights(uid)
+    t_flights = (time.perf_counter() - t0) / len(sample[:10000]) * 1e6
+    print(f"编码后查询: 持票张数 {t_count:.2f}us, 用户全部持票(解码) {t_flights:.2f}us")
+
+
+#列表扫描与列式存储的查询延迟对比
+def bench_query(sizes, queries=20):
+    print(f"{'航班数':>8} {'列表扫描(ms)':>13} {'列式存储(ms)':>13}")
+    for n in sizes:
+        flights = make_flights(n)
+        plain = FlightManagementSystem("lazy")
+        plain.flights = flights
+        plain.build_flight_graph()
+        columnar = FlightManagementSystem("lazy", use_store=True)
+        if columnar.store is None:
+            return
+        columnar.flights = flights
+        columnar.build_flight_graph()
+        random.seed(4)
+        args = [(random.choice(cities + [None]), random.choice(cities + [None]),
+                 random.random() < 0.5, random.choice(["票价", "出发时间", None]))
+                for _ in range(queries)]
+        timings = []
+        for fms in (plain, columnar):
+            t0 = time.perf_counter()
+            results = [fms.query_flights(*a) for a in args]
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+            if fms is plain:
+                expected = results
+        assert results == expected, "列式存储查询结果与列表扫描不一致"
+        print(f"{n:>8} {timings[0]:>13.2f} {timings[1]:>13.2f}")
+
+
+#界面分页：计数加首页(200行)与生成全部结果行的耗时对比
+def bench_first_page(sizes, queries=20, page=200):
+    print(f"{'航班数':>8} {'全部结果(ms)':>13} {'计数+首页(ms)':>14}")
+    for n in sizes:
+        fms = FlightManagementSystem("lazy")
+        fms.flights = make_flights(n)
+        fms.build_flight_graph()
+        random.seed(6)
+        args = [(random.choice(cities + [None]), None, random.random() < 0.5) for _ in range(queries)]
+        t0 = time.perf_counter()
+        for a in args:
+            [str(f) for f in fms.query_flights(*a, sort_by="票价")]
+        t_all = (time.perf_counter() - t0) / queries * 1e3
+        t0 = time.perf_counter()
+        for a in args:
+            fms.count_flights(*a)
+            [str(f) for f in islice(fms.iter_flights(*a, sort_by="票价"), page)]
+        t_page = (time.perf_counter() - t0) / queries * 1e3
+        print(f"{n:>8} {t_all:>13.2f} {t_page:>14.2f}")
+
+#旧版"最便宜的可售航班"：取出航线的全部航班排序后筛选
+def cheapest_by_sort(fms, dep, des, date=None, n=10):
+    candidates = sorted(fms.route_index.get((dep, des), {}).values(), key=lambda f: f.price)
+    return list(islice((f for f in candidates if f.tickets > 0 and not f.is_cancelled and f.is_for_sale
+                        and (date is None or f.departure_date == date)), n))
+
+
+#最便宜的前N个可售航班：全量排序与增量维护的票价汇总对比(不限日期/指定日期)，并校验结果一致
+#航班的出发日期分布在days天内，航线的航班数随规模增长，每天的航班数保持不变
+#建汇总为首次查询一条航线时建立其汇总的平均耗时，之后的售罄修改由增量维护
+def bench_fares(sizes, queries=200, top=10, days=90):
+    print(f"{'航班数':>8} {'建汇总(ms)':>11} {'排序(ms)':>9} {'汇总(ms)':>9} {'当天排序(ms)':>12} {'当天汇总(ms)':>12}")
+    for n in sizes:
+        fms = FlightManagementSystem("lazy")
+        fms.flights = [Flight(*line.split()) for line in generate_dataset(n, seed=25, days=days)]
+        fms.build_flight_graph()
+        rng = random.Random(25)
+        picks = [rng.choice(fms.flights) for _ in range(queries)]
+        routes = list(dict.fromkeys((f.departure_city, f.destination_city) for f in picks))
+        t0 = time.perf_counter()
+        for dep, des in routes:
+            fms.route_fares(dep, des)
+        t_build = (time.perf_counter() - t0) / len(routes) * 1e3
+        for f in rng.sample(fms.flights, n // 10):  #部分航班售罄
+            fms.update_flight(f.flight_id, tickets=0)
+        timings = []
+        for by_date in (False, True):
+            args = [(f.departure_city, f.destination_city, f.departure_date if by_date else None)
+                    for f in picks]
+            t0 = time.perf_counter()
+            expected = [cheapest_by_sort(fms, *a, top) for a in args]
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+            t0 = time.perf_counter()
+            found = [fms.cheapest_flights(*a, top) for a in args]
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+            assert found == expected, "票价汇总与全量排序的结果不一致"
+        print(f"{n:>8} {t_build:>11.2f} " + " ".join(f"{t:>{w}.3f}" for t, w in zip(timings, (9, 9, 12, 12))))
+
+
+#按航班ID与航线查找：哈希索引与线性扫描的延迟对比
+def bench_lookup(sizes, lookups=200):
+    print(f"{'航班数':>8} {'ID扫描(us)':>11} {'ID索引(us)':>11} {'航线扫描(ms)':>13} {'航线索引(ms)':>13}")
+    for n in sizes:
+        fms = FlightManagementSystem("lazy")
+        fms.flights = make_flights(n)
+        fms.build_flight_graph()
+        random.seed(5)
+        ids = [random.choice(fms.flights).flight_id for _ in range(lookups)]
+        routes = [tuple(random.sample(cities, 2)) for _ in range(lookups // 10)]
+
+        t0 = time.perf_counter()
+        for fid in ids[:20]:
+            next((f for f in fms.flights if f.flight_id == fid), None)
+        t_scan = (time.perf_counter() - t0) / 20 * 1e6
+        t0 = time.perf_counter()
+        for fid in ids:
+            fms.get_flight_by_id(fid)
+        t_index = (time.perf_counter() - t0) / lookups * 1e6
+
+        t0 = time.perf_counter()
+        for dep, des in routes:
+            [f for f in fms.flights if f.departure_city == dep and f.destination_city == des]
+        t_route_scan = (time.perf_counter() - t0) / len(routes) * 1e3
+        t0 = time.perf_counter()
+        for dep, des in routes:
+            fms.query_flights(dep, des)
+        t_route_index = (time.perf_counter() - t0) / len(routes) * 1e3
+        print(f"{n:>8} {t_scan:>11.1f} {t_index:>11.2f} {t_route_scan:>13.3f} {t_route_index:>13.3f}")
+
+
+#读取数据集的吞吐量（行/秒），数据文件由generate_dataset生成
+def bench_load(sizes, workers_list):
+    print(f"{'行数':>10} {'进程数':>6} {'耗时(s)':>9} {'吞吐(行/秒)':>13}")
+    for n in sizes:
+        path = os.path.join(tempfile.gettempdir(), f"flights_{n}.txt")
+        write_dataset(path, n, seed=6)
+        for workers in workers_list:
+            fms = FlightManagementSystem("lazy")
+            gc.collect()
+            t0 = time.perf_counter()
+            fms.read_dataset(path, workers=workers)
+            elapsed = time.perf_counter() - t0
+            print(f"{n:>10} {workers:>6} {elapsed:>9.2f} {n / elapsed:>13.0f}")
+            del fms
+        os.remove(path)
+
+
+#冷启动耗时：新进程中分别从文本和快照加载
+def bench_cold_start(n):
+    text = os.path.join(tempfile.gettempdir(), f"flights_{n}.txt")
+    snap = text + ".snap"
+    write_dataset(text, n, seed=7)
+    fms = FlightManagementSystem("lazy")
+    fms.read_dataset(text)
+    fms.write_snapshot(snap, text)
+    del fms
+    loaders = {
+        "文本": f"fms.read_dataset({text!r})",
+        "快照": f"assert fms.load_snapshot({snap!r}, {text!r})",
+    }
+    for name, stmt in loaders.items():
+        code = f"import main; fms = main.FlightManagementSystem('lazy'); {stmt}"
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(__file__) or ".")
+        print(f"{n} 个航班 {name}冷启动: {time.perf_counter() - t0:.2f}s")
+    print(f"快照大小: {os.path.getsize(snap) / 2 ** 20:.1f}MB, 文本大小: {os.path.getsize(text) / 2 ** 20:.1f}MB")
+    os.remove(text)
+    os.remove(snap)
+
+
+#旧版替代航班BFS（复制路径、全局visited），作为对照
+def alternate_flights_bfs(fms, dep_city, des_city):
+    queue = deque((f.flight_id, [f.flight_id]) for f in fms.flights if f.departure_city == dep_city)
+    visited = set()
+    results = []
+    while queue:
+        fid, path = queue.popleft()
+        if fid in visited:
+            continue
+        visited.add(fid)
+        if fms.flight_map[fid].destination_city == des_city:
+            results.append(path)
+        for nxt in fms.successors(fid):
+            if nxt not in path:
+                queue.append((nxt, path + [nxt]))
+    return results
+
+
+#稠密航线网络：少量城市、一两天内的大量航班
+def make_dense_flights(n, n_cities=8, seed=8):
+    random.seed(seed)
+    pool = cities[:n_cities]
+    flights = []
+    for i in range(n):
+        dep, des = random.sample(pool, 2)
+        start = random.randint(0, 2 * 1440 - 240)
+        end = start + random.randint(45, 180)
+        day = f"2024010{1 + start // 1440}"
+        flights.append(Flight(f"D{i}", dep, des, "None", day,
+                              f"{start % 1440 // 60:02d}:{start % 60:02d}",
+                              f"{end % 1440 // 60:02d}:{end % 60:02d}",
+                              random.randint(200, 1000), random.randint(50, 200), 0, 0, 0, 1))
+    return flights
+
+
+#稠密网络上的行程搜索延迟
+def bench_route_search(sizes, queries=5):
+    print(f"{'航班数':>8} {'旧BFS(ms)':>10} {'按航段(ms)':>11} {'时长前10(ms)':>13} {'票价前10(ms)':>13}")
+    for n in sizes:
+        fms = FlightManagementSystem("lazy")
+        fms.flights = make_dense_flights(n)
+        fms.build_flight_graph()
+        pairs = [tuple(random.sample(cities[:8], 2)) for _ in range(queries)]
+        cases = [
+            lambda d, a: alternate_flights_bfs(fms, d, a),
+            lambda d, a: fms.search_routes(d, a, max_legs=3, min_layover=30, max_layover=240),
+            lambda d, a: fms.search_routes(d, a, max_legs=3, limit=10, rank_by="time"),
+            lambda d, a: fms.search_routes(d, a, max_legs=3, limit=10, rank_by="price"),
+        ]
+        timings = []
+        for case in cases:
+            t0 = time.perf_counter()
+            for dep, des in pairs:
+                case(dep, des)
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+        print(f"{n:>8} {timings[0]:>10.1f} {timings[1]:>11.1f} {timings[2]:>13.1f} {timings[3]:>13.1f}")
+
+
+def bench_connection_scan(sizes, queries=5):
+    print(f"{'航班数':>8} {'旧BFS(ms)':>10} {'时长前1(ms)':>12} {'建表(ms)':>9} {'最早到达(ms)':>13} {'帕累托(ms)':>11}")
+    for n in sizes:
+        fms = FlightManagementSystem("lazy")
+        fms.flights = make_dense_flights(n)
+        fms.build_flight_graph()
+        pairs = [tuple(random.sample(cities[:8], 2)) for _ in range(queries)]
+        t0 = time.perf_counter()
+        fms._connection_table()
+        table_ms = (time.perf_counter() - t0) * 1e3
+        cases = [
+            lambda d, a: alternate_flights_bfs(fms, d, a),
+            lambda d, a: fms.search_routes(d, a, max_legs=3, limit=1, rank_by="time"),
+            lambda d, a: fms.earliest_arrival(d, a),
+            lambda d, a: fms.profile_routes(d, a),
+        ]
+        timings = []
+        for case in cases:
+            t0 = time.perf_counter()
+            for dep, des in pairs:
+                case(dep, des)
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+        print(f"{n:>8} {timings[0]:>10.1f} {timings[1]:>12.1f} {table_ms:>9.1f} "
+              f"{timings[2]:>13.2f} {timings[3]:>11.1f}")
+
+
+def bench_route_cache(sizes, queries=200, pairs=10, change_every=20):
+    print(f"{'航班数':>8} {'无缓存(ms)':>11} {'有缓存(ms)':>11} {'命中率':>7} {'失效条目':>9}")
+    for n in sizes:
+        rng = random.Random(n)
+        flights = make_dense_flights(n)
+        plan = [tuple(rng.sample(cities[:8], 2)) for _ in range(pairs)]
+        workload = [rng.choice(plan) for _ in range(queries)]
+        timings = []
+        for size in (0, 256):
+            fms = FlightManagementSystem("lazy", route_cache_size=size)
+            fms.flights = list(flights)
+            fms.build_flight_graph()
+            delays = random.Random(0)
+            t0 = time.perf_counter()
+            for i, (dep, des) in enumerate(workload):
+                fms.alternate_flights(dep, des, min_layover=30, max_layover=240, limit=20)
+                if i % change_every == change_every - 1:
+                    fms.delay_flight(delays.choice(flights).flight_id, 30)
+            timings.append((time.perf_counter() - t0) / queries * 1e3)
+        stats = fms.route_cache.stats()
+        rate = stats["hits"] / max(1, stats["hits"] + stats["misses"])
+        print(f"{n:>8} {timings[0]:>11.2f} {timings[1]:>11.2f} {rate:>7.0%} {stats['invalidations']:>9}")
+
+
+#旧版取消退票：遍历全部用户的购票记录找出持票人（只查找不删除，以免破坏反向索引）
+def canceled_flight_scan(fms, flight_id):
+    sign = []
+    for user_id, flight_dict in fms.tickets.items():
+        if flight_id in flight_dict:
+            sign.append((user_id, flight_dict[flight_id]))
+    return sign
+
+
+def bench_cancellation(users, n_flights=20000, per_user=3, cancels=20):
+    fms = FlightManagementSystem("lazy")
+    fms.flights = make_flights(n_flights)
+    fms.build_flight_graph()
+    rng = random.Random(12)
+    ids = list(fms.flight_map)
+    t0 = time.perf_counter()
+    for u in range(users):
+        for fid in rng.sample(ids, per_user):
+            fms._add_tickets(f"U{u}", fid, 1)
+    print(f"{users} 个用户、每人 {per_user} 个航班: 登记购票 {time.perf_counter() - t0:.1f}s")
+
+    victims = rng.sample(ids, cancels * 2)
+    t0 = time.perf_counter()
+    for fid in victims[:cancels]:
+        canceled_flight_scan(fms, fid)
+    scan_ms = (time.perf_counter() - t0) / cancels * 1e3
+    t0 = time.perf_counter()
+    for fid in victims[cancels:]:
+        fms.cancel_flight(fid)
+    index_ms = (time.perf_counter() - t0) / cancels * 1e3
+    print(f"每次取消: 遍历用户 {scan_ms:.1f}ms, 反向索引 {index_ms:.3f}ms")
+
+    city = rng.choice(cities)
+    batch = [fid for fid, f in fms.flight_map.items()
+             if city in (f.departure_city, f.destination_city) and not f.is_cancelled]
+    t0 = time.perf_counter()
+    report = fms.cancel_flights(batch)
+    print(f"取消{city}全部 {len(batch)} 个航班: {(time.perf_counter() - t0) * 1e3:.1f}ms, "
+          f"退票用户 {len(report['refunds'])} 位")
+
+
+#旧版抢票：所有航班共用一个堆，逐条出堆
+def do_priority_queue_global(fms, heap):
+    results = []
+    while heap:
+        priority, user_id, flight_id, qty = heapq.heappop(heap)
+        flt = fms.get_flight_by_id(flight_id)
+        if (not flt) or flt.is_cancelled or not flt.is_for_sale or flt.tickets < qty:
+            results.append((user_id, flight_id, qty, False))
+            continue
+        flt.tickets -= qty
+        fms._add_tickets(user_id, flight_id, qty)
+        results.append((user_id, flight_id, qty, True))
+    return results
+
+
+def bench_reservations(n, n_flights=2000, hot=20):
+    rng = random.Random(13)
+    flights = make_flights(n_flights)
+    ids = [f.flight_id for f in flights]
+    #一半的预约集中在少数热门航班上
+    requests = [(rng.randint(0, 9), f"U{i}", rng.choice(ids[:hot]) if i % 2 else rng.choice(ids),
+                 rng.randint(1, 3)) for i in range(n)]
+    timings = []
+    for per_flight in (False, True):
+        fms = FlightManagementSystem("lazy")
+        fms.flights = make_flights(n_flights)
+        fms.build_flight_graph()
+        t0 = time.perf_counter()
+        if per_flight:
+            for p, uid, fid, q in requests:
+                fms.reserve_ticket(uid, fid, p, q)
+            results = fms.do_priority_queue()
+        else:
+            heap = []
+            for p, uid, fid, q in requests:
+                heapq.heappush(heap, (p, uid, fid, q))
+            results = do_priority_queue_global(fms, heap)
+        timings.append(time.perf_counter() - t0)
+    print(f"{n} 条预约: 全局堆 {timings[0]:.2f}s, 按航班分队 {timings[1]:.2f}s, "
+          f"成功 {sum(r[3] for r in results)} 条")
+
+
+def bench_booking(thread_counts, ops=100000):
+    print(f"{'线程数':>6} {'购票/退票(次/秒)':>16}")
+    for n in thread_counts:
+        elapsed = stress_booking(n, ops, n_flights=2000, n_users=20000, tickets=1000)
+        print(f"{n:>6} {ops / elapsed:>16.0f}")
+
+
+#预写日志对购票吞吐量的影响：关闭、每个事务fsync、合并fsync
+def bench_wal(thread_counts, ops=4000, n_flights=2000):
+    print(f"{'线程数':>6} {'关闭(次/秒)':>12} {'每次fsync':>10} {'合并fsync':>10} {'恢复(ms)':>9}")
+    for n in thread_counts:
+        rates = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for sync in ("off", "always", "group"):
+                fms = FlightManagementSystem("lazy")
+                fms.flights = make_flights(n_flights)
+                fms.build_flight_graph()
+                path = os.path.join(tmp, f"{sync}.wal")
+                if sync != "off":
+                    fms.open_wal(path, ["bench"], sync, os.path.join(tmp, "bench.snap"),
+                                 compact_every=10 ** 9)
+                ids = list(fms.flight_map)
+
+                def worker(seed):
+                    rng = random.Random(seed)
+                    for _ in range(ops // n):
+                        fms.buy_ticket(f"U{rng.randrange(5000)}", rng.choice(ids), 1)
+
+                threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+                t0 = time.perf_counter()
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                rates.append(ops / (time.perf_counter() - t0))
+                fms.close_wal()
+            replay = FlightManagementSystem("lazy")
+            replay.flights = make_flights(n_flights)
+            replay.build_flight_graph()
+            t0 = time.perf_counter()
+            replay.open_wal(path, ["bench"], "none")
+            replay_ms = (time.perf_counter() - t0) * 1e3
+            replay.close_wal()
+        print(f"{n:>6} {rates[0]:>12.0f} {rates[1]:>10.0f} {rates[2]:>10.0f} {replay_ms:>9.1f}")
+
+
+#恶劣天气：枢纽城市一天内的全部航班延误或取消，逐个调用与批量接口的耗时对比(materialized模式，日志每次fsync)
+#用户各购买一组可衔接的两程航班，批量接口同时报告被打断的行程
+def bench_disruption(n_flights=20000, users=20000):
+    path = os.path.join(tempfile.gettempdir(), "flights_disruption.txt")
+    write_dataset(path, n_flights, num_cities=20, seed=23, hub_skew=1.0, days=max(1, n_flights // 2000))
+    print(f"{'操作':>6} {'方式':>6} {'航班数':>6} {'耗时(s)':>9} {'断开衔接':>8} {'断开行程':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for op in ("delay", "cancel"):
+            for bulk in (False, True):
+                fms = FlightManagementSystem("materialized")
+                fms.read_dataset(path)
+                fms.open_wal(os.path.join(tmp, f"{op}{bulk}.wal"), ["bench"], "always",
+                             os.path.join(tmp, "bench.snap"), compact_every=10 ** 9)
+                rng = random.Random(23)
+                for i in range(users):
+                    first = rng.choice(fms.flights)
+                    nxt = fms.layover_window(first, 30, 240)
+                    if nxt and fms.buy_ticket(f"U{i}", first.flight_id, 1)[0]:
+                        fms.buy_ticket(f"U{i}", fms.flight_ids.names[rng.choice(nxt)], 1)
+                hub = max(fms.dep_index, key=lambda city: len(fms.dep_index[city]))
+                day = fms.flights[0].departure_date
+                selection = dict(city=hub, date_from=day, date_to=day)
+                t0 = time.perf_counter()
+                if bulk:
+                    if op == "delay":
+                        report = fms.delay_flights(180, **selection)
+                    else:
+                        report = fms.cancel_flights(**selection)
+                    count = len(report.get("delayed") or report["cancelled"])
+                    connections, broken = len(report["connections"]), len(report["broken"])
+                else:
+                    flights, _ = fms.select_flights(**selection)
+                    for flt in flights:
+                        if op == "delay":
+                            fms.delay_flight(flt.flight_id, 180)
+                        else:
+                            fms.cancel_flight(flt.flight_id)
+                    count, connections, broken = len(flights), "-", "-"
+                elapsed = time.perf_counter() - t0
+                fms.close_wal()
+                print(f"{op:>6} {'批量' if bulk else '逐个':>6} {count:>6} {elapsed:>9.3f} {connections:>8} {broken:>8}")
+    os.remove(path)
+
+
+#本地压测：在同一事件循环中启动服务和clients个连接，按比例发送查询/购票/退票/行程请求
+async def run_service_load(fms, clients, requests_per_client):
+    service = FlightService(fms)
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    ids = list(fms.flight_map)
+    latencies = {}
+
+    async def client(seed):
+        rng = random.Random(seed)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(requests_per_client):
+            r = rng.random()
+            uid = f"U{rng.randrange(1000)}"
+            if r < 0.6:
+                dep, des = rng.sample(cities, 2)
+                req = {"op": "query", "dep": dep, "des": des, "limit": 20}
+            elif r < 0.8:
+                req = {"op": "buy", "user_id": uid, "flight_id": rng.choice(ids), "quantity": 1}
+            elif r < 0.9:
+                req = {"op": "refund", "user_id": uid, "flight_id": rng.choice(ids), "quantity": 1}
+            else:
+                dep, des = rng.sample(cities, 2)
+                req = {"op": "routes", "dep": dep, "des": des, "mode": "earliest"}
+            t0 = time.perf_counter()
+            writer.write(json.dumps(req).encode("utf-8") + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            assert response["ok"], response
+            latencies.setdefault(req["op"], []).append(time.perf_counter() - t0)
+        writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - t0
+    await service.close()
+    return latencies, elapsed
+
+
+def bench_service(n_flights=20000, clients_list=(1, 8, 32), requests_per_client=500, wal="off"):
+    fms = FlightManagementSystem("lazy")
+    fms.flights = make_flights(n_flights)
+    fms.build_flight_graph()
+    tmp = tempfile.TemporaryDirectory()
+    if wal != "off":
+        fms.open_wal(os.path.join(tmp.name, "service.wal"), ["bench"], wal,
+                     os.path.join(tmp.name, "service.snap"), compact_every=10 ** 9)
+    print(f"预写日志: {wal}")
+    print(f"{'连接数':>6} {'请求/秒':>8} {'操作':>8} {'p50(ms)':>8} {'p99(ms)':>8}")
+    for clients in clients_list:
+        latencies, elapsed = asyncio.run(run_service_load(fms, clients, requests_per_client))
+        total = sum(len(v) for v in latencies.values())
+        print(f"{clients:>6} {total / elapsed:>8.0f}")
+        for op, values in sorted(latencies.items()):
+            values.sort()
+            p50 = values[len(values) // 2] * 1e3
+            p99 = values[min(len(values) - 1, int(len(values) * 0.99))] * 1e3
+            print(f"{'':>15} {op:>8} {p50:>8.2f} {p99:>8.2f}")
+    fms.close_wal()
+    tmp.cleanup()
+
+
+#内存与SQLite存储对比：建立(含批量写入数据库)、航线查询延迟、购票/退票吞吐量
+#从数据库冷启动的时间，以及两种存储的查询结果一致性
+def bench_storage(sizes, queries=50, ops=20000):
+    print(f"{'航班数':>8} {'存储':>6} {'建立(s)':>8} {'查询(ms)':>9} {'购票/退票(次/秒)':>16} {'冷启动(s)':>9}")
+    for n in sizes:
+        flights = make_flights(n)
+        random.seed(11)
+        args = [(random.choice(cities), random.choice(cities + [None]),
+                 random.random() < 0.5, random.choice(["票价", "出发时间", None]))
+                for _ in range(queries)]
+        picks = [random.randrange(n) for _ in range(ops)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "flights.db")
+            expected = None
+            for name, db_path in (("内存", None), ("SQLite", path)):
+                fms = FlightManagementSystem("lazy", db_path=db_path)
+                fms.flights = [Flight.restore(f.flight_id, f.departure_city, f.destination_city,
+                                              f.stop_over, f.departure_date, f.departure_time,
+                                              f.arrival_time, f.dep_min, f.arr_min, f.price,
+                                              f.tickets, f.is_delay, f.delay_time,
+                                              f.is_cancelled, f.is_for_sale) for f in flights]
+                t0 = time.perf_counter()
+                fms.build_flight_graph()
+                t_build = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                results = [[f.flight_id for f in fms.query_flights(*a)] for a in args]
+                t_query = (time.perf_counter() - t0) / queries * 1e3
+                if expected is None:
+                    expected = results
+                assert results == expected, "SQLite存储查询结果与内存不一致"
+
+                t0 = time.perf_counter()
+                for i, k in enumerate(picks):
+                    fid = fms.flights[k].flight_id
+                    if fms.buy_ticket(f"u{i % 1000}", fid, 1)[0]:
+                        fms.refund_ticket(f"u{i % 1000}", fid, 1)
+                t_ops = time.perf_counter() - t0
+
+                t_cold = float("nan")
+                if db_path:
+                    fms.store.close()
+                    cold = FlightManagementSystem("lazy", db_path=db_path)
+                    t0 = time.perf_counter()
+                    cold.load_storage()
+                    t_cold = time.perf_counter() - t0
+                    cold.store.close()
+                print(f"{n:>8} {name:>6} {t_build:>8.2f} {t_query:>9.2f} {ops / t_ops:>16.0f} "
+                      f"{t_cold:>9.2f}")
+            del fms, flights
+            gc.collect()
+
+
+#性能统计的开销：未挂载、挂载计时、挂载计时+cProfile、卸载后的购票/退票与查询吞吐量
+def bench_metrics(n_flights=20000, ops=50000):
+    fms = FlightManagementSystem("lazy")
+    fms.flights = make_flights(n_flights)
+    fms.build_flight_graph()
+    random.seed(12)
+    picks = [fms.flights[random.randrange(n_flights)].flight_id for _ in range(ops)]
+    routes = [(random.choice(cities), random.choice(cities)) for _ in range(ops // 100)]
+
+    def run():
+        t0 = time.perf_counter()
+        for i, fid in enumerate(picks):
+            if fms.buy_ticket(f"u{i % 1000}", fid, 1)[0]:
+                fms.refund_ticket(f"u{i % 1000}", fid, 1)
+        for dep, des in routes:
+            fms.query_flights(dep, des)
+        return ops / (time.perf_counter() - t0)
+
+    print(f"{'统计方式':>10} {'操作/秒':>10}")
+    print(f"{'未挂载':>10} {run():>10.0f}")
+    for name, profile in (("计时", False), ("计时+剖析", True)):
+        metrics = Metrics(profile=profile).attach(fms)
+        print(f"{name:>10} {run():>10.0f}")
+        metrics.detach()
+    print(f"{'卸载后':>10} {run():>10.0f}")
+
+
+#多核扩展性：按城市分片建图与批量替代航班搜索在1..N个进程下的耗时，结果与单进程逐一核对
+#批量搜索模拟枢纽停航：取消最大枢纽的全部航班，再为所有经过它的航线重新推荐
+def bench_parallel(n, workers_list):
+    path = os.path.join(tempfile.gettempdir(), f"flights_parallel_{n}.txt")
+    write_dataset(path, n, num_cities=40, seed=22, hub_skew=1.0, days=max(1, n // 2000))
+    fms = FlightManagementSystem("lazy")
+    fms.read_dataset(path)
+    os.remove(path)
+    expected = (fms.city_dep_ids, fms.city_arr_ids)
+    print(f"{'航班数':>8} {'进程数':>6} {'建图(s)':>9} {'加速比':>7}")
+    base = None
+    for workers in workers_list:
+        gc.collect()
+        t0 = time.perf_counter()
+        fms.build_flight_graph(workers=workers)
+        elapsed = time.perf_counter() - t0
+        assert (fms.city_dep_ids, fms.city_arr_ids) == expected
+        base = base or elapsed
+        print(f"{n:>8} {workers:>6} {elapsed:>9.2f} {base / elapsed:>7.2f}")
+
+    hub = max(fms.dep_index, key=lambda city: len(fms.dep_index[city]))
+    fms.cancel_flights(list(fms.dep_index[hub]))
+    pairs = [route for route in fms.route_index if hub in route]
+    options = dict(max_legs=3, max_layover=720, limit=20, rank_by="time")
+    print(f"枢纽 {hub} 停航，重新推荐 {len(pairs)} 条航线")
+    print(f"{'进程数':>6} {'搜索(s)':>9} {'加速比':>7}")
+    base = expected = None
+    for workers in workers_list:
+        fms.route_cache.clear()
+        t0 = time.perf_counter()
+        found = fms.alternate_flights_batch(pairs, workers=workers, **options)
+        elapsed = time.perf_counter() - t0
+        expected = expected or found
+        assert found == expected
+        base = base or elapsed
+        print(f"{workers:>6} {elapsed:>9.2f} {base / elapsed:>7.2f}")
+
+
+#基准测试套件：每个用例在不同规模的合成数据上重复执行若干轮，记录最小和中位耗时，
+#结果可保存为基线JSON，之后与基线比较，最小耗时变慢超过阈值的用例视为性能回退
+#用例函数接收(规模, 数据文件路径)，完成准备工作后返回被计时的无参函数
+SUITE = {}
+
+
+def suite_case(name):
+    def register(func):
+        SUITE[name] = func
+        return func
+    return register
+
+
+#套件使用的合成数据：40个城市、枢纽倾斜、分布在多天并含红眼航班
+def suite_dataset(path, n):
+    write_dataset(path, n, num_cities=40, seed=21, hub_skew=1.0, days=max(1, n // 2000),
+                  overnight=0.05)
+
+
+def suite_system(path, **options):
+    fms = FlightManagementSystem("lazy", **options)
+    fms.read_dataset(path)
+    return fms
+
+
+@suite_case("load")
+def case_load(n, path):
+    return lambda: FlightManagementSystem("lazy").read_dataset(path)
+
+
+@suite_case("graph_build")
+def case_graph_build(n, path):
+    fms = suite_system(path)
+    return fms.build_flight_graph
+
+
+@suite_case("query")
+def case_query(n, path):
+    fms = suite_system(path)
+    rng = random.Random(22)
+    names = city_names(40)
+    args = [(rng.choice(names), rng.choice(names + [None]), rng.random() < 0.5,
+             rng.choice(["票价", "出发时间", None])) for _ in range(50)]
+
+    def run():
+        for a in args:
+            fms.query_flights(*a)
+    return run
+
+
+@suite_case("booking")
+def case_booking(n, path):
+    fms = suite_system(path)
+    rng = random.Random(23)
+    picks = [(f"u{i % 500}", rng.choice(fms.flights).flight_id) for i in range(2000)]
+
+    #每次购票后立即退票，各轮的初始状态相同
+    def run():
+        for uid, fid in picks:
+            if fms.buy_ticket(uid, fid, 1)[0]:
+                fms.refund_ticket(uid, fid, 1)
+    return run
+
+
+@suite_case("route_search")
+def case_route_search(n, path):
+    fms = suite_system(path, route_cache_size=0)  #不缓存，每轮都完整搜索
+    rng = random.Random(24)
+    names = city_names(40)
+    pairs = [tuple(rng.sample(names, 2)) for _ in range(5)]
+
+    def run():
+        for dep, des in pairs:
+            fms.alternate_flights(dep, des, max_legs=3, max_layover=720, limit=20, rank_by="time")
+            fms.earliest_arrival(dep, des)
+    return run
+
+
+def run_suite(sizes, rounds=5, cases=None):
+    results = {}
+    print(f"{'用例':<24} {'最小(ms)':>10} {'中位(ms)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"suite_{n}.txt")
+            suite_dataset(path, n)
+            for name, case in SUITE.items():
+                if cases and name not in cases:
+                    continue
+                func = case(n, path)
+                func()  #预热
+                timings = []
+                for _ in range(rounds):
+                    gc.collect()
+                    t0 = time.perf_counter()
+                    func()
+                    timings.append(time.perf_counter() - t0)
+                del func
+                timings.sort()
+                key = f"{name}[{n}]"
+                results[key] = {"min": timings[0], "median": timings[len(timings) // 2],
+                                "rounds": rounds}
+                print(f"{key:<24} {timings[0] * 1e3:>10.2f} {results[key]['median'] * 1e3:>10.2f}")
+    return results
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                   "results": results}, f, ensure_ascii=False, indent=2)
+
+
+#与基线比较最小耗时(受机器负载干扰最小)，返回慢于基线(1 + threshold)倍的用例
+def compare_baseline(path, results, threshold=0.2):
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"{'用例':<24} {'基线(ms)':>10} {'本次(ms)':>10} {'比值':>7}")
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = res["min"] / base["min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = " 回退"
+        print(f"{key:<24} {base['min'] * 1e3:>10.2f} {res['min'] * 1e3:>10.2f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="航班管理系统性能测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--naive-max", type=int, default=2000,
+                        help="超过该航班数时跳过旧版建图(O(N²))")
+    parser.add_argument("--ops", type=int, default=200, help="增删改操作次数")
+    parser.add_argument("--route-sizes", type=int, nargs="+", default=[1000, 5000, 20000],
+                        help="行程搜索测试的稠密网络航班数")
+    parser.add_argument("--memory-records", type=int, default=1000000, help="内存测试的航班数")
+    parser.add_argument("--ticket-records", type=int, default=10000000,
+                        help="编码内存测试的持票记录数(航班数同--memory-records)")
+    parser.add_argument("--intern", action="store_true", help="只运行航班/用户ID编码的内存测试")
+    parser.add_argument("--users", type=int, default=1000000, help="取消退票测试的用户数")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="并发购票测试的线程数")
+    parser.add_argument("--load-sizes", type=int, nargs="+", default=[1000000, 10000000],
+                        help="读取数据集测试的行数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                        help="读取数据集测试的解析进程数")
+    parser.add_argument("--storage-sizes", type=int, nargs="+", default=[10000, 1000000],
+                        help="内存与SQLite存储对比测试的航班数")
+    parser.add_argument("--parallel-size", type=int, default=200000, help="多核扩展性测试的航班数")
+    parser.add_argument("--parallel-workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="多核扩展性测试的进程数")
+    parser.add_argument("--parallel", action="store_true", help="只运行多核扩展性测试")
+    parser.add_argument("--suite", action="store_true", help="只运行基准测试套件")
+    parser.add_argument("--suite-sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="基准测试套件的航班数")
+    parser.add_argument("--cases", nargs="+", choices=sorted(SUITE), help="只运行指定的套件用例")
+    parser.add_argument("--rounds", type=int, default=5, help="套件中每个用例的计时轮数")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把套件结果保存为基线")
+    parser.add_argument("--compare", metavar="PATH", help="与基线比较，有回退时以状态码1退出")
+    parser.add_argument("--threshold", type=float, default=0.2, help="最小耗时超过基线的比例阈值")
+    args = parser.parse_args()
+    if args.suite or args.cases or args.save_baseline or args.compare:
+        results = run_suite(args.suite_sizes, args.rounds, args.cases)
+        if args.save_baseline:
+            save_baseline(args.save_baseline, results)
+        if args.compare and compare_baseline(args.compare, results, args.threshold):
+            sys.exit(1)
+        return
+    if args.parallel:
+        bench_parallel(args.parallel_size, args.parallel_workers)
+        return
+    if args.intern:
+        bench_interning(args.memory_records, args.ticket_records)
+        return
+    bench_flight_memory(args.memory_records)
+    bench_interning(args.memory_records, args.ticket_records)
+    bench_graph_build(args.sizes, args.naive_max)
+    bench_incremental(args.sizes, args.ops)
+    bench_graph_modes(args.sizes)
+    bench_query(args.sizes)
+    bench_first_page(args.sizes)
+    bench_fares(args.sizes)
+    bench_lookup(args.sizes)
+    bench_route_search(args.route_sizes)
+    bench_connection_scan(args.route_sizes)
+    bench_route_cache(args.route_sizes)
+    bench_cancellation(args.users)
+    bench_reservations(args.users)
+    for n in args.threads:
+        stress_booking(n)
+    print("并发购票压力测试通过: 无超卖，余票守恒")
+    bench_booking(args.threads)
+    bench_wal(args.threads)
+    bench_disruption()
+    bench_service()
+    bench_service(wal="group")
+    bench_storage(args.storage_sizes)
+    bench_metrics()
+    bench_load(args.load_sizes, args.workers)
+    bench_parallel(args.parallel_size, args.parallel_workers)
+    bench_cold_start(args.memory_records)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
+import argparse
 import random
 import datetime
+import sys
+from bisect import bisect_right
+from itertools import accumulate
 
 #城市列表
 cities = [
@@ -8,39 +12,130 @@ cities = [
     "Dalian", "Harbin", "Changchun", "Shenyang", "Tianjin"
 ]
 
-#航班数据生成函数
-def generate_dataset(num_flights=300):
-    flights = []
-    start_time = datetime.datetime(2024, 1, 1, 6, 0)
+#一天中各分钟对应的"HH:MM"，避免逐行调用strftime
+CLOCK = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+
+#城市数超过内置列表时补充编号城市
+def city_names(num_cities):
+    if num_cities < 2:
+        raise ValueError("至少需要2个城市")
+    return cities[:num_cities] + [f"City{i:03d}" for i in range(len(cities) + 1, num_cities + 1)]
+
+#逐行产出航班数据，可直接写入文件而不在内存中保存全部航班
+#num_cities: 城市数；seed: 随机种子，None时使用random模块的全局状态
+#hub_skew: 枢纽倾斜度，第k个城市被选为出发/到达城市的权重为1/k^hub_skew，0为均匀分布
+#days: 航班均匀分布在从start_date起的days天内、06:00至23:55随机出发；None时沿用原来的时间线
+#  (每天10个航班，出发时刻依次推后30~120分钟)
+#overnight: days给出时红眼航班的比例，这些航班22:00以后出发、次日到达
+def generate_flights(num_flights=300, num_cities=20, seed=None, hub_skew=0.0, days=None,
+                     overnight=0.0, start_date=datetime.date(2024, 1, 1)):
+    rng = random if seed is None else random.Random(seed)
+    names = city_names(num_cities)
+    dates = {}
+
+    def date_str(day):
+        s = dates.get(day)
+        if s is None:
+            s = dates[day] = (start_date + datetime.timedelta(days=day)).strftime("%Y%m%d")
+        return s
+
+    if hub_skew:
+        cum_weights = list(accumulate(1 / k ** hub_skew for k in range(1, num_cities + 1)))
+        total = cum_weights[-1]
+
+        def pick_city(exclude=None):
+            while True:
+                city = names[bisect_right(cum_weights, rng.random() * total)]
+                if city != exclude:
+                    return city
+    else:
+        def pick_city(exclude=None):
+            if exclude is None:
+                return rng.choice(names)
+            return rng.choice([city for city in names if city != exclude])
+
+    clock = 6 * 60  #原时间线的出发时刻(距第一天0点的分钟数)
     for i in range(1, num_flights + 1):
         flightID = f"G{1000 + i}"
-        departureCity = random.choice(cities)
-        destinationCity = random.choice([city for city in cities if city != departureCity])
+        departureCity = pick_city()
+        destinationCity = pick_city(departureCity)
         stopover = "None"
-        departureDate = (datetime.date(2024, 1, 1) + datetime.timedelta(days=(i // 10))).strftime("%Y%m%d")
 
-        #departureTime按升序排列
-        departureTime = start_time.strftime("%H:%M")
-        duration = random.randint(45, 180)
-        arrivalTime = (start_time + datetime.timedelta(minutes=duration)).strftime("%H:%M")
+        if days is None:
+            departureDate = date_str(i // 10)
+            #departureTime按升序排列
+            departure = clock % 1440
+            duration = rng.randint(45, 180)
+            clock += rng.randint(30, 120)  #更新下一次的出发时间
+        elif overnight and rng.random() < overnight:
+            departureDate = date_str(rng.randrange(days))
+            departure = rng.randrange(22 * 60, 24 * 60, 5)
+            duration = rng.randint(max(60, 24 * 60 - departure + 30), 24 * 60 - departure + 360)
+        else:
+            departureDate = date_str(rng.randrange(days))
+            duration = rng.randint(45, 180)
+            departure = rng.randrange(6 * 60, min(24 * 60 - duration, 23 * 60 + 55), 5)
+        departureTime = CLOCK[departure]
+        arrivalTime = CLOCK[(departure + duration) % 1440]
 
-        #更新下一次的出发时间
-        start_time += datetime.timedelta(minutes=random.randint(30, 120))
-
-        price = random.randint(200, 1000)
-        tickets = random.randint(50, 200)
-        isDelay = random.choice([0, 1])
-        delayTime = random.randint(0, 120) if isDelay else 0
+        price = rng.randint(200, 1000)
+        tickets = rng.randint(50, 200)
+        isDelay = rng.choice([0, 1])
+        delayTime = rng.randint(0, 120) if isDelay else 0
         isCancelled = 0
         isForSale = 1
 
-        flights.append(f"{flightID} {departureCity} {destinationCity} {stopover} {departureDate} {departureTime} {arrivalTime} {price} {tickets} {isDelay} {delayTime} {isCancelled} {isForSale}")
+        yield (f"{flightID} {departureCity} {destinationCity} {stopover} {departureDate} "
+               f"{departureTime} {arrivalTime} {price} {tickets} {isDelay} {delayTime} "
+               f"{isCancelled} {isForSale}")
+
+#航班数据生成函数
+def generate_dataset(num_flights=300, **options):
+    return list(generate_flights(num_flights, **options))
 
-    return flights
+#分批写入文件，path为"-"时写到标准输出；返回写入的航班数
+def write_dataset(path, num_flights=300, batch=10000, **options):
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+    written = 0
+    try:
+        lines = []
+        for line in generate_flights(num_flights, **options):
+            lines.append(line)
+            if len(lines) >= batch:
+                out.write("\n".join(lines) + "\n")
+                written += len(lines)
+                lines = []
+        if lines:
+            out.write("\n".join(lines) + "\n")
+            written += len(lines)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return written
 
-#生成航班数据并写入文件
-dataset = generate_dataset(300)
-output_file_path = r"E:\数据结构课程设计\Problem1\flightDataSet.txt"
 
-with open(output_file_path, 'w') as file:
-    file.write("\n".join(dataset))
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="生成航班数据集")
+    parser.add_argument("-n", "--flights", type=int, default=300, help="航班数")
+    parser.add_argument("-o", "--output", default="flightDataset.txt", help="输出文件，-表示标准输出")
+    parser.add_argument("--cities", type=int, default=20, help="城市数")
+    parser.add_argument("--seed", type=int, help="随机种子，相同参数和种子生成相同的数据")
+    parser.add_argument("--hub-skew", type=float, default=0.0,
+                        help="枢纽倾斜度：第k个城市的权重为1/k^skew，0为均匀分布，1左右接近枢纽辐射网络")
+    parser.add_argument("--days", type=int, help="航班分布的天数；不指定时沿用每天10个航班的时间线")
+    parser.add_argument("--overnight", type=float, default=0.0, help="红眼航班比例(需指定--days)")
+    parser.add_argument("--start-date", default="20240101", help="第一天的日期(YYYYMMDD)")
+    args = parser.parse_args()
+    if args.overnight and args.days is None:
+        parser.error("--overnight 需要同时指定 --days")
+    start = datetime.datetime.strptime(args.start_date, "%Y%m%d").date()
+    written = write_dataset(args.output, args.flights, num_cities=args.cities, seed=args.seed,
+                            hub_skew=args.hub_skew, days=args.days, overnight=args.overnight,
+                            start_date=start)
+    if args.output != "-":
+        print(f"已生成 {written} 个航班: {args.output}")
+
+
+#生成航班数据并写入文件
+if __name__ == "__main__":
+    main()
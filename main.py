@@ -1,32 +1,188 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
+import argparse
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+except ImportError:  #无图形界面的环境仍可使用核心与service.py
+    tk = ttk = messagebox = None
 import heapq
-from datetime import datetime
-
-#datetime对象
-def datetime_change(date_str, time_str):
-    return datetime.strptime(date_str + " " + time_str, "%Y%m%d %H:%M")
+import json
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import count, groupby, islice, repeat
+from multiprocessing import get_all_start_methods, get_context, shared_memory
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+
+from metrics import Metrics
+
+try:
+    import numpy as np
+except ImportError:  #NumPy为可选依赖，未安装时不启用列式存储
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+#"YYYYMMDD"对应当天0点距1970-01-01的分钟数，日期种类很少，缓存结果
+@lru_cache(maxsize=4096)
+def day_minutes(date_str):
+    if len(date_str) != 8 or not date_str.isdigit():
+        raise ValueError(f"日期格式错误: {date_str}")
+    day = date(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:])).toordinal()
+    return (day - EPOCH_ORDINAL) * 1440
+
+#"YYYYMMDD"和"HH:MM"转换为分钟数，不经过strptime
+def epoch_minutes(date_str, time_str):
+    hh, sep, mm = time_str.partition(":")
+    if not sep or not hh.isdigit() or not mm.isdigit() or int(hh) > 23 or int(mm) > 59:
+        raise ValueError(f"时间格式错误: {time_str}")
+    return day_minutes(date_str) + int(hh) * 60 + int(mm)
+
+#按(时间, 航班ID)有序的平行列表中插入/删除
+def sorted_insert(times, ids, t, fid):
+    i = bisect_left(times, t)
+    while i < len(times) and times[i] == t and ids[i] < fid:
+        i += 1
+    times.insert(i, t)
+    ids.insert(i, fid)
+
+def sorted_remove(times, ids, t, fid):
+    i = bisect_left(times, t)
+    while i < len(times) and ids[i] != fid:
+        i += 1
+    if i < len(times):
+        del times[i]
+        del ids[i]
 
 class Flight:
+    #__slots__减少每个航班的内存；时间在构造时解析为分钟数并缓存
+    #actual_dep_min/actual_arr_min为计入延误后的时刻，随时刻和延误字段的修改一并更新
+    __slots__ = ("flight_id", "departure_city", "destination_city", "stop_over",
+                 "_departure_date", "_departure_time", "_arrival_time",
+                 "dep_min", "arr_min", "price", "tickets", "_is_delay", "_delay_time",
+                 "actual_dep_min", "actual_arr_min", "is_cancelled", "is_for_sale")
+
     def __init__(self, flight_id, departure_city, destination_city, stop_over,
                  departure_date, departure_time, arrival_time, price,
                  tickets, is_delay, delay_time, is_cancelled, is_for_sale):
+        #城市、日期、时刻取值种类很少，驻留后所有航班共享同一个字符串对象
         self.flight_id = flight_id
-        self.departure_city = departure_city
-        self.destination_city = destination_city
-        self.stop_over = stop_over
-        self.departure_date = departure_date
-        self.departure_time = departure_time
-        self.arrival_time = arrival_time
+        self.departure_city = sys.intern(departure_city)
+        self.destination_city = sys.intern(destination_city)
+        self.stop_over = sys.intern(stop_over)
+        self._departure_date = sys.intern(departure_date)
+        self._departure_time = sys.intern(departure_time)
+        self._arrival_time = sys.intern(arrival_time)
 
         #变量类型转换
+        self._is_delay = (str(is_delay) == '1')
+        self._delay_time = int(delay_time) if delay_time else 0
+        self._parse_times()
         self.price = float(price) if price else 0.0
         self.tickets = int(tickets) if tickets else 0
-        self.is_delay = (str(is_delay) == '1')
-        self.delay_time = int(delay_time) if delay_time else 0
         self.is_cancelled = (str(is_cancelled) == '1')
         self.is_for_sale = (str(is_for_sale) == '1')
 
+#由已解析好的字段直接构造，快照加载时跳过类型转换和时间解析
+    @classmethod
+    def restore(cls, flight_id, departure_city, destination_city, stop_over,
+                departure_date, departure_time, arrival_time, dep_min, arr_min,
+                price, tickets, is_delay, delay_time, is_cancelled, is_for_sale):
+        self = cls.__new__(cls)
+        self.flight_id = flight_id
+        self.departure_city = departure_city
+        self.destination_city = destination_city
+        self.stop_over = stop_over
+        self._departure_date = departure_date
+        self._departure_time = departure_time
+        self._arrival_time = arrival_time
+        self.dep_min = dep_min
+        self.arr_min = arr_min
+        self.price = price
+        self.tickets = tickets
+        self._is_delay = is_delay
+        self._delay_time = delay_time
+        self.is_cancelled = is_cancelled
+        self.is_for_sale = is_for_sale
+        self._update_actual()
+        return self
+
+#解析计划出发/到达时间，到达时刻早于出发时刻视为次日到达
+    def _parse_times(self):
+        dep = epoch_minutes(self._departure_date, self._departure_time)
+        arr = epoch_minutes(self._departure_date, self._arrival_time)
+        if arr < dep:
+            arr += 1440
+        self.dep_min, self.arr_min = dep, arr
+        self._update_actual()
+
+    def _update_actual(self):
+        if self._is_delay and self._delay_time:
+            self.actual_dep_min = self.dep_min + self._delay_time
+            self.actual_arr_min = self.arr_min + self._delay_time
+        else:
+            self.actual_dep_min, self.actual_arr_min = self.dep_min, self.arr_min
+
+    def _set_time_field(self, name, value):
+        old = getattr(self, name)
+        setattr(self, name, value)
+        try:
+            self._parse_times()
+        except ValueError:
+            setattr(self, name, old)
+            raise
+
+#修改日期或时刻时重新解析
+    @property
+    def departure_date(self):
+        return self._departure_date
+    @departure_date.setter
+    def departure_date(self, value):
+        self._set_time_field("_departure_date", value)
+
+    @property
+    def departure_time(self):
+        return self._departure_time
+    @departure_time.setter
+    def departure_time(self, value):
+        self._set_time_field("_departure_time", value)
+
+    @property
+    def arrival_time(self):
+        return self._arrival_time
+    @arrival_time.setter
+    def arrival_time(self, value):
+        self._set_time_field("_arrival_time", value)
+
+#修改延误标记或时长时重新计算实际时刻
+    @property
+    def is_delay(self):
+        return self._is_delay
+    @is_delay.setter
+    def is_delay(self, value):
+        self._is_delay = value
+        self._update_actual()
+
+    @property
+    def delay_time(self):
+        return self._delay_time
+    @delay_time.setter
+    def delay_time(self, value):
+        self._delay_time = value
+        self._update_actual()
+
 #字符串打印
     def __str__(self):
         return (f"[{self.flight_id}] {self.departure_city} -> {self.destination_city} | "
@@ -38,203 +194,2257 @@ class Flight:
 # 返回时间对象
     @property
     def departure_dt(self):
-        return datetime_change(self.departure_date, self.departure_time)
+        return EPOCH + timedelta(minutes=self.dep_min)
     @property
     def arrival_dt(self):
-        return datetime_change(self.departure_date, self.arrival_time)
+        return EPOCH + timedelta(minutes=self.arr_min)
+
+#解析一批数据行，返回([(行号, Flight)], [(行号, 原因)])
+def parse_flight_lines(start, lines):
+    parsed = []
+    rejected = []
+    for lineno, line in enumerate(lines, start):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != 13:
+            rejected.append((lineno, f"字段数应为13，实际为{len(parts)}"))
+            continue
+        try:
+            parsed.append((lineno, Flight(*parts)))
+        except ValueError as e:
+            rejected.append((lineno, str(e)))
+    return parsed, rejected
+
+#按块读取文件，依次产出每块的解析结果；workers > 1 时用进程池解析
+def iter_flight_chunks(f, chunk_size=50000, workers=0):
+    def chunks():
+        start = 1
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            yield start, lines
+            start += len(lines)
+
+    if workers <= 1:
+        for start, lines in chunks():
+            yield parse_flight_lines(start, lines)
+        return
+    with ProcessPoolExecutor(workers, mp_context=process_context()) as pool:
+        pending = deque()
+        for start, lines in chunks():
+            pending.append(pool.submit(parse_flight_lines, start, lines))
+            #同时在途的块数有限，避免整份文件堆在内存中
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+#进程池使用forkserver(不支持时spawn)启动子进程：调用方可能同时运行着界面后台线程、日志落盘线程，
+#在多线程进程中fork会让子进程继承别的线程持有的锁而死锁；子进程所需的数据由参数或共享内存传入
+def process_context():
+    return get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+
+#沿父指针还原路径，names把结点中的航班编码解码为航班ID
+def route_path(node, names):
+    path = []
+    while node is not None:
+        path.append(names[node[0]])
+        node = node[1]
+    path.reverse()
+    return path
+
+#按城市分片建图：航班的实际时刻、城市编码和航班编码作为列放入共享内存，子进程直接读取，不经管道复制
+#从城市c出发的航班和到达c的航班归同一分片：到达c的航班的后继正是从c出发的航班
+SHARD_COLUMNS = (("dep_at", "q"), ("arr_at", "q"), ("dep_code", "i"), ("des_code", "i"),
+                 ("code", "i"))
+_shard = None  #子进程中：列名 -> 共享内存上的memoryview
+
+#把各列依次拷入一块共享内存，每列8字节对齐；返回(共享内存, [(列名, 类型码, 偏移, 长度)])
+def create_shared_columns(columns):
+    layout, offset = [], 0
+    for name, typecode in SHARD_COLUMNS:
+        col = columns[name]
+        layout.append((name, typecode, offset, len(col)))
+        offset += (col.itemsize * len(col) + 7) // 8 * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+    for name, typecode, start, length in layout:
+        data = memoryview(columns[name]).cast("B")
+        shm.buf[start:start + len(data)] = data
+    return shm, layout
+
+def _shard_init(shm_name, layout):
+    global _shard
+    shm = shared_memory.SharedMemory(shm_name)
+    _shard = {name: shm.buf[start:start + length * array(typecode).itemsize].cast(typecode)
+              for name, typecode, start, length in layout}
+    _shard["shm"] = shm
+
+#子进程：为分到的城市排出出发/到达顺序(航班下标，时间相同按航班编码)
+#adjacency为True时另给出每个到达航班在该城市出发数组中的衔接起点
+def _shard_build(city_codes, adjacency):
+    dep_at, arr_at, codes = _shard["dep_at"], _shard["arr_at"], _shard["code"]
+    deps = {c: [] for c in city_codes}
+    arrs = {c: [] for c in city_codes}
+    for i, (d, a) in enumerate(zip(_shard["dep_code"], _shard["des_code"])):
+        if d in deps:
+            deps[d].append(i)
+        if a in arrs:
+            arrs[a].append(i)
+    result = []
+    for c in city_codes:
+        dep, arr = deps[c], arrs[c]
+        #稳定排序两趟：先按编码、再按时间，等价于按(时间, 编码)排序
+        dep.sort(key=codes.__getitem__)
+        dep.sort(key=dep_at.__getitem__)
+        arr.sort(key=codes.__getitem__)
+        arr.sort(key=arr_at.__getitem__)
+        starts = None
+        if adjacency:
+            times = [dep_at[i] for i in dep]
+            starts = array('i', [bisect_left(times, arr_at[i]) for i in arr])
+        result.append((c, array('i', dep), array('i', arr), starts))
+    return result
+
+_batch_fms = None  #批量行程搜索的子进程中的FlightManagementSystem，只读使用
+
+#fms: fork时继承的系统；state: 其他启动方式下父进程序列化好的(编码 -> 航班, 航班ID表, 各城市有序出发数组)，
+#只据此恢复search_routes用到的结构
+def _batch_init(fms, state=None):
+    global _batch_fms
+    if state is not None:
+        flight_at, names, city_dep_times, city_dep_ids = pickle.loads(state)
+        fms = FlightManagementSystem("lazy", route_cache_size=0)
+        fms.flight_at = flight_at
+        fms.flight_ids.names = names
+        fms.flight_ids.codes = {name: code for code, name in enumerate(names)}
+        fms.city_dep_times, fms.city_dep_ids = city_dep_times, city_dep_ids
+    _batch_fms = fms
+
+def _search_batch(pairs, options):
+    found = []
+    for pair in pairs:
+        explored = set()
+        found.append((pair, _batch_fms.search_routes(*pair, *options, explored), explored))
+    return found
+
+#二进制快照：文件头 + 若干按名称索引的数组段，每段8字节对齐，可直接mmap后零拷贝读取
+SNAPSHOT_MAGIC = b"FMSSNAP\0"
+SNAPSHOT_VERSION = 4
+SNAPSHOT_HEADER = struct.Struct("<8sIBqqI")  #魔数, 版本, 是否小端, 源文件大小, 源文件修改时间, 段数
+SNAPSHOT_SECTION = struct.Struct("<16scQ")  #段名, array类型码, 字节数
+
+#源文件的(大小, 修改时间)，用来判断快照是否过期
+def source_signature(source):
+    try:
+        st = os.stat(source)
+    except OSError:
+        return (-1, -1)
+    return (st.st_size, st.st_mtime_ns)
+
+#写入快照，sections为{段名: array}；先写临时文件再替换，避免半截文件
+def write_snapshot_file(path, source, sections):
+    size, mtime = source_signature(source)
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sys.byteorder == "little",
+                                     size, mtime, len(sections)))
+        for name, arr in sections.items():
+            data = arr.tobytes()
+            f.write(SNAPSHOT_SECTION.pack(name.encode(), arr.typecode.encode(), len(data)))
+            f.write(b"\0" * (-f.tell() % 8))
+            f.write(data)
+    os.replace(tmp, path)
+
+#读取快照并返回{段名: memoryview}；文件缺失、版本不符或源文件已变化时返回None
+def read_snapshot_file(path, source):
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, little, size, mtime, count = SNAPSHOT_HEADER.unpack_from(buf, 0)
+    if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or
+            little != (sys.byteorder == "little") or (size, mtime) != source_signature(source)):
+        return None
+    #文件被截断或损坏时同样返回None，由调用方改用文本读取
+    view = memoryview(buf)
+    sections = {}
+    pos = SNAPSHOT_HEADER.size
+    try:
+        for _ in range(count):
+            name, typecode, nbytes = SNAPSHOT_SECTION.unpack_from(buf, pos)
+            pos += SNAPSHOT_SECTION.size
+            pos += -pos % 8
+            if pos + nbytes > len(buf):
+                return None
+            sections[name.rstrip(b"\0").decode()] = view[pos:pos + nbytes].cast(typecode.decode())
+            pos += nbytes
+    except (struct.error, TypeError, ValueError, UnicodeDecodeError):
+        return None
+    return sections
 
-class FlightManagementSystem:
+#以"\n"连接的字符串表
+def pack_strings(strings):
+    return array('B', "\n".join(strings).encode())
+
+def unpack_strings(view, intern=False):
+    data = bytes(view).decode()
+    if not data:
+        return []
+    return [sys.intern(x) for x in data.split("\n")] if intern else data.split("\n")
+
+#驻留表：把字符串映射为从0开始的稠密整数编码，编码即names中的下标，只增不减
+#新字符串加锁分配，先写入names再公布编码，其他线程拿到的编码总能解码
+class SymbolTable:
     def __init__(self):
-        self.flights = []  #存放Flight对象的列表
-        self.flight_graph = {}  #记录航班时序关系
-        self.priority_queue = []  #优先队列，用于预约抢票
-        self.user_tickets = {}  #用户的购票信息
+        self.codes = {}  #字符串 -> 编码
+        self.names = []  #编码 -> 字符串
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(name)
+                if code is None:
+                    self.names.append(name)
+                    code = self.codes[name] = len(self.names) - 1
+        return code
+
+#持票记录中的int32项：单个编码，以及(航班编码, 张数)对
+TICKET_ITEM = struct.Struct("=i")
+TICKET_PAIR = struct.Struct("=ii")
+
+#在由width字节定长项组成的bytes中找以item开头的项，返回字节偏移，没有时返回-1
+#bytes.find在C中扫描，命中位置不在项的边界上(如张数恰好等于所找的编码)时继续向后找
+def find_item(data, item, width):
+    i = data.find(item)
+    while i % width and i >= 0:
+        i = data.find(item, i + 1)
+    return i
+
+#紧凑的持票记录：用户ID和航班ID编码为整数(航班与FlightManagementSystem共用一张驻留表)
+#by_user: 用户编码 -> 由(航班编码, 张数)的int32对组成的bytes，每位用户至多10个航班，顺序查找即可
+#by_flight: 航班编码 -> 由持票用户编码的int32组成的bytes，取消航班时由它找到持票用户
+#记录存为不可变的bytes，对象头比array小一半；修改时整体替换，并发读取看到的总是某一时刻的完整记录
+#对外仍以字符串ID收发；修改时沿用原来的锁约定：用户的持票在用户锁内修改，航班的持票人在航班锁内修改
+class TicketBook:
+    def __init__(self, flight_ids):
+        self.flight_ids = flight_ids
+        self.users = SymbolTable()
+        self.by_user = []
+        self.by_flight = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.users.codes
+
+    def clear(self):
+        self.users = SymbolTable()
+        self.by_user = []
+        self.by_flight = {}
+
+#先扩充by_user再分配编码，编码可见时对应的槽位已经存在
+    def _user_code(self, user_id):
+        code = self.users.codes.get(user_id)
+        if code is None:
+            with self.lock:
+                if user_id not in self.users.codes:
+                    self.by_user.append(b"")
+                code = self.users.encode(user_id)
+        return code
+
+    def _owned(self, user_id):
+        code = self.users.codes.get(user_id)
+        return self.by_user[code] if code is not None else b""
+
+#曾经购票的全部用户ID(含已全部退票的)
+    def user_ids(self):
+        return list(self.users.names)
+
+    def count(self, user_id, flight_id):
+        ucode = self.users.codes.get(user_id)
+        fcode = self.flight_ids.codes.get(flight_id)
+        if ucode is None or fcode is None:
+            return 0
+        owned = self.by_user[ucode]
+        i = find_item(owned, TICKET_ITEM.pack(fcode), 8)
+        return TICKET_ITEM.unpack_from(owned, i + 4)[0] if i >= 0 else 0
+
+    def num_flights(self, user_id):
+        return len(self._owned(user_id)) // 8
+
+#用户的持票{航班ID: 张数}
+    def flights(self, user_id):
+        names = self.flight_ids.names
+        return {names[f]: c for f, c in TICKET_PAIR.iter_unpack(self._owned(user_id))}
+
+#航班的持票人{用户ID: 张数}
+    def holders(self, flight_id):
+        fcode = self.flight_ids.codes.get(flight_id)
+        users = self.by_flight.get(fcode)
+        if not users:
+            return {}
+        names, by_user = self.users.names, self.by_user
+        key = TICKET_ITEM.pack(fcode)
+        result = {}
+        for (u,) in TICKET_ITEM.iter_unpack(users):
+            owned = by_user[u]
+            i = find_item(owned, key, 8)
+            if i >= 0:
+                result[names[u]] = TICKET_ITEM.unpack_from(owned, i + 4)[0]
+        return result
+
+#逐个用户给出(用户ID, {航班ID: 张数})
+    def items(self):
+        for user_id in self.user_ids():
+            yield user_id, self.flights(user_id)
+
+#把用户在航班上的持票数设为count(0表示不再持有)
+    def set(self, user_id, flight_id, count):
+        ucode = self._user_code(user_id)
+        fcode = self.flight_ids.encode(flight_id)
+        owned = self.by_user[ucode]
+        self._store(ucode, fcode, owned, find_item(owned, TICKET_ITEM.pack(fcode), 8), count)
+
+#持票数增加delta(可为负)，返回新的张数；购票/退票只需查找一次
+    def add(self, user_id, flight_id, delta):
+        ucode = self._user_code(user_id)
+        fcode = self.flight_ids.encode(flight_id)
+        owned = self.by_user[ucode]
+        i = find_item(owned, TICKET_ITEM.pack(fcode), 8)
+        count = (TICKET_ITEM.unpack_from(owned, i + 4)[0] if i >= 0 else 0) + delta
+        self._store(ucode, fcode, owned, i, count)
+        return count
+
+#owned为用户当前的记录，i为该航班在其中的偏移(-1表示没有)
+    def _store(self, ucode, fcode, owned, i, count):
+        if i >= 0:
+            if count:
+                owned = owned[:i] + TICKET_PAIR.pack(fcode, count) + owned[i + 8:]
+            else:
+                owned = owned[:i] + owned[i + 8:]
+                users = self.by_flight[fcode]
+                j = find_item(users, TICKET_ITEM.pack(ucode), 4)
+                users = users[:j] + users[j + 4:]
+                if users:
+                    self.by_flight[fcode] = users
+                else:
+                    del self.by_flight[fcode]
+        elif count:
+            owned += TICKET_PAIR.pack(fcode, count)
+            self.by_flight[fcode] = self.by_flight.get(fcode, b"") + TICKET_ITEM.pack(ucode)
+        else:
+            return
+        self.by_user[ucode] = owned
+
+#TicketBook的只读视图，兼容原来的user_tickets字典：用户ID -> {航班ID: 张数}
+#每次取值时从TicketBook解码，返回只读字典；修改持票须通过购票、退票等方法
+class UserTickets(Mapping):
+    __slots__ = ("book",)
+
+    def __init__(self, book):
+        self.book = book
+
+    def __getitem__(self, user_id):
+        if user_id not in self.book:
+            raise KeyError(user_id)
+        return MappingProxyType(self.book.flights(user_id))
+
+    def __iter__(self):
+        return iter(self.book.user_ids())
 
-#读取数据集
-    def read_dataset(self, filename="flightDataset.txt"):
+    def __len__(self):
+        return len(self.book)
+
+    def __contains__(self, user_id):
+        return user_id in self.book
+
+#一条航线某一天(或全部日期)的票价与余票汇总：各列表为航班编码，按(票价或一天中的出发时刻, 先后序号)有序
+#by_price/by_time含全部航班，open_by_*只含可售(有余票、未取消、在售)的航班，seats为可售航班的余票合计
+#最低票价、最早出发即open_by_*的第一个，前N个为其切片
+class RouteFares:
+    __slots__ = ("by_price", "by_time", "open_by_price", "open_by_time", "seats")
+
+    def __init__(self):
+        self.by_price = []
+        self.by_time = []
+        self.open_by_price = []
+        self.open_by_time = []
+        self.seats = 0
+
+#从按key有序的列表中删除code；键唯一，二分即可定位
+def ladder_remove(ladder, code, key):
+    i = bisect_left(ladder, key(code), key=key)
+    while ladder[i] != code:
+        i += 1
+    del ladder[i]
+
+#可售：有余票、未取消且在售，与only_for_sale的筛选条件一致
+def on_sale(flt):
+    return flt.tickets > 0 and not flt.is_cancelled and flt.is_for_sale
+
+#列式航班存储：数值与状态各占一列NumPy数组，城市做字典编码，查询用向量化掩码
+class FlightStore:
+    def __init__(self, capacity=1024):
+        self.city_codes = {}  #城市 -> 整数编码
+        self.rows = []  #行号 -> Flight，已删除的行为None
+        self.row_of = {}  #航班ID -> 行号
+        self.size = 0
+        self.dead = 0
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.tickets = np.zeros(capacity, dtype=np.int64)
+        self.dep_min = np.zeros(capacity, dtype=np.int64)
+        self.dep_code = np.zeros(capacity, dtype=np.int32)
+        self.des_code = np.zeros(capacity, dtype=np.int32)
+        self.is_cancelled = np.zeros(capacity, dtype=bool)
+        self.is_for_sale = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _columns(self):
+        return ("price", "tickets", "dep_min", "dep_code", "des_code",
+                "is_cancelled", "is_for_sale", "alive")
+
+    def _city_code(self, city):
+        code = self.city_codes.get(city)
+        if code is None:
+            code = self.city_codes[city] = len(self.city_codes)
+        return code
+
+#批量载入，按行号依次写入各列
+    def load(self, flights):
+        self.__init__(max(1024, len(flights)))
+        for f in flights:
+            self.append(f)
+
+#追加一行，容量不足时翻倍扩容
+    def append(self, flt):
+        if self.size == len(self.alive):
+            for name in self._columns():
+                col = getattr(self, name)
+                grown = np.zeros(len(col) * 2, dtype=col.dtype)
+                grown[:len(col)] = col
+                setattr(self, name, grown)
+        row = self.size
+        self.size += 1
+        self.rows.append(flt)
+        self.row_of[flt.flight_id] = row
+        self.alive[row] = True
+        self.update(flt)
+
+#航班属性变化后重写其所在行
+    def update(self, flt):
+        row = self.row_of.get(flt.flight_id)
+        if row is None:
+            return
+        self.price[row] = flt.price
+        self.tickets[row] = flt.tickets
+        self.dep_min[row] = flt.dep_min
+        self.dep_code[row] = self._city_code(flt.departure_city)
+        self.des_code[row] = self._city_code(flt.destination_city)
+        self.is_cancelled[row] = flt.is_cancelled
+        self.is_for_sale[row] = flt.is_for_sale
+
+#删除只做标记，已删除行过半时压缩
+    def remove(self, flight_id):
+        row = self.row_of.pop(flight_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.rows[row] = None
+        self.dead += 1
+        if self.dead * 2 > self.size:
+            self.load([f for f in self.rows if f is not None])
+
+#满足条件的行掩码；城市不存在时返回None
+    def _mask(self, dep, des, only_for_sale):
+        n = self.size
+        mask = self.alive[:n].copy()
+        for city, codes in ((dep, self.dep_code), (des, self.des_code)):
+            if city:
+                code = self.city_codes.get(city)
+                if code is None:
+                    return None
+                mask &= codes[:n] == code
+        if only_for_sale:
+            mask &= (self.tickets[:n] > 0) & ~self.is_cancelled[:n] & self.is_for_sale[:n]
+        return mask
+
+    def count(self, dep=None, des=None, only_for_sale=False):
+        mask = self._mask(dep, des, only_for_sale)
+        return 0 if mask is None else int(mask.sum())
+
+#与FlightManagementSystem.query_flights语义一致：保持插入顺序，排序为稳定排序
+    def query(self, dep=None, des=None, only_for_sale=False, sort_by=None):
+        mask = self._mask(dep, des, only_for_sale)
+        if mask is None:
+            return []
+        idx = np.flatnonzero(mask)
+        if sort_by == "票价":
+            idx = idx[np.argsort(self.price[idx], kind="stable")]
+        elif sort_by == "出发时间":
+            idx = idx[np.argsort(self.dep_min[idx] % 1440, kind="stable")]
+        rows = self.rows
+        return [rows[i] for i in idx.tolist()]
+
+#向量化查询一次得到全部结果，逐个产出只为与SQLiteStore接口一致
+    def iter_query(self, dep=None, des=None, only_for_sale=False, sort_by=None):
+        return iter(self.query(dep, des, only_for_sale, sort_by))
+
+#列式存储只服务查询，不保存持票记录
+    def set_holding(self, user_id, flight_id, count):
+        pass
+
+    def transaction(self):
+        return nullcontext()
+
+#SQLite航班存储：航班表与持票表保存在本地数据库中，查询走(出发城市, 目的城市)索引
+#每个线程使用自己的连接；transaction()内的写操作先缓存，退出时在一个事务中提交，
+#连续的同类语句合并为executemany，批量载入即一次executemany
+class SQLiteStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS flights (
+            seq INTEGER PRIMARY KEY, flight_id TEXT NOT NULL UNIQUE,
+            departure_city TEXT, destination_city TEXT, stop_over TEXT,
+            departure_date TEXT, departure_time TEXT, arrival_time TEXT,
+            price REAL, tickets INTEGER, is_delay INTEGER, delay_time INTEGER,
+            is_cancelled INTEGER, is_for_sale INTEGER);
+        CREATE INDEX IF NOT EXISTS flights_route ON flights (departure_city, destination_city);
+        CREATE INDEX IF NOT EXISTS flights_date ON flights (departure_date);
+        CREATE TABLE IF NOT EXISTS tickets (
+            user_id TEXT, flight_id TEXT, count INTEGER,
+            PRIMARY KEY (user_id, flight_id)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS tickets_flight ON tickets (flight_id);
+    """
+    INSERT = "INSERT INTO flights VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    UPDATE = ("UPDATE flights SET departure_city = ?, destination_city = ?, stop_over = ?, "
+              "departure_date = ?, departure_time = ?, arrival_time = ?, price = ?, tickets = ?, "
+              "is_delay = ?, delay_time = ?, is_cancelled = ?, is_for_sale = ? WHERE flight_id = ?")
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  #conn: 本线程的连接；batch: 未提交的写操作
+        self.objects = {}  #航班ID -> Flight，查询结果直接返回内存中的对象
+        self._conn().executescript(self.SCHEMA)
+
+#每个线程第一次访问时创建连接；WAL日志模式下读操作不会被写事务阻塞
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _execute(self, sql, args=()):
+        batch = getattr(self.local, "batch", None)
+        if batch is not None:
+            batch.append((sql, args))
+        else:
+            self._conn().execute(sql, args)
+
+#嵌套调用并入最外层事务；提交时才取得数据库写锁，持锁期间不会等待内存中的航班锁和用户锁
+    @contextmanager
+    def transaction(self):
+        if getattr(self.local, "batch", None) is not None:
+            yield
+            return
+        self.local.batch = batch = []
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    parts = line.split()
-                    if len(parts) < 13:
-                        continue  #数据缺失则跳过
-                    flight_obj = Flight(*parts)
-                    self.flights.append(flight_obj)
-            self.build_flight_graph()  #构建基于时刻的航班图
-        except Exception as e:
-            print(f"读取航班文件出错: {e}")
-
-#构建航班图
-    def build_flight_graph(self):
+            yield
+        finally:
+            self.local.batch = None
+            if batch:
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for sql, group in groupby(batch, key=lambda op: op[0]):
+                        conn.executemany(sql, [args for _, args in group])
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+
+    @staticmethod
+    def _row(flt):
+        return (flt.departure_city, flt.destination_city, flt.stop_over, flt.departure_date,
+                flt.departure_time, flt.arrival_time, flt.price, flt.tickets, int(flt.is_delay),
+                flt.delay_time, int(flt.is_cancelled), int(flt.is_for_sale))
+
+#清空航班表后批量载入；重建航班图时内存中的持票记录保留，持票表同样不动
+    def load(self, flights):
+        with self.transaction():
+            self._execute("DELETE FROM flights")
+            self.objects = {}
+            for f in flights:
+                self.append(f)
+
+    def append(self, flt):
+        self.objects[flt.flight_id] = flt
+        self._execute(self.INSERT, (flt.flight_id, *self._row(flt)))
+
+    def update(self, flt):
+        if flt.flight_id in self.objects:
+            self._execute(self.UPDATE, (*self._row(flt), flt.flight_id))
+
+    def remove(self, flight_id):
+        if self.objects.pop(flight_id, None) is not None:
+            self._execute("DELETE FROM flights WHERE flight_id = ?", (flight_id,))
+
+    def set_holding(self, user_id, flight_id, count):
+        if count:
+            self._execute("INSERT INTO tickets VALUES (?, ?, ?) ON CONFLICT (user_id, flight_id) "
+                          "DO UPDATE SET count = excluded.count", (user_id, flight_id, count))
+        else:
+            self._execute("DELETE FROM tickets WHERE user_id = ? AND flight_id = ?",
+                          (user_id, flight_id))
+
+#读出全部航班(按插入顺序)和持票记录[(用户ID, 航班ID, 张数)]，用于从数据库启动
+    def read_all(self):
+        conn = self._conn()
+        flights = [Flight(*row) for row in conn.execute(
+            "SELECT flight_id, departure_city, destination_city, stop_over, departure_date, "
+            "departure_time, arrival_time, price, tickets, is_delay, delay_time, is_cancelled, "
+            "is_for_sale FROM flights ORDER BY seq")]
+        self.objects = {f.flight_id: f for f in flights}
+        return flights, conn.execute("SELECT user_id, flight_id, count FROM tickets").fetchall()
+
+    @staticmethod
+    def _where(dep, des, only_for_sale):
+        where, args = [], []
+        if dep:
+            where.append("departure_city = ?")
+            args.append(dep)
+        if des:
+            where.append("destination_city = ?")
+            args.append(des)
+        if only_for_sale:
+            where.append("tickets > 0 AND NOT is_cancelled AND is_for_sale")
+        return (" WHERE " + " AND ".join(where) if where else ""), args
+
+    def count(self, dep=None, des=None, only_for_sale=False):
+        where, args = self._where(dep, des, only_for_sale)
+        return self._conn().execute("SELECT COUNT(*) FROM flights" + where, args).fetchone()[0]
+
+#与FlightManagementSystem.query_flights语义一致：按插入顺序，排序相同时保持插入顺序
+#游标逐行读取，调用方只取前几页时不会读出全部结果；期间被删除的航班跳过
+    def iter_query(self, dep=None, des=None, only_for_sale=False, sort_by=None):
+        where, args = self._where(dep, des, only_for_sale)
+        sql = "SELECT flight_id FROM flights" + where
+        if sort_by == "票价":
+            sql += " ORDER BY price, seq"
+        elif sort_by == "出发时间":
+            sql += " ORDER BY departure_time, seq"
+        else:
+            sql += " ORDER BY seq"
+        objects = self.objects
+        for fid, in self._conn().execute(sql, args):
+            flt = objects.get(fid)
+            if flt is not None:
+                yield flt
+
+    def query(self, dep=None, des=None, only_for_sale=False, sort_by=None):
+        return list(self.iter_query(dep, des, only_for_sale, sort_by))
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+#行程搜索被调用方取消(cancel事件置位)时抛出，未完成的结果不写入缓存
+class SearchCancelled(Exception):
+    pass
+
+#替代航班结果的LRU缓存：每个条目记录搜索中展开过的出发城市和结果中的航班，
+#某城市的出发航班变化时只需淘汰展开过该城市或包含该航班的条目
+#查询线程与写线程可同时访问，各方法持有lock；每次淘汰或清空使generation加1，
+#搜索开始前取得generation，put时若其间发生过淘汰则丢弃结果，过时的方案不会在淘汰之后写入
+class RouteCache:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()  #键 -> (方案列表, 展开过的城市, 包含的航班ID)
+        self.by_city = {}  #城市 -> {键}
+        self.by_flight = {}  #航班ID -> {键}
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.discarded = 0  #因搜索期间航班变化而丢弃的结果数
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+#generation为搜索开始前取得的self.generation，None表示不检查
+    def put(self, key, routes, cities, generation=None):
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                self.discarded += 1
+                return
+            if key in self.entries:
+                self._drop(key)
+            fids = {fid for path in routes for fid in path}
+            self.entries[key] = (routes, cities, fids)
+            for city in cities:
+                self.by_city.setdefault(city, set()).add(key)
+            for fid in fids:
+                self.by_flight.setdefault(fid, set()).add(key)
+            while len(self.entries) > self.capacity:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+#调用方持有lock
+    def _drop(self, key):
+        _, cities, fids = self.entries.pop(key)
+        for city in cities:
+            keys = self.by_city[city]
+            keys.discard(key)
+            if not keys:
+                del self.by_city[city]
+        for fid in fids:
+            keys = self.by_flight[fid]
+            keys.discard(key)
+            if not keys:
+                del self.by_flight[fid]
+
+#淘汰展开过city或包含flight_id的条目
+    def invalidate(self, city, flight_id=None):
+        with self.lock:
+            self.generation += 1
+            keys = set(self.by_city.get(city, ()))
+            if flight_id is not None:
+                keys |= self.by_flight.get(flight_id, set())
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.by_city.clear()
+            self.by_flight.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "capacity": self.capacity, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "discarded": self.discarded}
+
+#预写日志(WAL)：每行一个JSON事务，首行记录日志所基于的数据(快照或数据集)的签名
+#事务由若干条记录组成，记录的是操作后的结果而非操作本身，重放时与并发执行的先后无关：
+#  ["tickets", 航班ID, 余票]  ["hold", 用户ID, 航班ID, 持票数]  ["flight", 航班ID, {字段: 值}]
+#  ["add", [构造参数]]  ["delete", 航班ID]  ["reserve", 航班ID, 优先级, 用户ID, 数量]
+#  ["dequeue", 航班ID, 出队个数]  ["drop", 航班ID]
+WAL_VERSION = 1
+FLIGHT_FIELDS = ("departure_city", "destination_city", "stop_over", "departure_date",
+                 "departure_time", "arrival_time", "price", "tickets", "is_delay", "delay_time",
+                 "is_cancelled", "is_for_sale")
+
+def flight_state(flt):
+    return {k: getattr(flt, k) for k in FLIGHT_FIELDS}
+
+#与Flight构造函数及数据集行格式一致的字段
+def flight_fields(flt):
+    return [flt.flight_id, flt.departure_city, flt.destination_city, flt.stop_over,
+            flt.departure_date, flt.departure_time, flt.arrival_time, repr(flt.price),
+            str(flt.tickets), "1" if flt.is_delay else "0", str(flt.delay_time),
+            "1" if flt.is_cancelled else "0", "1" if flt.is_for_sale else "0"]
+
+#读取WAL，返回(首行, [事务], 完整部分的字节数)；文件不存在时返回None
+#末尾写了一半的行(崩溃时)及其后内容被丢弃
+def read_wal(path):
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    header, transactions, good = None, [], 0
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                value = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = value
+            else:
+                transactions.append(value)
+            good += len(line)
+    return header, transactions, good
+
+#读写锁：修改数据并写日志的操作共享持有，检查点独占持有；已有独占等待时不再放入新的共享者，检查点不会被持续的购票饿死
+#共享持有可在同一线程内嵌套(如重放日志时的update_flight)
+class SharedLock:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting = 0  #等待独占的线程数
+        self.local = threading.local()
+
+#本线程是否共享持有
+    def held(self):
+        return getattr(self.local, "depth", 0) > 0
+
+    @contextmanager
+    def shared(self):
+        depth = getattr(self.local, "depth", 0)
+        if not depth:
+            with self.cond:
+                while self.writer or self.waiting:
+                    self.cond.wait()
+                self.readers += 1
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if not depth:
+                with self.cond:
+                    self.readers -= 1
+                    if not self.readers:
+                        self.cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self.cond:
+            self.waiting += 1
+            while self.writer or self.readers:
+                self.cond.wait()
+            self.waiting -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.writer = False
+                self.cond.notify_all()
+
+#追加写WAL。sync="always"每个事务fsync一次；"group"由后台线程把等待中的事务合并为一次fsync，
+#调用方append后在释放锁之后wait，期间其他线程的事务可以并入同一批；"none"只写入操作系统缓存
+class WriteAheadLog:
+    def __init__(self, path, header=None, sync="group", keep=None):
+        self.path = path
+        self.sync = sync
+        self.cond = threading.Condition()
+        self.pending = []
+        self.appended = 0
+        self.durable = 0
+        self.records = 0  #文件中的事务数，用于判断何时压缩
+        self.closed = False
+        if keep is None:  #新建日志，只含首行
+            self.file = open(path, 'wb')
+            self.file.write(json.dumps(header).encode("utf-8") + b"\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        else:  #续写已有日志，截掉不完整的末尾
+            self.file = open(path, 'r+b')
+            self.file.truncate(keep)
+            self.file.seek(keep)
+        self.flusher = None
+        if sync == "group":
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    def append(self, records):
+        line = json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.cond:
+            self.appended += 1
+            self.records += 1
+            if self.sync == "group":
+                self.pending.append(line)
+                self.cond.notify_all()
+                return self.appended
+            self.file.write(line)
+            self.file.flush()
+            if self.sync == "always":
+                os.fsync(self.file.fileno())
+            self.durable = self.appended
+            return self.appended
+
+#等待序号seq及之前的事务落盘
+    def wait(self, seq):
+        if self.sync != "group":
+            return
+        with self.cond:
+            while self.durable < seq:
+                self.cond.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, []
+                upto = self.appended
+            #写盘时不持有锁，新到的事务进入下一批
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            with self.cond:
+                self.durable = upto
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.file.close()
+
+class FlightManagementSystem:
+    #graph_mode: "materialized"显式保存邻接表；"lazy"只保存各城市有序出发数组，后继按需切片
+    #use_store: 使用列式FlightStore执行query_flights（需要NumPy）
+    #route_cache_size: 替代航班结果缓存的条目上限，0表示不缓存
+    #db_path: 把航班和持票记录保存在该SQLite数据库中，由它执行query_flights（优先于use_store）
+    def __init__(self, graph_mode="materialized", use_store=False, route_cache_size=256,
+                 db_path=None):
+        self.graph_mode = graph_mode
+        self.store = None
+        if db_path:
+            self.store = SQLiteStore(db_path)
+        elif use_store:
+            if np is None:
+                print("未安装NumPy，航班查询使用列表扫描")
+            else:
+                self.store = FlightStore()
+        self.flights = []  #存放Flight对象的列表
+        #航班图、城市有序数组和持票记录中的航班均以整数编码表示，只在接口处与航班ID互相转换
+        self.flight_ids = SymbolTable()  #航班ID <-> 编码；删除的航班保留编码，其上的持票记录仍可解码
+        self.flight_at = []  #编码 -> Flight，已删除的为None
+        self.flight_graph = {}  #航班编码 -> 可衔接航班编码的array('i')（仅materialized模式）
+        self.flight_map = {}  #航班ID -> Flight
+        self.flight_seq = array('q')  #编码 -> 在flights中的先后序号，索引桶按它保持顺序
+        self.next_seq = 0
+        self.dep_index = {}  #出发城市 -> {航班ID: Flight}
+        self.route_index = {}  #(出发城市, 目的城市) -> {航班ID: Flight}
+        self.date_index = {}  #出发日期 -> {航班ID: Flight}
+        #按(实际时刻, 航班编码)有序
+        self.city_dep_times = {}  #出发城市 -> 出发时刻的array('q')
+        self.city_dep_ids = {}  #出发城市 -> 与上面对应的航班编码array('i')
+        self.city_arr_times = {}  #到达城市 -> 到达时刻的array('q')
+        self.city_arr_ids = {}
+        #出发城市 -> 目的城市 -> 出发日期 -> RouteFares，日期为None的一项汇总该航线的全部日期
+        #首次查询某条航线时建立，之后随购票、退票、取消和航班修改增量维护
+        self.fares = {}
+        self.fares_complete = set()  #全部航线都已建立汇总的出发城市
+        self.fare_seats = array('i')  #编码 -> 计入open_by_*的余票，不可售时为-1
+        self.fares_lock = threading.Lock()
+        self.load_errors = []  #最近一次读取数据集时被拒绝的行
+        self.connection_table = None  #按实际出发时间排序的可用航班，供连接扫描路由使用，航班变化时置空
+        self.schedule_generation = 0  #航班变化的次数，查询线程据此判断建好的连接表是否已过时
+        self.schedule_lock = threading.Lock()
+        self.route_cache = RouteCache(route_cache_size)
+        self.reservations = {}  #航班ID -> 预约抢票的小顶堆[(优先级, 预约序号, 用户ID, 数量)]
+        self.reservation_seq = count()  #预约序号，同优先级按预约先后处理
+        self.reservation_log = []  #退票或取消航班时自动处理预约产生的结果，等待下次do_priority_queue一并返回
+        #并发购票：先取航班锁再取用户锁；持有航班锁时每次只持有一个用户锁，避免死锁
+        self.flight_locks = {}  #航班ID -> Lock，保护余票、预约队列和该航班的持票人
+        self.user_locks = {}  #用户ID -> Lock，保护该用户的购票记录和10个航班的上限
+        self.log_lock = threading.Lock()
+        #修改数据并写日志时共享持有，检查点独占持有，写快照和替换日志期间没有修改，也没有事务写入旧日志
+        self.write_gate = SharedLock()
+        self.wal = None  #预写日志，open_wal后启用
+        self.wal_checkpoint = None  #(快照路径, 数据集路径, 压缩阈值)
+        self.compacting = threading.Lock()
+        self.wal_deferred = threading.local()  #tokens不为None时，本线程的操作只写日志、不等待落盘
+        self.tickets = TicketBook(self.flight_ids)  #用户的购票信息，可按用户或按航班查找
+
+#原来的用户购票字典，现为TicketBook上的只读视图
+    @property
+    def user_tickets(self):
+        return UserTickets(self.tickets)
+
+#流式读取数据集：分块解析，坏行记录行号后跳过，解析的同时建立索引
+#workers > 1 时使用进程池并行解析各块，并按城市分片建图；返回被拒绝的行[(行号, 原因)]
+    def read_dataset(self, filename="flightDataset.txt", chunk_size=50000, workers=0):
+        rejected = []
+        with self._store_transaction():
+            dep_groups, arr_groups = self._begin_build(group=workers <= 1)
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    for parsed, bad in iter_flight_chunks(f, chunk_size, workers):
+                        rejected.extend(bad)
+                        for lineno, flt in parsed:
+                            if flt.flight_id in self.flight_map:
+                                rejected.append((lineno, f"航班ID重复: {flt.flight_id}"))
+                                continue
+                            self.flights.append(flt)
+                            self._register_flight(flt, dep_groups, arr_groups)
+            except OSError as e:
+                print(f"读取航班文件出错: {e}")
+        #构建基于时刻的航班图
+        if workers > 1:
+            self._finish_build_sharded(workers)
+        else:
+            self._finish_build(dep_groups, arr_groups)
+
+        rejected.sort()
+        self.load_errors = rejected
+        if rejected:
+            print(f"读取航班文件: 跳过 {len(rejected)} 行")
+            for lineno, reason in rejected[:10]:
+                print(f"  第{lineno}行: {reason}")
+        return rejected
+
+#构建航班图：按城市分组、按时间排序，二分查找可衔接航班；workers > 1 时按城市分片交给多个进程
+    def build_flight_graph(self, workers=0):
+        with self._store_transaction():
+            groups = self._begin_build(group=workers <= 1)
+        if workers > 1:
+            self._finish_build_sharded(workers)
+        else:
+            self._finish_build(*groups)
+
+#保存快照：航班各列、按城市排好序的出发/到达顺序、用户购票记录
+    def write_snapshot(self, path, source="flightDataset.txt"):
+        symbols = {}
+        def sym(value):
+            code = symbols.get(value)
+            if code is None:
+                code = symbols[value] = len(symbols)
+            return code
+
+        code_of = self.flight_ids.codes
+        position = array('i', [-1]) * len(self.flight_ids)  #航班编码 -> 在flights中的下标
+        for i, f in enumerate(self.flights):
+            position[code_of[f.flight_id]] = i
+        cols = {name: array('i') for name in ("dep_city", "des_city", "stop_over",
+                                               "dep_date", "dep_time", "arr_time")}
+        dep_min, arr_min = array('q'), array('q')
+        price, tickets, delay_time = array('d'), array('q'), array('q')
+        flags = array('B')
+        for f in self.flights:
+            cols["dep_city"].append(sym(f.departure_city))
+            cols["des_city"].append(sym(f.destination_city))
+            cols["stop_over"].append(sym(f.stop_over))
+            cols["dep_date"].append(sym(f.departure_date))
+            cols["dep_time"].append(sym(f.departure_time))
+            cols["arr_time"].append(sym(f.arrival_time))
+            dep_min.append(f.dep_min)
+            arr_min.append(f.arr_min)
+            price.append(f.price)
+            tickets.append(f.tickets)
+            delay_time.append(f.delay_time)
+            flags.append(f.is_delay | f.is_cancelled << 1 | f.is_for_sale << 2)
+
+        #城市有序数组按城市依次展开为航班下标，加载时无需重新排序
+        dep_order = array('i', (position[c] for ids in self.city_dep_ids.values() for c in ids))
+        dep_cities = array('i', (sym(c) for c in self.city_dep_ids))
+        dep_counts = array('i', (len(ids) for ids in self.city_dep_ids.values()))
+        arr_order = array('i', (position[c] for ids in self.city_arr_ids.values() for c in ids))
+        arr_cities = array('i', (sym(c) for c in self.city_arr_ids))
+        arr_counts = array('i', (len(ids) for ids in self.city_arr_ids.values()))
+
+        #已删除航班上的持票记录仍保留，其航班ID编号接在现有航班之后
+        users = self.tickets.user_ids()
+        held_ids = {}
+        t_user, t_flight, t_count = array('i'), array('i'), array('q')
+        for ui, uid in enumerate(users):
+            for fid, count in self.tickets.flights(uid).items():
+                i = position[code_of[fid]]
+                if i < 0:
+                    i = held_ids.setdefault(fid, len(self.flights) + len(held_ids))
+                t_user.append(ui)
+                t_flight.append(i)
+                t_count.append(count)
+
+        write_snapshot_file(path, source, dict(
+            ids=pack_strings(f.flight_id for f in self.flights), symbols=pack_strings(symbols),
+            **cols, dep_min=dep_min, arr_min=arr_min, price=price, tickets=tickets,
+            delay_time=delay_time, flags=flags, dep_order=dep_order, dep_cities=dep_cities,
+            dep_counts=dep_counts, arr_order=arr_order, arr_cities=arr_cities, arr_counts=arr_counts,
+            users=pack_strings(users), held_ids=pack_strings(held_ids), ticket_user=t_user,
+            ticket_flight=t_flight, ticket_count=t_count))
+
+#加载快照，快照缺失、相对源文件过期或内容损坏时返回False，由调用方改用文本读取
+#航班对象在加载时全部创建(非惰性)：flights、索引和航班图都直接持有Flight对象，按需创建需要改动所有访问路径
+#先解码并校验全部段，再替换系统状态，损坏的快照不会留下半截数据
+    def load_snapshot(self, path, source="flightDataset.txt"):
+        sec = read_snapshot_file(path, source)
+        if sec is None:
+            return False
+        try:
+            decoded = self._decode_snapshot(sec)
+        except (KeyError, IndexError, TypeError, ValueError, UnicodeDecodeError):
+            return False
+        flights, ids, city_orders, holdings = decoded
+
+        self.flights = flights
+        with self._store_transaction():
+            self._begin_build(group=False)
+        code_of = self.flight_ids.codes
+        codes = [code_of[fid] for fid in ids]
+
+        self.city_dep_times, self.city_dep_ids = {}, {}
+        self.city_arr_times, self.city_arr_ids = {}, {}
+        for times, id_lists, chunks, minutes in (
+                (self.city_dep_times, self.city_dep_ids, city_orders[0],
+                 [f.actual_dep_min for f in flights]),
+                (self.city_arr_times, self.city_arr_ids, city_orders[1],
+                 [f.actual_arr_min for f in flights])):
+            for city, chunk in chunks:
+                times[city] = array('q', [minutes[i] for i in chunk])
+                id_lists[city] = array('i', [codes[i] for i in chunk])
+        self._build_adjacency()
+
+        self.tickets.clear()
+        for uid, fid, c in holdings:
+            self.tickets.set(uid, fid, c)
+        if self.store is not None:
+            with self.store.transaction():
+                for uid, owned in self.tickets.items():
+                    for fid, c in owned.items():
+                        self.store.set_holding(uid, fid, c)
+        self.load_errors = []
+        return True
+
+#把快照各段还原为(航班列表, 航班ID, 两组[(城市, 航班下标列表)], 持票记录)，不改动系统状态
+#段长度或下标越界时抛出IndexError/ValueError
+    @staticmethod
+    def _decode_snapshot(sec):
+        ids = unpack_strings(sec["ids"])
+        symbols = unpack_strings(sec["symbols"], intern=True)
+        n = len(ids)
+        columns = ("dep_city", "des_city", "stop_over", "dep_date", "dep_time", "arr_time",
+                   "dep_min", "arr_min", "price", "tickets", "delay_time", "flags")
+        if any(len(sec[name]) != n for name in columns):
+            raise ValueError("快照的航班列长度不一致")
+        for name in columns[:6]:
+            if n and not 0 <= min(sec[name]) <= max(sec[name]) < len(symbols):
+                raise IndexError(f"快照段 {name} 的符号下标越界")
+        dep_city = [symbols[i] for i in sec["dep_city"]]
+        des_city = [symbols[i] for i in sec["des_city"]]
+        dep_min, arr_min = sec["dep_min"].tolist(), sec["arr_min"].tolist()
+        flights = [
+            Flight.restore(ids[i], dep_city[i], des_city[i], symbols[so], symbols[dd],
+                           symbols[dt], symbols[at], dep_min[i], arr_min[i], p, t,
+                           bool(fl & 1), d, bool(fl & 2), bool(fl & 4))
+            for i, (so, dd, dt, at, p, t, d, fl) in enumerate(zip(
+                sec["stop_over"], sec["dep_date"], sec["dep_time"], sec["arr_time"],
+                sec["price"], sec["tickets"], sec["delay_time"], sec["flags"]))]
+
+        city_orders = []
+        for order, cities, counts in ((sec["dep_order"], sec["dep_cities"], sec["dep_counts"]),
+                                      (sec["arr_order"], sec["arr_cities"], sec["arr_counts"])):
+            if len(cities) != len(counts) or sum(counts) != len(order) or min(counts, default=0) < 0:
+                raise ValueError("快照的城市顺序段不完整")
+            if order and not 0 <= min(order) <= max(order) < n:
+                raise IndexError("快照的城市顺序下标越界")
+            chunks, start = [], 0
+            for city, count in zip(cities, counts):
+                if not 0 <= city < len(symbols):
+                    raise IndexError("快照的城市下标越界")
+                chunks.append((symbols[city], order[start:start + count].tolist()))
+                start += count
+            city_orders.append(chunks)
+
+        users = unpack_strings(sec["users"])
+        all_ids = ids + unpack_strings(sec["held_ids"])
+        t_user, t_flight, t_count = sec["ticket_user"], sec["ticket_flight"], sec["ticket_count"]
+        if not len(t_user) == len(t_flight) == len(t_count):
+            raise ValueError("快照的持票记录段长度不一致")
+        if t_user and not (0 <= min(t_user) <= max(t_user) < len(users) and
+                           0 <= min(t_flight) <= max(t_flight) < len(all_ids)):
+            raise IndexError("快照的持票记录下标越界")
+        holdings = [(users[u], all_ids[i], c) for u, i, c in zip(t_user, t_flight, t_count)]
+        return flights, ids, city_orders, holdings
+
+#从SQLite数据库启动：读出航班和持票记录并重建索引与航班图，数据库为空时返回False
+    def load_storage(self):
+        flights, holdings = self.store.read_all()
+        if not flights:
+            return False
+        #数据库中已有这些记录，重建时不再写回
+        store, self.store = self.store, None
+        try:
+            self.flights = flights
+            self.build_flight_graph()
+            self.tickets.clear()
+            for uid, fid, c in holdings:
+                self._set_holding(uid, fid, c)
+        finally:
+            self.store = store
+        self.load_errors = []
+        return True
+
+#清空派生结构并登记已有航班，返回按城市分组的(时间, 航班编码)
+#航班编码不随重建改变，持票记录无需转换
+    def _begin_build(self, group=True):
+        with self.schedule_lock:
+            self.schedule_generation += 1
+            self.connection_table = None
+        self.route_cache.clear()
         self.flight_graph.clear()
-        self.flight_map = {f.flight_id: f for f in self.flights}
-        #初始化每个flight_id在图中对应的空列表
-        for f1 in self.flights:
-            self.flight_graph[f1.flight_id] = []
-
-        #双层循环，判断是否可衔接
-        for f1 in self.flights:
-            for f2 in self.flights:
-                if f1.flight_id == f2.flight_id:
-                    continue
-                #同城市且时间顺序正确即可衔接
-                if (f1.destination_city == f2.departure_city and
-                        f1.arrival_dt and f2.departure_dt and
-                        f2.departure_dt >= f1.arrival_dt):
-                    self.flight_graph[f1.flight_id].append(f2.flight_id)
+        self.flight_map = {}
+        self.flight_at = [None] * len(self.flight_ids)
+        self.flight_seq = array('q', bytes(8 * len(self.flight_ids)))
+        self.fares, self.fares_complete = {}, set()
+        self.fare_seats = array('i', [-1]) * len(self.flight_ids)
+        self.next_seq = 0
+        self.dep_index, self.route_index, self.date_index = {}, {}, {}
+        if self.store is not None:
+            self.store.load([])
+        dep_groups = {} if group else None
+        arr_groups = {} if group else None
+        for f in self.flights:
+            self._register_flight(f, dep_groups, arr_groups)
+        return dep_groups, arr_groups
+
+#一次遍历中登记航班的ID表、哈希索引、列式存储和城市分组
+    def _register_flight(self, f, dep_groups, arr_groups):
+        code = self._enter_flight(f)
+        #批量登记时序号递增，直接追加到索引桶末尾
+        fid = f.flight_id
+        self.dep_index.setdefault(f.departure_city, {})[fid] = f
+        self.route_index.setdefault((f.departure_city, f.destination_city), {})[fid] = f
+        self.date_index.setdefault(f.departure_date, {})[fid] = f
+        if self.store is not None:
+            self.store.append(f)
+        if dep_groups is not None:
+            dep_groups.setdefault(f.departure_city, []).append((f.actual_dep_min, code))
+            arr_groups.setdefault(f.destination_city, []).append((f.actual_arr_min, code))
+
+#为航班分配编码(曾出现过的航班ID沿用原编码)，登记ID表和先后序号，返回编码
+    def _enter_flight(self, f):
+        code = self.flight_ids.encode(f.flight_id)
+        while len(self.flight_at) <= code:
+            self.flight_at.append(None)
+            self.flight_seq.append(0)
+            self.fare_seats.append(-1)
+        self.flight_map[f.flight_id] = f
+        self.flight_at[code] = f
+        self.flight_seq[code] = self.next_seq
+        self.next_seq += 1
+        return code
+
+    def _finish_build(self, dep_groups, arr_groups):
+        #时间与编码分开存放便于二分，时间相同按编码排序
+        self.city_dep_times, self.city_dep_ids = {}, {}
+        for city, items in dep_groups.items():
+            items.sort()
+            self.city_dep_times[city] = array('q', [t for t, _ in items])
+            self.city_dep_ids[city] = array('i', [c for _, c in items])
+        self.city_arr_times, self.city_arr_ids = {}, {}
+        for city, items in arr_groups.items():
+            items.sort()
+            self.city_arr_times[city] = array('q', [t for t, _ in items])
+            self.city_arr_ids[city] = array('i', [c for _, c in items])
+        self._build_adjacency()
+
+#多进程版的_finish_build：子进程排序并二分，主进程按返回的下标组装城市数组和邻接表
+    def _finish_build_sharded(self, workers):
+        flights = self.flights
+        code_of = self.flight_ids.codes
+        cities = {}
+        columns = {
+            "dep_at": array('q', [f.actual_dep_min for f in flights]),
+            "arr_at": array('q', [f.actual_arr_min for f in flights]),
+            "dep_code": array('i', [cities.setdefault(f.departure_city, len(cities)) for f in flights]),
+            "des_code": array('i', [cities.setdefault(f.destination_city, len(cities)) for f in flights]),
+            "code": array('i', [code_of[f.flight_id] for f in flights])}
+        names = list(cities)
+        #按航班数由多到少，每次把城市分给当前负担最轻的分片
+        weight = Counter(columns["dep_code"])
+        weight.update(columns["des_code"])
+        shards = [[] for _ in range(min(workers, len(cities)))]
+        loads = [(0, i) for i in range(len(shards))]
+        for city, w in weight.most_common():
+            load, i = heapq.heappop(loads)
+            shards[i].append(city)
+            heapq.heappush(loads, (load + w, i))
+
+        parts = {}
+        if shards:
+            shm, layout = create_shared_columns(columns)
+            try:
+                with ProcessPoolExecutor(len(shards), mp_context=process_context(),
+                                         initializer=_shard_init, initargs=(shm.name, layout)) as pool:
+                    for result in pool.map(_shard_build, shards, repeat(self.graph_mode != "lazy")):
+                        for part in result:
+                            parts[part[0]] = part
+            finally:
+                shm.close()
+                shm.unlink()
+
+        codes, dep_at, arr_at = columns["code"], columns["dep_at"], columns["arr_at"]
+        #城市按首次出现的顺序排列，与单进程建图一致
+        self.city_dep_times, self.city_dep_ids = {}, {}
+        for c in dict.fromkeys(columns["dep_code"]):
+            order = parts[c][1]
+            self.city_dep_times[names[c]] = array('q', [dep_at[i] for i in order])
+            self.city_dep_ids[names[c]] = array('i', [codes[i] for i in order])
+        self.city_arr_times, self.city_arr_ids = {}, {}
+        for c in dict.fromkeys(columns["des_code"]):
+            order = parts[c][2]
+            self.city_arr_times[names[c]] = array('q', [arr_at[i] for i in order])
+            self.city_arr_ids[names[c]] = array('i', [codes[i] for i in order])
+        if self.graph_mode == "lazy":
+            return
+        empty = array('i')
+        for c, _, arrivals, starts in parts.values():
+            dep_ids = self.city_dep_ids.get(names[c], empty)
+            for i, start in zip(arrivals, starts):
+                f, code = flights[i], codes[i]
+                nxt = dep_ids[start:]
+                if f.departure_city == f.destination_city:
+                    nxt = array('i', [n for n in nxt if n != code])
+                self.flight_graph[code] = nxt
+
+    def _build_adjacency(self):
+        if self.graph_mode == "lazy":
+            return
+        for code, f in enumerate(self.flight_at):
+            if f is not None:
+                self.flight_graph[code] = self.next_flights(f)
+
+#返回可衔接的后继航班ID，lazy模式下即时从目的城市的出发数组切片
+    def successors(self, flight_id):
+        flt = self.flight_map.get(flight_id)
+        if flt is None:
+            return []
+        if self.graph_mode == "lazy":
+            nxt = self.next_flights(flt)
+        else:
+            nxt = self.flight_graph.get(self.flight_ids.codes[flight_id], ())
+        names = self.flight_ids.names
+        return [names[c] for c in nxt]
+
+#航班图规模：航班数、城市数、衔接边数(lazy模式下由有序出发数组二分计数，不生成邻接表)
+    def graph_stats(self):
+        if self.graph_mode == "lazy":
+            edges = 0
+            for f in self.flights:
+                times = self.city_dep_times.get(f.destination_city)
+                if times:
+                    edges += len(times) - bisect_left(times, f.actual_arr_min)
+        else:
+            edges = sum(len(nxt) for nxt in self.flight_graph.values())
+        return {"flights": len(self.flight_map),
+                "cities": len(self.city_dep_times.keys() | self.city_arr_times.keys()),
+                "edges": edges, "users": len(self.tickets),
+                "reservations": sum(len(q) for q in list(self.reservations.values()))}
+
+#目的城市中出发时间不早于本航班到达时间的航班即可衔接(均为计入延误后的实际时刻)
+#返回后继航班编码的array('i')
+    def next_flights(self, flt):
+        times = self.city_dep_times.get(flt.destination_city)
+        if not times:
+            return array('i')
+        start = bisect_left(times, flt.actual_arr_min)
+        nxt = self.city_dep_ids[flt.destination_city][start:]
+        if flt.departure_city == flt.destination_city:
+            code = self.flight_ids.codes[flt.flight_id]
+            nxt = array('i', [c for c in nxt if c != code])
+        return nxt
+
+#可衔接到本航班的前序航班编码（到达本航班出发城市且不晚于其出发）
+    def prev_flights(self, flt):
+        times = self.city_arr_times.get(flt.departure_city)
+        if not times:
+            return []
+        end = bisect_right(times, flt.actual_dep_min)
+        code = self.flight_ids.codes[flt.flight_id]
+        return [c for c in self.city_arr_ids[flt.departure_city][:end] if c != code]
+
+#把航班接入图中：出发侧影响前序航班的邻接表，到达侧决定自身的后继
+    def _link_departure(self, flt):
+        code = self.flight_ids.codes[flt.flight_id]
+        dep = flt.actual_dep_min
+        sorted_insert(self.city_dep_times.setdefault(flt.departure_city, array('q')),
+                      self.city_dep_ids.setdefault(flt.departure_city, array('i')), dep, code)
+        if self.graph_mode == "lazy":
+            return
+        key = (dep, code)
+        for pid in self.prev_flights(flt):
+            nxt = self.flight_graph[pid]
+            nxt.insert(self._successor_pos(nxt, key), code)
+
+    def _link_arrival(self, flt):
+        code = self.flight_ids.codes[flt.flight_id]
+        sorted_insert(self.city_arr_times.setdefault(flt.destination_city, array('q')),
+                      self.city_arr_ids.setdefault(flt.destination_city, array('i')),
+                      flt.actual_arr_min, code)
+        if self.graph_mode != "lazy":
+            self.flight_graph[code] = self.next_flights(flt)
+
+#前序航班的邻接表同样按(出发时间, 航班编码)有序，二分定位key=(出发时间, 航班编码)的位置
+    def _successor_pos(self, nxt, key):
+        flight_at = self.flight_at
+        lo, hi = 0, len(nxt)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (flight_at[nxt[mid]].actual_dep_min, nxt[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+#须在航班的出发时刻被修改之前调用，此时它在前序航班邻接表中的位置仍由原时刻决定
+    def _unlink_departure(self, flt):
+        code = self.flight_ids.codes[flt.flight_id]
+        if self.graph_mode != "lazy":
+            key = (flt.actual_dep_min, code)
+            for pid in self.prev_flights(flt):
+                nxt = self.flight_graph[pid]
+                i = self._successor_pos(nxt, key)
+                if i < len(nxt) and nxt[i] == code:
+                    del nxt[i]
+                elif code in nxt:
+                    nxt.remove(code)
+        sorted_remove(self.city_dep_times[flt.departure_city],
+                      self.city_dep_ids[flt.departure_city], flt.actual_dep_min, code)
+
+    def _unlink_arrival(self, flt):
+        code = self.flight_ids.codes[flt.flight_id]
+        sorted_remove(self.city_arr_times[flt.destination_city],
+                      self.city_arr_ids[flt.destination_city], flt.actual_arr_min, code)
+        if self.graph_mode != "lazy":
+            self.flight_graph[code] = array('i')
+
+#航班属性被修改后同步派生的数据结构
+    def _flight_changed(self, flt):
+        self._fares_refresh(flt)
+        if self.store is not None:
+            self.store.update(flt)
+
+#票价汇总的排序键：(票价或一天中的计划出发时刻, 先后序号)，与原来的稳定排序一致
+    def _fare_keys(self):
+        flight_at, seq = self.flight_at, self.flight_seq
+        return (lambda c: (flight_at[c].price, seq[c]),
+                lambda c: (flight_at[c].dep_min % 1440, seq[c]))
+
+#航班所在航线的(全部日期, 出发当天)两份汇总；航线尚未建立汇总时返回None，首次查询时再从索引建立
+#create为True时补建出发当天的汇总，出发城市的航线已全部建立时也补建航线(新出现的航线)
+    def _route_fares(self, flt, create=False):
+        dep = flt.departure_city
+        by_date = self.fares.get(dep, {}).get(flt.destination_city)
+        if by_date is None:
+            if not (create and dep in self.fares_complete):
+                return None
+            by_date = self.fares.setdefault(dep, {})[flt.destination_city] = {None: RouteFares()}
+        day = by_date.get(flt.departure_date)
+        if day is None:
+            if not create:
+                return None
+            day = by_date[flt.departure_date] = RouteFares()
+        return by_date[None], day
+
+#建立一条航线的票价汇总并返回{出发日期: RouteFares}，已建立时直接返回，航线没有航班时返回None
+#索引桶按先后顺序排列，按日期分组后各排序一次(稳定排序，相同票价/时刻保持先后顺序)；调用方持有fares_lock
+    def _route_ladders(self, dep, des):
+        by_date = self.fares.get(dep, {}).get(des)
+        if by_date is not None:
+            return by_date
+        flights = list(self.route_index.get((dep, des), {}).values())
+        if not flights:
+            return None
+        code_of, seats = self.flight_ids.codes, self.fare_seats
+        by_date = {None: []}
+        for f in flights:
+            code = code_of[f.flight_id]
+            seats[code] = f.tickets if on_sale(f) else -1
+            by_date[None].append(code)
+            by_date.setdefault(f.departure_date, []).append(code)
+        flight_at = self.flight_at
+        price = lambda c: flight_at[c].price
+        clock = lambda c: flight_at[c].dep_min % 1440
+        for day, codes in by_date.items():
+            fares = by_date[day] = RouteFares()
+            opened = [c for c in codes if seats[c] >= 0]
+            fares.by_time = sorted(codes, key=clock)
+            codes.sort(key=price)
+            fares.by_price = codes
+            fares.open_by_time = sorted(opened, key=clock)
+            opened.sort(key=price)
+            fares.open_by_price = opened
+            fares.seats = sum([seats[c] for c in opened])
+        self.fares.setdefault(dep, {})[des] = by_date
+        return by_date
+
+#以下两个方法由调用方持有fares_lock，与索引的修改一起进行，查询线程不会建立只含一半修改的汇总
+#航线尚未建立汇总时不做任何事
+    def _fares_add(self, flt):
+        route = self._route_fares(flt, create=True)
+        if route is None:
+            return
+        code = self.flight_ids.codes[flt.flight_id]
+        price, clock = self._fare_keys()
+        available = on_sale(flt)
+        for fares in route:
+            insort(fares.by_price, code, key=price)
+            insort(fares.by_time, code, key=clock)
+            if available:
+                insort(fares.open_by_price, code, key=price)
+                insort(fares.open_by_time, code, key=clock)
+                fares.seats += flt.tickets
+        self.fare_seats[code] = flt.tickets if available else -1
+
+#须在航班的城市、日期、时刻、票价被修改之前调用，排序键仍是原来的值
+    def _fares_remove(self, flt):
+        route = self._route_fares(flt)
+        if route is None:
+            return
+        code = self.flight_ids.codes[flt.flight_id]
+        price, clock = self._fare_keys()
+        listed = self.fare_seats[code]
+        for fares in route:
+            ladder_remove(fares.by_price, code, price)
+            ladder_remove(fares.by_time, code, clock)
+            if listed >= 0:
+                ladder_remove(fares.open_by_price, code, price)
+                ladder_remove(fares.open_by_time, code, clock)
+                fares.seats -= listed
+        self.fare_seats[code] = -1
+        by_des = self.fares[flt.departure_city]
+        by_date = by_des[flt.destination_city]
+        if not by_date[flt.departure_date].by_price:
+            del by_date[flt.departure_date]
+        if not by_date[None].by_price:
+            del by_des[flt.destination_city]
+            if not by_des:
+                del self.fares[flt.departure_city]
+
+#余票或可售状态变化：调整余票合计，在可售列表中加入或移出
+    def _fares_refresh(self, flt):
+        code = self.flight_ids.codes[flt.flight_id]
+        now = flt.tickets if on_sale(flt) else -1
+        with self.fares_lock:
+            route = self._route_fares(flt)
+            listed = self.fare_seats[code]
+            if route is None or listed == now:
+                return
+            self.fare_seats[code] = now
+            if listed >= 0 and now >= 0:  #仍可售，只有余票变化
+                for fares in route:
+                    fares.seats += now - listed
+                return
+            price, clock = self._fare_keys()
+            for fares in route:
+                if listed >= 0:
+                    ladder_remove(fares.open_by_price, code, price)
+                    ladder_remove(fares.open_by_time, code, clock)
+                    fares.seats -= listed
+                else:
+                    insort(fares.open_by_price, code, key=price)
+                    insort(fares.open_by_time, code, key=clock)
+                    fares.seats += now
+
+#用户在航班上的持票数变化后同步到存储
+    def _holding_changed(self, user_id, flight_id):
+        if self.store is not None:
+            self.store.set_holding(user_id, flight_id, self.tickets.count(user_id, flight_id))
+
+#一次购票/退票/取消涉及的多处修改在存储中作为一个事务提交
+    def _store_transaction(self):
+        return self.store.transaction() if self.store is not None else nullcontext()
+
+#航班的时刻、票价、取消状态或增删会影响行程规划
+#行程搜索只在展开某城市时才读取该城市的出发航班，因此按出发城市淘汰缓存即可
+#须在修改之后调用：此前开始的搜索和连接表不再写入缓存
+    def _schedule_changed(self, flt):
+        with self.schedule_lock:
+            self.schedule_generation += 1
+            self.connection_table = None
+        self.route_cache.invalidate(flt.departure_city, flt.flight_id)
+
+#哈希索引的各个桶：出发城市、(出发城市, 目的城市)、出发日期
+    def _index_buckets(self, flt):
+        return ((self.dep_index, flt.departure_city),
+                (self.route_index, (flt.departure_city, flt.destination_city)),
+                (self.date_index, flt.departure_date))
+
+    def _index_add(self, flt):
+        fid = flt.flight_id
+        code_of, flight_seq = self.flight_ids.codes, self.flight_seq
+        seq = flight_seq[code_of[fid]]
+        for index, key in self._index_buckets(flt):
+            bucket = index.setdefault(key, {})
+            last = next(reversed(bucket), None)
+            bucket[fid] = flt
+            #修改城市/日期后迁入的航班可能排在中间，按序号重排该桶
+            if last is not None and flight_seq[code_of[last]] > seq:
+                index[key] = dict(sorted(bucket.items(), key=lambda kv: flight_seq[code_of[kv[0]]]))
+
+    def _index_remove(self, flt):
+        for index, key in self._index_buckets(flt):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(flt.flight_id, None)
+                if not bucket:
+                    del index[key]
 
 #返回航班ID
     def get_flight_by_id(self, flight_id):
-        for f in self.flights:
-            if f.flight_id == flight_id:
-                return f
-        return None
+        return self.flight_map.get(flight_id)
+
+#返回某日出发的全部航班
+    def flights_on_date(self, departure_date):
+        return list(self.date_index.get(departure_date, {}).values())
+
+#启用预写日志：先重放path中基于base的事务，再在其后续写
+#base为当前已加载数据的标识，如["snapshot", 大小, 修改时间]；与日志首行不符时日志改名为.stale后新建
+#snapshot/source/compact_every: 日志事务数超过compact_every时写快照并以新日志替换(压缩)
+#返回重放的事务数
+    def open_wal(self, path, base, sync="group", snapshot="flightDataset.snap",
+                 source="flightDataset.txt", compact_every=100000):
+        header = {"wal": WAL_VERSION, "base": list(base)}
+        found = read_wal(path)
+        replayed, keep = 0, None
+        if found is not None:
+            old_header, transactions, good = found
+            if old_header == header:
+                for records in transactions:
+                    self._apply_wal(records)
+                replayed, keep = len(transactions), good
+            else:
+                os.replace(path, path + ".stale")
+                print(f"日志 {path} 与当前数据不匹配，已改名为 {path}.stale")
+        self.wal = WriteAheadLog(path, header, sync, keep)
+        self.wal.records = replayed
+        self.wal_checkpoint = (snapshot, source, compact_every)
+        return replayed
+
+    def close_wal(self):
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+#检查点：暂停全部修改，写快照后用只含未处理预约的新日志替换旧日志
+    def checkpoint(self):
+        snapshot, source, _ = self.wal_checkpoint
+        with self.write_gate.exclusive():
+            self.write_snapshot(snapshot, source)
+            old = self.wal
+            old.close()
+            tmp = old.path + ".tmp"
+            wal = WriteAheadLog(tmp, {"wal": WAL_VERSION,
+                                      "base": ["snapshot", *source_signature(snapshot)]}, "none")
+            for fid, queue in self.reservations.items():
+                for priority, _, uid, qty in sorted(queue):
+                    wal.append([["reserve", fid, priority, uid, qty]])
+            wal.file.flush()
+            os.fsync(wal.file.fileno())
+            wal.close()
+            os.replace(tmp, old.path)
+            self.wal = WriteAheadLog(old.path, sync=old.sync, keep=os.path.getsize(old.path))
+            self.wal.records = wal.records
+
+#写入一个事务，返回(日志, 序号)；须在修改数据的锁内调用，保证同一航班/用户的事务按修改顺序记录
+#调用方同时共享持有write_gate，检查点不会在修改与写日志之间替换日志
+    def _log(self, *records):
+        wal = self.wal
+        if wal is None or not records:
+            return None
+        return (wal, wal.append(records))
+
+#等待事务落盘，须在释放锁之后调用；可一次给出多个事务，合并等待
+    def _wal_commit(self, *tokens):
+        tokens = [token for token in tokens if token is not None]
+        if not tokens:
+            return
+        deferred = getattr(self.wal_deferred, "tokens", None)
+        if deferred is not None:
+            deferred.extend(tokens)
+            return
+        self.wal_sync(tokens)
+
+#等待一组事务落盘；日志过长时顺带压缩(本线程仍持有write_gate时不压缩，以免等待自己)
+    def wal_sync(self, tokens):
+        for wal, seq in tokens:
+            wal.wait(seq)
+        wal = self.wal
+        if wal is not None and wal.records >= self.wal_checkpoint[2] \
+                and not self.write_gate.held() and self.compacting.acquire(blocking=False):
+            try:
+                if self.wal is wal:
+                    self.checkpoint()
+            finally:
+                self.compacting.release()
+
+#重放一个事务；重放期间不再写日志
+    def _apply_wal(self, records):
+        wal, self.wal = self.wal, None
+        try:
+            for rec in records:
+                kind = rec[0]
+                if kind == "tickets":
+                    flt = self.flight_map.get(rec[1])
+                    if flt:
+                        flt.tickets = rec[2]
+                        self._flight_changed(flt)
+                elif kind == "hold":
+                    self._set_holding(rec[1], rec[2], rec[3])
+                elif kind == "flight":
+                    self.update_flight(rec[1], **rec[2])
+                elif kind == "add":
+                    self.add_flight(Flight(*rec[1]))
+                elif kind == "delete":
+                    self.delete_flight_by_id(rec[1])
+                elif kind == "reserve":
+                    heapq.heappush(self.reservations.setdefault(rec[1], []),
+                                   (rec[2], next(self.reservation_seq), rec[3], rec[4]))
+                elif kind == "dequeue":
+                    queue = self.reservations[rec[1]]
+                    for _ in range(rec[2]):
+                        heapq.heappop(queue)
+                    if not queue:
+                        del self.reservations[rec[1]]
+                elif kind == "drop":
+                    self.reservations.pop(rec[1], None)
+        finally:
+            self.wal = wal
+
+#把用户在航班上的持票数设为count(0表示不再持有)
+    def _set_holding(self, user_id, flight_id, count):
+        self.tickets.set(user_id, flight_id, count)
+        self._holding_changed(user_id, flight_id)
+
+    def _holding_record(self, user_id, flight_id):
+        return ("hold", user_id, flight_id, self.tickets.count(user_id, flight_id))
+
+#处理预约后需要记录的结果：获得机票的用户持票数及队列的出队/删除
+    def _reservation_records(self, flight_id, results):
+        if not results:
+            return []
+        records = [self._holding_record(uid, flight_id)
+                   for uid in dict.fromkeys(r[0] for r in results if r[3])]
+        if flight_id in self.reservations:
+            records.append(("dequeue", flight_id, len(results)))
+        else:
+            records.append(("drop", flight_id))
+        return records
 
-#增加航班
+#增加航班，只更新与其衔接的航班
     def add_flight(self, flight_obj):
-        self.flights.append(flight_obj)
-        self.build_flight_graph()
-
-#删除航班
+        fid = flight_obj.flight_id
+        if fid in self.flight_map:
+            return False
+        with self.write_gate.shared():
+            self.flights.append(flight_obj)
+            self._enter_flight(flight_obj)
+            with self.fares_lock:
+                self._index_add(flight_obj)
+                self._fares_add(flight_obj)
+            self._link_arrival(flight_obj)
+            self._link_departure(flight_obj)
+            if self.store is not None:
+                self.store.append(flight_obj)
+            self._schedule_changed(flight_obj)
+            token = self._log(("add", flight_fields(flight_obj)))
+        self._wal_commit(token)
+        return True
+
+#删除航班，移除结点及指向它的边；持有航班锁，与该航班上的购票、退票互斥
     def delete_flight_by_id(self, flight_id):
-        self.flights = [f for f in self.flights if f.flight_id != flight_id]
-        self.build_flight_graph()
-
-#更新航班，重建航班图
+        flt = self.flight_map.get(flight_id)
+        if not flt:
+            return False
+        with self.write_gate.shared(), self._flight_lock(flight_id):
+            if self.flight_map.get(flight_id) is not flt:
+                return False  #已被并发删除
+            self._unlink_departure(flt)
+            self._unlink_arrival(flt)
+            code = self.flight_ids.codes[flight_id]
+            self.flight_graph.pop(code, None)
+            with self.fares_lock:
+                self._index_remove(flt)
+                self._fares_remove(flt)
+            del self.flight_map[flight_id]
+            self.flight_at[code] = None
+            self.flights = [f for f in self.flights if f.flight_id != flight_id]
+            if self.store is not None:
+                self.store.remove(flight_id)
+            self._schedule_changed(flt)
+            token = self._log(("delete", flight_id))
+        self._wal_commit(token)
+        return True
+
+#更新航班，只重新衔接发生变化的一侧
     def update_flight(self, flight_id, **kwargs):
         flt = self.get_flight_by_id(flight_id)
-        if flt:
+        if not flt:
+            return
+        with self.write_gate.shared():
+            self._apply_changes(flt, kwargs)
+            token = self._log(("flight", flight_id, flight_state(flt)))
+        self._wal_commit(token)
+
+#修改航班字段并同步索引、航班图和存储；延误同样改变实际时刻，需要重新衔接
+    def _apply_changes(self, flt, kwargs):
+        kwargs = {k: v for k, v in kwargs.items() if hasattr(flt, k)}
+
+        #先校验新的日期/时刻，避免解除衔接后才发现格式错误
+        day = kwargs.get("departure_date", flt.departure_date)
+        epoch_minutes(day, kwargs.get("departure_time", flt.departure_time))
+        epoch_minutes(day, kwargs.get("arrival_time", flt.arrival_time))
+
+        changed = {k for k, v in kwargs.items() if getattr(flt, k) != v}
+        dep_changed = bool(changed & {"departure_city", "departure_date", "departure_time",
+                                      "is_delay", "delay_time"})
+        #出发时刻变化可能改变是否跨日，也影响到达时间
+        arr_changed = bool(changed & {"destination_city", "departure_date", "departure_time",
+                                      "arrival_time", "is_delay", "delay_time"})
+        index_changed = bool(changed & {"departure_city", "destination_city", "departure_date"})
+        fares_changed = bool(changed & {"departure_city", "destination_city", "departure_date",
+                                        "departure_time", "price"})
+        if "departure_city" in changed:
+            self._schedule_changed(flt)  #原出发城市上的缓存结果同样失效
+        if dep_changed:
+            self._unlink_departure(flt)
+        if arr_changed:
+            self._unlink_arrival(flt)
+        with self.fares_lock if fares_changed else nullcontext():
+            if index_changed:
+                self._index_remove(flt)
+            if fares_changed:
+                self._fares_remove(flt)
             for k, v in kwargs.items():
-                if hasattr(flt, k):
-                    setattr(flt, k, v)
-            self.build_flight_graph()
-
-#设置航班延误标记和延误时长
+                setattr(flt, k, v)
+            if index_changed:
+                self._index_add(flt)
+            if fares_changed:
+                self._fares_add(flt)
+        if arr_changed:
+            self._link_arrival(flt)
+        if dep_changed:
+            self._link_departure(flt)
+        self._flight_changed(flt)
+        self._schedule_changed(flt)
+
+#设置航班延误标记和延误时长，航班图按新的实际时刻重新衔接
     def delay_flight(self, flight_id, delay_minutes):
-        flt = self.get_flight_by_id(flight_id)
-        if flt:
-            flt.is_delay = True
-            flt.delay_time = delay_minutes
+        self.update_flight(flight_id, is_delay=True, delay_time=delay_minutes)
 
-#标记被取消航班
+#标记被取消航班并自动退票，返回被退票的[(用户ID, 张数)]；航班不存在时返回None
     def cancel_flight(self, flight_id):
         flt = self.get_flight_by_id(flight_id)
-        if flt:
-            flt.is_cancelled = True
-            flt.is_for_sale = False
-            self.canceled_flight_tuipiao(flight_id)
+        if not flt:
+            return None
+        with self.write_gate.shared(), self._flight_lock(flight_id), self._store_transaction():
+            refunded, token = self._cancel_locked(flt)
+        self._wal_commit(token)
+        return refunded
+
+#持有航班锁时取消航班，返回(被退票的[(用户ID, 张数)], 日志凭据)
+    def _cancel_locked(self, flt):
+        flight_id = flt.flight_id
+        flt.is_cancelled = True
+        flt.is_for_sale = False
+        self._flight_changed(flt)
+        self._schedule_changed(flt)
+        results = self._process_reservations(flight_id)
+        self._log_reservations(results)
+        refunded = self.canceled_flight_tuipiao(flight_id)
+        token = self._log(("flight", flight_id, flight_state(flt)),
+                          *self._reservation_records(flight_id, results),
+                          *(("hold", uid, flight_id, 0) for uid, _ in refunded))
+        return refunded, token
+
+#按条件选出航班，多个条件同时给出时取交集，返回(航班列表, 不存在的航班ID)
+#flight_ids: 航班ID列表；city: 出发或到达城市；date_from/date_to: 出发日期区间(含两端，YYYYMMDD)
+    def select_flights(self, flight_ids=None, city=None, date_from=None, date_to=None):
+        missing = []
+        if flight_ids is not None:
+            flights = []
+            for fid in dict.fromkeys(flight_ids):
+                flt = self.flight_map.get(fid)
+                if flt is None:
+                    missing.append(fid)
+                else:
+                    flights.append(flt)
+        elif city is not None:
+            found = dict(self.dep_index.get(city, {}))
+            for code in self.city_arr_ids.get(city, ()):
+                flt = self.flight_at[code]
+                found.setdefault(flt.flight_id, flt)
+            code_of = self.flight_ids.codes
+            flights = sorted(found.values(), key=lambda f: self.flight_seq[code_of[f.flight_id]])
+        elif date_from is not None or date_to is not None:
+            flights = [f for day, bucket in list(self.date_index.items())
+                       if (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+                       for f in bucket.values()]
+        else:
+            raise ValueError("请给出航班ID、城市或日期区间")
+        if city is not None:
+            flights = [f for f in flights if city in (f.departure_city, f.destination_city)]
+        if date_from is not None:
+            flights = [f for f in flights if f.departure_date >= date_from]
+        if date_to is not None:
+            flights = [f for f in flights if f.departure_date <= date_to]
+        return flights, missing
+
+#批量取消航班(如恶劣天气下按城市和日期停航)，条件同select_flights
+#一次遍历逐个取消并退票，日志合并为一次落盘；返回汇总报告：
+#  {"cancelled": [航班ID], "missing": [航班ID], "refunds": {用户ID: {航班ID: 张数}}, 及_connection_impact的各项}
+#max_layover: 衔接影响只统计中转时间不超过该分钟数的航班对，None为不限
+    def cancel_flights(self, flight_ids=None, city=None, date_from=None, date_to=None, max_layover=240):
+        flights, missing = self.select_flights(flight_ids, city, date_from, date_to)
+        report = {"cancelled": [], "missing": missing, "refunds": {}}
+        tokens = []
+        with self.write_gate.shared(), self._store_transaction():
+            before = self._impact_before(flights, max_layover)
+            for flt in flights:
+                fid = flt.flight_id
+                with self._flight_lock(fid):
+                    refunded, token = self._cancel_locked(flt)
+                tokens.append(token)
+                report["cancelled"].append(fid)
+                for uid, count in refunded:
+                    report["refunds"].setdefault(uid, {})[fid] = count
+            report.update(self._connection_impact(before))
+        self._wal_commit(*tokens)
+        return report
+
+#批量设置延误，条件同select_flights；各航班按新的实际时刻重新衔接，日志合并为一次落盘
+#返回{"delayed": [航班ID], "missing": [航班ID]}及_connection_impact的各项，max_layover同cancel_flights
+    def delay_flights(self, delay_minutes, flight_ids=None, city=None, date_from=None, date_to=None,
+                      max_layover=240):
+        flights, missing = self.select_flights(flight_ids, city, date_from, date_to)
+        report = {"delayed": [f.flight_id for f in flights], "missing": missing}
+        tokens = []
+        with self.write_gate.shared(), self._store_transaction():
+            before = self._impact_before(flights, max_layover)
+            for flt in self._set_delays(flights, delay_minutes):
+                tokens.append(self._log(("flight", flt.flight_id, flight_state(flt))))
+            report.update(self._connection_impact(before))
+        self._wal_commit(*tokens)
+        return report
+
+#一次修改多个航班的延误：逐个在城市有序数组中按新时刻移位，
+#materialized模式下最后为涉及的每个出发城市重建一次到达该城市的航班的邻接表，
+#而不是每个航班各自修改全部前序航班的列表(同一枢纽的航班越多，节省越多)；返回延误有变化的航班
+#逐个修改时每个航班在原时刻和新时刻各处理一遍前序航班，处理的前序航班少于要重建的航班时
+#(如只延误一两个航班)逐个修改更快
+    def _set_delays(self, flights, delay_minutes):
+        changed = [f for f in flights if not f.is_delay or f.delay_time != delay_minutes]
+        if self.graph_mode != "lazy" and \
+                self._relinked_count(changed, delay_minutes) < self._rebuilt_count(changed):
+            for flt in changed:
+                self._apply_changes(flt, {"is_delay": True, "delay_time": delay_minutes})
+            return changed
+        code_of = self.flight_ids.codes
+        for flt in changed:
+            code, dep, des = code_of[flt.flight_id], flt.departure_city, flt.destination_city
+            dep_times, dep_ids = self.city_dep_times[dep], self.city_dep_ids[dep]
+            arr_times, arr_ids = self.city_arr_times[des], self.city_arr_ids[des]
+            sorted_remove(dep_times, dep_ids, flt.actual_dep_min, code)
+            sorted_remove(arr_times, arr_ids, flt.actual_arr_min, code)
+            flt.is_delay = True
+            flt.delay_time = delay_minutes
+            sorted_insert(dep_times, dep_ids, flt.actual_dep_min, code)
+            sorted_insert(arr_times, arr_ids, flt.actual_arr_min, code)
+            self._flight_changed(flt)
+            self._schedule_changed(flt)
+        if self.graph_mode != "lazy":
+            cities = {f.departure_city for f in changed}
+            for city in cities:
+                for pid in self.city_arr_ids.get(city, ()):
+                    self.flight_graph[pid] = self.next_flights(self.flight_at[pid])
+            for flt in changed:
+                if flt.destination_city not in cities:
+                    self.flight_graph[code_of[flt.flight_id]] = self.next_flights(flt)
+        return changed
+
+#逐个修改延误时要处理的前序航班数：原实际出发时刻和新实际出发时刻之前到达出发城市的航班
+    def _relinked_count(self, flights, delay_minutes):
+        total = 0
+        for flt in flights:
+            times = self.city_arr_times.get(flt.departure_city, ())
+            total += bisect_right(times, flt.actual_dep_min)
+            total += bisect_right(times, flt.dep_min + delay_minutes)
+        return total
+
+#批量修改延误时要重建邻接表的航班数：到达各航班出发城市的全部航班
+    def _rebuilt_count(self, flights):
+        return sum(len(self.city_arr_ids.get(city, ()))
+                   for city in {f.departure_city for f in flights})
+
+#变更前(与变更在同一个write_gate区间内)记下受影响航班的实际时刻和取消状态、这些航班上持票用户的全部持票，
+#以及航班图中与这些航班相互衔接的航班对：沿反向边(到达城市索引)找前序航班，沿出发城市索引找后继航班
+    def _impact_before(self, flights, max_layover=None):
+        times = {f.flight_id: (f.actual_dep_min, f.actual_arr_min, f.is_cancelled) for f in flights}
+        code_of, flight_at = self.flight_ids.codes, self.flight_at
+        links = set()  #(前一程航班编码, 后一程航班编码)
+        for flt in flights:
+            if flt.is_cancelled:
+                continue
+            code = code_of[flt.flight_id]
+            links.update((pid, code) for pid in self.feeder_window(flt, max_layover)
+                         if not flight_at[pid].is_cancelled)
+            links.update((code, nid) for nid in self.layover_window(flt, 0, max_layover)
+                         if not flight_at[nid].is_cancelled)
+        tickets = {}
+        for fid in times:
+            with self._flight_lock(fid):
+                holders = self.tickets.holders(fid)
+            for uid in holders:
+                if uid not in tickets:
+                    with self._user_lock(uid):
+                        tickets[uid] = self.tickets.flights(uid)
+        return times, tickets, links
+
+#变更后的衔接影响。原先可衔接(到达不晚于出发、均未取消)而变更后不再可衔接的航班对即为断开的衔接：
+#- 航班图中变更前记下的航班对，不论是否有人持票，即受影响的下游行程
+#- 由航班到持票人的反向索引找到受影响的用户，其持有的航班两两之间(不受中转时间窗口限制)
+#返回{"connections": [(前一程航班ID, 后一程航班ID)], "holders": {用户ID: {受影响航班ID: 张数}},
+#     "broken": {用户ID: [(前一程航班ID, 后一程航班ID)]}}
+    def _connection_impact(self, before):
+        times, tickets, links = before
+        names, flight_at = self.flight_ids.names, self.flight_at
+        connections = []
+        for a, b in links:
+            fa, fb = flight_at[a], flight_at[b]
+            if fa is None or fb is None or fa.is_cancelled or fb.is_cancelled or \
+                    fa.actual_arr_min > fb.actual_dep_min:
+                connections.append((names[a], names[b]))
+        connections.sort()
+        holders, broken = {}, {}
+        for uid, owned in tickets.items():
+            holders[uid] = {fid: c for fid, c in owned.items() if fid in times}
+            legs = []
+            for fid in owned:
+                flt = self.flight_map.get(fid)
+                if flt is not None:
+                    old = times.get(fid, (flt.actual_dep_min, flt.actual_arr_min, flt.is_cancelled))
+                    legs.append((flt, old))
+            for a, (_, a_arr, a_cancelled) in legs:
+                for b, (b_dep, _, b_cancelled) in legs:
+                    if a is b or a.destination_city != b.departure_city:
+                        continue
+                    if a.flight_id not in times and b.flight_id not in times:
+                        continue
+                    if a_cancelled or b_cancelled or a_arr > b_dep:
+                        continue
+                    if a.is_cancelled or b.is_cancelled or a.actual_arr_min > b.actual_dep_min:
+                        broken.setdefault(uid, []).append((a.flight_id, b.flight_id))
+        return {"connections": connections, "holders": holders, "broken": broken}
 
-#取消航班自动退票
+#取消航班自动退票：由反向索引直接找到持票用户，返回[(用户ID, 张数)]
     def canceled_flight_tuipiao(self, flight_id):
-        sign = []
-        #遍历所有用户的购买记录
-        for user_id, flight_dict in self.user_tickets.items():
-            if flight_id in flight_dict:
-                count = flight_dict[flight_id]
-                # 删除该用户的航班购票信息
-                del flight_dict[flight_id]
-                sign.append((user_id, count))
-
-        #如果有用户受影响，则在界面弹窗提示
-        if sign:
-            lines = ["以下用户已自动退票："]
-            for (uid, c) in sign:
-                lines.append(f"用户 {uid} 已自动退票 {c} 张")
-            messagebox.showinfo("航班取消", "\n".join(lines))
+        holders = self.tickets.holders(flight_id)
+        for user_id in holders:
+            with self._user_lock(user_id):
+                self._set_holding(user_id, flight_id, 0)
+        return list(holders.items())
+
+#按需创建的细粒度锁；dict.setdefault在CPython中是原子的，并发创建时只会有一个锁生效
+    def _flight_lock(self, flight_id):
+        lock = self.flight_locks.get(flight_id)
+        return lock if lock is not None else self.flight_locks.setdefault(flight_id, threading.Lock())
+
+    def _user_lock(self, user_id):
+        lock = self.user_locks.get(user_id)
+        return lock if lock is not None else self.user_locks.setdefault(user_id, threading.Lock())
+
+    def _log_reservations(self, results):
+        if results:
+            with self.log_lock:
+                self.reservation_log.extend(results)
+
+#登记/扣除用户持票，TicketBook同时维护用户与航班两侧的记录；返回用户在该航班上的新张数
+    def _add_tickets(self, user_id, flight_id, quantity):
+        held = self.tickets.add(user_id, flight_id, quantity)
+        self._holding_changed(user_id, flight_id)
+        return held
+
+    def _remove_tickets(self, user_id, flight_id, quantity):
+        held = self.tickets.add(user_id, flight_id, -quantity)
+        self._holding_changed(user_id, flight_id)
+        return held
 
 #返回用户对指定航班的已购票数量
     def get_tickets_number(self, user_id, flight_id):
-        if user_id not in self.user_tickets:
-            return 0
-        return self.user_tickets[user_id].get(flight_id, 0)
+        return self.tickets.count(user_id, flight_id)
 
 #返回用户购买的航班数量
     def get_flights_number(self, user_id):
-        if user_id not in self.user_tickets:
-            return 0
-        return len(self.user_tickets[user_id])
+        return self.tickets.num_flights(user_id)
 
-#购票处理
+#购票处理：持有航班锁和用户锁完成检查与扣减，可被多个线程同时调用
     def buy_ticket(self, user_id, flight_id, quantity):
+        if quantity <= 0:
+            return (False, "购票数量需为正数")
         flt = self.get_flight_by_id(flight_id)
         if not flt:
             return (False, "航班不存在")
-        if flt.is_cancelled or not flt.is_for_sale:
-            return (False, "该航班不可售票")
-        if flt.tickets < quantity:
-            return (False, "余票不足")
-
-        user_flight_count = self.get_flights_number(user_id)
-        already = self.get_tickets_number(user_id, flight_id)
-        if already == 0 and user_flight_count >= 10:
-            return (False, "您已购买了10个不同航班，无法再购买新的航班")
-
-        #扣减余票，更新用户信息
-        flt.tickets -= quantity
-        if user_id not in self.user_tickets:
-            self.user_tickets[user_id] = {}
-        self.user_tickets[user_id][flight_id] = \
-            self.user_tickets[user_id].get(flight_id, 0) + quantity
+        with self.write_gate.shared(), self._flight_lock(flight_id), self._user_lock(user_id), \
+                self._store_transaction():
+            if self.flight_map.get(flight_id) is not flt:
+                return (False, "航班不存在")  #取锁期间航班被删除
+            if flt.is_cancelled or not flt.is_for_sale:
+                return (False, "该航班不可售票")
+            if flt.tickets < quantity:
+                return (False, "余票不足")
+
+            user_flight_count = self.get_flights_number(user_id)
+            already = self.get_tickets_number(user_id, flight_id)
+            if already == 0 and user_flight_count >= 10:
+                return (False, "您已购买了10个不同航班，无法再购买新的航班")
+
+            #扣减余票，更新用户信息
+            flt.tickets -= quantity
+            self._flight_changed(flt)
+            held = self._add_tickets(user_id, flight_id, quantity)
+            token = self._log(("tickets", flight_id, flt.tickets), ("hold", user_id, flight_id, held))
+        self._wal_commit(token)
 
         return (True, "购票成功")
 
 #退票处理
     def refund_ticket(self, user_id, flight_id, quantity):
+        if quantity <= 0:
+            return (False, "退票数量需为正数")
         flt = self.get_flight_by_id(flight_id)
         if not flt:
             return (False, "该航班不存在")
-        owned = self.get_tickets_number(user_id, flight_id)
-        if owned == 0:
-            return (False, "您未购买过此航班，无法退票")
-        if owned < quantity:
-            return (False, "退票数量超过已购数量，无法退票")
-        if not flt.is_cancelled:
-            flt.tickets += quantity
-
-        self.user_tickets[user_id][flight_id] = owned - quantity
-        if self.user_tickets[user_id][flight_id] == 0:
-            del self.user_tickets[user_id][flight_id]
+        with self.write_gate.shared(), self._flight_lock(flight_id), self._store_transaction():
+            if self.flight_map.get(flight_id) is not flt:
+                return (False, "该航班不存在")  #取锁期间航班被删除
+            with self._user_lock(user_id):
+                owned = self.get_tickets_number(user_id, flight_id)
+                if owned == 0:
+                    return (False, "您未购买过此航班，无法退票")
+                if owned < quantity:
+                    return (False, "退票数量超过已购数量，无法退票")
+                if not flt.is_cancelled:
+                    flt.tickets += quantity
+                    self._flight_changed(flt)
+
+                self._remove_tickets(user_id, flight_id, quantity)
+            #余票增加后立即按优先顺序处理该航班的预约，排不上的继续等待
+            results = self._process_reservations(flight_id, settle=False)
+            self._log_reservations(results)
+            token = self._log(("tickets", flight_id, flt.tickets),
+                              self._holding_record(user_id, flight_id),
+                              *self._reservation_records(flight_id, results))
+        self._wal_commit(token)
 
         return (True, "退票成功")
 
-#预约抢票
+#预约抢票：按航班分别排队，同优先级先到先得；返回(是否加入队列, 说明)
     def reserve_ticket(self, user_id, flight_id, priority=0, quantity=1):
-        heapq.heappush(self.priority_queue, (priority, user_id, flight_id, quantity))
+        if quantity <= 0:
+            return (False, "抢票数量需为正数")
+        with self.write_gate.shared(), self._flight_lock(flight_id):
+            heapq.heappush(self.reservations.setdefault(flight_id, []),
+                           (priority, next(self.reservation_seq), user_id, quantity))
+            token = self._log(("reserve", flight_id, priority, user_id, quantity))
+        self._wal_commit(token)
+        return (True, "已加入预约队列")
+
+#抢票优先队列处理：逐个航班整批处理其预约队列，flight_ids为None时处理全部航班
+#返回[(用户ID, 航班ID, 数量, 是否成功, 说明)]，包含此前退票/取消航班时自动处理的结果
+    def do_priority_queue(self, flight_ids=None):
+        with self.log_lock:
+            results, self.reservation_log = self.reservation_log, []
+        token = None
+        for fid in list(self.reservations) if flight_ids is None else flight_ids:
+            with self.write_gate.shared(), self._flight_lock(fid), self._store_transaction():
+                processed = self._process_reservations(fid)
+                flt = self.flight_map.get(fid)
+                records = self._reservation_records(fid, processed)
+                if records and flt:
+                    records.insert(0, ("tickets", fid, flt.tickets))
+                token = self._log(*records) or token
+            results.extend(processed)
+        self._wal_commit(token)
+        return results
 
-#抢票优先队列处理
-    def do_priority_queue(self):
+#处理单个航班的预约队列；航班不可售或已无余票时整队失败，无需逐个出堆
+#settle=False时只处理余票够分配的队首预约，其余留在队列中等待后续退票
+#调用方需持有该航班的锁
+    def _process_reservations(self, flight_id, settle=True):
+        queue = self.reservations.get(flight_id)
+        if not queue:
+            return []
+        flt = self.get_flight_by_id(flight_id)
+        if (not flt) or flt.is_cancelled or not flt.is_for_sale:
+            del self.reservations[flight_id]
+            return [(uid, flight_id, qty, False, "航班不可售票") for _, _, uid, qty in sorted(queue)]
         results = []
-        while self.priority_queue:
-            priority, user_id, flight_id, qty = heapq.heappop(self.priority_queue)
-            flt = self.get_flight_by_id(flight_id)
-            if (not flt) or flt.is_cancelled or not flt.is_for_sale:
-                results.append((user_id, flight_id, qty, False, "航班不可售票"))
-                continue
+        while queue and flt.tickets > 0:
+            if not settle and flt.tickets < queue[0][3]:
+                return results
+            _, _, user_id, qty = heapq.heappop(queue)
             if flt.tickets < qty:
                 results.append((user_id, flight_id, qty, False, "余票不足"))
                 continue
-            user_flight_count = self.get_flights_number(user_id)
-            already = self.get_tickets_number(user_id, flight_id)
-            if already == 0 and user_flight_count >= 10:
-                results.append((user_id, flight_id, qty, False, "已购买10个航班"))
-                continue
+            with self._user_lock(user_id):
+                user_flight_count = self.get_flights_number(user_id)
+                already = self.get_tickets_number(user_id, flight_id)
+                if already == 0 and user_flight_count >= 10:
+                    results.append((user_id, flight_id, qty, False, "已购买10个航班"))
+                    continue
 
-            # 扣减余票、更新
-            flt.tickets -= qty
-            if user_id not in self.user_tickets:
-                self.user_tickets[user_id] = {}
-            self.user_tickets[user_id][flight_id] = \
-                self.user_tickets[user_id].get(flight_id, 0) + qty
+                # 扣减余票、更新
+                flt.tickets -= qty
+                self._flight_changed(flt)
+                self._add_tickets(user_id, flight_id, qty)
             results.append((user_id, flight_id, qty, True, "抢票成功"))
+        if not settle and queue:
+            return results
+        #余票已售完：剩余预约整队失败
+        del self.reservations[flight_id]
+        results.extend((uid, flight_id, qty, False, "余票不足") for _, _, uid, qty in sorted(queue))
         return results
 
-#航班查询
-    def query_flights(self, dep=None, des=None, only_for_sale=False, sort_by=None):
-        filtered = []
-        for f in self.flights:
+#航班查询；date给出时只查该出发日期
+    def query_flights(self, dep=None, des=None, only_for_sale=False, sort_by=None, date=None):
+        if self.store is not None and date is None:
+            return self.store.query(dep, des, only_for_sale, sort_by)
+        return list(self.iter_flights(dep, des, only_for_sale, sort_by, date))
+
+#按需逐个产出查询结果，界面只取当前要显示的部分；排序在这里完成(稳定排序，先排序再筛选结果相同)
+#给出出发城市并按票价/出发时间排序时直接合并票价汇总中已排好序的列表，不再对整个结果排序
+    def iter_flights(self, dep=None, des=None, only_for_sale=False, sort_by=None, date=None):
+        if self.store is not None:
+            for f in self.store.iter_query(dep, des, only_for_sale, sort_by):
+                if date is None or f.departure_date == date:
+                    yield f
+            return
+        if dep and sort_by in ("票价", "出发时间"):
+            yield from self.iter_fares(dep, des, date, sort_by, only_for_sale)
+            return
+        #给定城市时只扫描对应索引桶；先复制桶中的航班，逐步读取期间增删航班不影响迭代
+        if dep and des:
+            candidates = list(self.route_index.get((dep, des), {}).values())
+        elif dep:
+            candidates = list(self.dep_index.get(dep, {}).values())
+        else:
+            candidates = self.flights
+        if sort_by == "票价":
+            candidates = sorted(candidates, key=lambda x: x.price)
+        elif sort_by == "出发时间":
+            candidates = sorted(candidates, key=lambda x: x.departure_time)
+        for f in candidates:
             if dep and f.departure_city != dep:
                 continue
             if des and f.destination_city != des:
@@ -242,64 +2452,477 @@ class FlightManagementSystem:
             if only_for_sale:
                 if f.tickets <= 0 or f.is_cancelled or not f.is_for_sale:
                     continue
-            filtered.append(f)
-        if sort_by == "票价":
-            filtered.sort(key=lambda x: x.price)
-        elif sort_by == "出发时间":
-            filtered.sort(key=lambda x: x.departure_time)
-        return filtered
+            if date is not None and f.departure_date != date:
+                continue
+            yield f
+
+#符合条件的航班数，不生成结果列表；不筛选可售时直接取索引桶大小，给出出发城市并筛选可售或日期时由票价汇总累加
+    def count_flights(self, dep=None, des=None, only_for_sale=False, date=None):
+        if self.store is not None:
+            if date is None:
+                return self.store.count(dep, des, only_for_sale)
+            return sum(1 for _ in self.iter_flights(dep, des, only_for_sale, date=date))
+        if dep and (only_for_sale or date is not None):
+            with self.fares_lock:
+                return sum(len(fares.open_by_price if only_for_sale else fares.by_price)
+                           for fares in self._fare_groups(dep, des, date))
+        if date is not None:
+            return sum(1 for _ in self.iter_flights(dep, des, only_for_sale, date=date))
+        if not only_for_sale:
+            if dep and des:
+                return len(self.route_index.get((dep, des), {}))
+            if dep:
+                return len(self.dep_index.get(dep, {}))
+            if not des:
+                return len(self.flight_map)
+        return sum(1 for _ in self.iter_flights(dep, des, only_for_sale))
+
+#出发城市dep(及目的城市des、出发日期date)的RouteFares，每条航线一个：date为None时取全部日期的汇总
+#不给目的城市时先建立该出发城市全部航线的汇总；调用方持有fares_lock
+    def _fare_groups(self, dep, des=None, date=None):
+        if des is not None:
+            routes = (self._route_ladders(dep, des),)
+        else:
+            if dep not in self.fares_complete:
+                for city in {f.destination_city for f in list(self.dep_index.get(dep, {}).values())}:
+                    self._route_ladders(dep, city)
+                self.fares_complete.add(dep)
+            routes = self.fares.get(dep, {}).values()
+        for by_date in routes:
+            if by_date is not None and date in by_date:
+                yield by_date[date]
+
+#航线某天的票价汇总：航班数、可售航班数、可售余票合计、最低票价及其航班、最早出发的可售航班
+#date为None时汇总全部日期
+    def route_fares(self, dep, des, date=None):
+        with self.fares_lock:
+            fares = (self._route_ladders(dep, des) or {}).get(date)
+            if fares is None:
+                return None
+            cheapest = self.flight_at[fares.open_by_price[0]] if fares.open_by_price else None
+            earliest = self.flight_at[fares.open_by_time[0]] if fares.open_by_time else None
+            return {"flights": len(fares.by_price), "available": len(fares.open_by_price),
+                    "seats": fares.seats, "min_price": cheapest.price if cheapest else None,
+                    "cheapest": cheapest.flight_id if cheapest else None,
+                    "earliest": earliest.flight_id if earliest else None}
+
+#按票价或出发时间有序地逐个产出航班；给出目的城市时直接读该航线(当天或全部日期)的有序列表，
+#只给出发城市时把各航线的有序列表归并，取前N个为O(N log 航线数)，与航班总数无关
+#顺序与iter_flights原来的稳定排序一致：出发时间按一天中的时刻比较，相同时按先后顺序
+    def iter_fares(self, dep, des=None, date=None, sort_by="票价", only_for_sale=False):
+        by_time = sort_by == "出发时间"
+        with self.fares_lock:
+            #复制各列表，逐步读取期间的购票、退票不影响迭代
+            ladders = [list((fares.open_by_time if by_time else fares.open_by_price) if only_for_sale
+                            else (fares.by_time if by_time else fares.by_price))
+                       for fares in self._fare_groups(dep, des, date)]
+        flight_at, seq = self.flight_at, self.flight_seq
+        if len(ladders) == 1:
+            for c in ladders[0]:
+                flt = flight_at[c]
+                if flt is not None:
+                    yield flt
+            return
+
+        #各列表按需生成归并键，归并时每次只比较各列表当前的第一个
+        def keyed(ladder):
+            for c in ladder:
+                flt = flight_at[c]
+                if flt is not None:
+                    yield (flt.dep_min % 1440 if by_time else flt.price, seq[c], flt)
+        for _, _, flt in heapq.merge(*map(keyed, ladders)):
+            yield flt
+
+#最便宜(或最早出发)的前n个可售航班
+    def cheapest_flights(self, dep, des, date=None, n=10, sort_by="票价"):
+        return list(islice(self.iter_fares(dep, des, date, sort_by, only_for_sale=True), n))
 
 #返回指定航班对象
     def find_flight_by_id(self, flight_id):
         return self.get_flight_by_id(flight_id)
 
-#替代航班推荐，BFS
-    def alternate_flights(self, dep_city, des_city):
-        #收集所有起点航班
-        start_flights = []
-        for f in self.flights:
-            if f.departure_city == dep_city:
-                start_flights.append(f.flight_id)
-
+#替代航班推荐：返回航班ID路径的列表，参数含义见search_routes
+#结果按(出发城市, 目的城市, 搜索选项)缓存，航班变化时由_schedule_changed精确淘汰
+    def alternate_flights(self, dep_city, des_city, max_legs=3, min_layover=0, max_layover=None,
+                          limit=100, rank_by=None, cancel=None):
+        key = (dep_city, des_city, max_legs, min_layover, max_layover, limit, rank_by)
+        routes = self.route_cache.get(key)
+        if routes is None:
+            explored = set()
+            generation = self.route_cache.generation
+            routes = self.search_routes(dep_city, des_city, max_legs, min_layover, max_layover,
+                                        limit, rank_by, explored, cancel)
+            self.route_cache.put(key, routes, explored, generation)
+        return [list(path) for path in routes]
+
+#批量替代航班：如枢纽停航后为其全部航线重新推荐，pairs为(出发城市, 目的城市)的序列
+#workers > 1 时分给多个进程搜索：本进程只有一个线程时fork，子进程继承当前的航班图；
+#还有其他线程(界面后台线程、日志落盘线程)时fork可能死锁，改用process_context()，航班和各城市出发数组序列化一次后传给子进程
+#结果与逐个调用alternate_flights相同并写入行程缓存；返回{(出发城市, 目的城市): 方案列表}
+    def alternate_flights_batch(self, pairs, max_legs=3, min_layover=0, max_layover=None,
+                                limit=100, rank_by=None, workers=0):
+        options = (max_legs, min_layover, max_layover, limit, rank_by)
+        pairs = list(dict.fromkeys(tuple(pair) for pair in pairs))
+        generation = self.route_cache.generation
+        results, pending = {}, []
+        for pair in pairs:
+            routes = self.route_cache.get(pair + options)
+            if routes is None:
+                pending.append(pair)
+            else:
+                results[pair] = routes
+        if workers > 1 and len(pending) > 1:
+            #小块轮流分配，耗时差别大的航线不会集中在同一个进程
+            chunks = [pending[i::workers * 4] for i in range(min(len(pending), workers * 4))]
+            if threading.active_count() == 1 and "fork" in get_all_start_methods():
+                context, initargs = get_context("fork"), (self,)
+            else:
+                #先复制再序列化：其间其他线程修改航班，不会改动正在序列化的列表和字典
+                state = (list(self.flight_at), list(self.flight_ids.names),
+                         {c: a[:] for c, a in list(self.city_dep_times.items())},
+                         {c: a[:] for c, a in list(self.city_dep_ids.items())})
+                context, initargs = process_context(), (None, pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+            with ProcessPoolExecutor(workers, mp_context=context,
+                                     initializer=_batch_init, initargs=initargs) as pool:
+                found = [item for part in pool.map(_search_batch, chunks, repeat(options))
+                         for item in part]
+        else:
+            found = []
+            for pair in pending:
+                explored = set()
+                found.append((pair, self.search_routes(*pair, *options, explored), explored))
+        for pair, routes, explored in found:
+            self.route_cache.put(pair + options, routes, explored, generation)
+            results[pair] = routes
+        return {pair: [list(path) for path in results[pair]] for pair in pairs}
+
+#行程搜索：路径以(航班ID, 父结点, 航段数)的父指针链表示，不复制列表，同一航班可出现在多个方案中
+#max_legs: 最多航段数；min_layover/max_layover: 中转时间窗口(分钟)；limit: 最多返回的方案数，0表示不限(两种输出方式相同)
+#rank_by: None按航段数由少到多输出；"time"按总时长、"price"按总票价输出前limit个最优方案，limit为0时按代价输出全部方案
+#explored: 若给出集合，则记录搜索中读取过出发航班的城市
+#cancel: threading.Event，搜索中每展开4096个结点检查一次，置位后抛出SearchCancelled
+    def search_routes(self, dep_city, des_city, max_legs=3, min_layover=0, max_layover=None,
+                      limit=100, rank_by=None, explored=None, cancel=None):
+        if explored is None:
+            explored = set()
+        explored.add(dep_city)
+        if rank_by in ("time", "price"):
+            return self._top_k_routes(dep_city, des_city, max_legs, min_layover, max_layover,
+                                      limit or float("inf"), rank_by, explored, cancel)
         results = []
-        from collections import deque
-        visited = set()
-        queue = deque()
-        #入队时记录(当前航班, 路径)
-        for sfid in start_flights:
-            queue.append((sfid, [sfid]))
-
+        flight_at, names = self.flight_at, self.flight_ids.names
+        queue = deque((c, None, 1) for c in self.city_dep_ids.get(dep_city, ())
+                      if not flight_at[c].is_cancelled)
+        steps = 0
         while queue:
-            current_fid, path = queue.popleft()
-            if current_fid in visited:
+            steps += 1
+            if cancel is not None and not steps & 4095 and cancel.is_set():
+                raise SearchCancelled
+            node = queue.popleft()
+            flt = flight_at[node[0]]
+            if flt.destination_city == des_city:
+                results.append(route_path(node, names))
+                if limit and len(results) >= limit:
+                    break
                 continue
-            visited.add(current_fid)
+            if node[2] >= max_legs:
+                continue
+            explored.add(flt.destination_city)
+            for nid in self.layover_window(flt, min_layover, max_layover):
+                if not flight_at[nid].is_cancelled:
+                    queue.append((nid, node, node[2] + 1))
+        return results
 
-            cur_flight = self.flight_map.get(current_fid)
-            if cur_flight and cur_flight.destination_city == des_city:
-                results.append(path)
+#按总时长或总票价的前K个方案：代价可加且非负，按代价最佳优先展开，
+#每个(航班, 航段数)最多展开K次即可保证前K个结果正确（K最短路的标号设定法）
+    def _top_k_routes(self, dep_city, des_city, max_legs, min_layover, max_layover, k, rank_by,
+                      explored, cancel=None):
+        def cost(prev_cost, prev, nxt):
+            if rank_by == "price":
+                return prev_cost + nxt.price
+            return prev_cost + (nxt.actual_arr_min - prev.actual_arr_min)
+
+        heap = []
+        seq = 0
+        flight_at, names = self.flight_at, self.flight_ids.names
+        for code in self.city_dep_ids.get(dep_city, ()):
+            flt = flight_at[code]
+            if not flt.is_cancelled:
+                first = flt.price if rank_by == "price" else flt.actual_arr_min - flt.actual_dep_min
+                heap.append((first, seq, (code, None, 1)))
+                seq += 1
+        heapq.heapify(heap)
+        expanded = {}
+        results = []
+        steps = 0
+        while heap and len(results) < k:
+            steps += 1
+            if cancel is not None and not steps & 4095 and cancel.is_set():
+                raise SearchCancelled
+            c, _, node = heapq.heappop(heap)
+            key = (node[0], node[2])
+            if expanded.get(key, 0) >= k:
+                continue
+            expanded[key] = expanded.get(key, 0) + 1
+            flt = flight_at[node[0]]
+            if flt.destination_city == des_city:
+                results.append(route_path(node, names))
+                continue
+            if node[2] >= max_legs:
+                continue
+            explored.add(flt.destination_city)
+            for nid in self.layover_window(flt, min_layover, max_layover):
+                nxt = flight_at[nid]
+                if not nxt.is_cancelled:
+                    heapq.heappush(heap, (cost(c, flt, nxt), seq, (nid, node, node[2] + 1)))
+                    seq += 1
+        return results
 
-            #继续拓展
-            next_list = self.flight_graph.get(current_fid, [])
-            for nxt_fid in next_list:
-                if nxt_fid not in path:  #避免环
-                    queue.append((nxt_fid, path + [nxt_fid]))
+#连接扫描(CSA)的航班表：只含未取消且在售的航班，按计入延误的实际出发时间排序
+#建表期间航班发生变化时本次仍使用建好的表，但不保存，下次查询重新建立
+    def _connection_table(self):
+        table = self.connection_table
+        if table is None:
+            generation = self.schedule_generation
+            conns = sorted((f for f in list(self.flights) if not f.is_cancelled and f.is_for_sale),
+                           key=lambda f: (f.actual_dep_min, f.flight_id))
+            table = ([f.actual_dep_min for f in conns], conns)
+            with self.schedule_lock:
+                if self.schedule_generation == generation:
+                    self.connection_table = table
+        return table
+
+#最早到达：一次线性扫描求出depart_after之后出发、最早抵达目的城市的行程
+#min_transfer为中转最短间隔(分钟)；返回(到达分钟数, 航班ID路径)，不可达时返回None
+    def earliest_arrival(self, dep_city, des_city, depart_after=None, min_transfer=0):
+        times, conns = self._connection_table()
+        earliest = {dep_city: depart_after if depart_after is not None else float("-inf")}
+        via = {}  #城市 -> 最早抵达该城市所乘的航班
+        best = float("inf")
+        for i in range(bisect_left(times, depart_after) if depart_after is not None else 0, len(conns)):
+            f = conns[i]
+            dep = times[i]
+            if dep >= best:  #之后出发的航班不可能更早到达
+                break
+            t = earliest.get(f.departure_city)
+            if t is None:
+                continue
+            if f.departure_city != dep_city:
+                t += min_transfer
+            arr = f.actual_arr_min
+            if dep >= t and arr < earliest.get(f.destination_city, float("inf")) \
+                    and f.destination_city != dep_city:
+                earliest[f.destination_city] = arr
+                via[f.destination_city] = f
+                if f.destination_city == des_city:
+                    best = arr
+        if des_city not in via:
+            return None
+        path = []
+        city = des_city
+        while city != dep_city:
+            f = via[city]
+            path.append(f.flight_id)
+            city = f.departure_city
+        path.reverse()
+        return (best, path)
+
+#出发/到达时刻的帕累托方案：按出发时间倒序扫描一次，
+#对每个出发时刻给出最早到达，且不存在出发更晚、到达更早的方案
+#返回[(出发分钟数, 到达分钟数, 航班ID路径)]，按出发时间升序
+    def profile_routes(self, dep_city, des_city, min_transfer=0, cancel=None):
+        times, conns = self._connection_table()
+        #每个城市的帕累托表，按出发时间降序追加：neg_deps为负的出发时间(升序便于二分)，
+        #entries为(出发, 到达, 航班, 后续条目)
+        neg_deps = {}
+        entries = {}
+
+        def best_from(city, t):
+            nd = neg_deps.get(city)
+            if not nd:
+                return None
+            k = bisect_right(nd, -t)
+            return entries[city][k - 1] if k else None
+
+        for i, f in enumerate(reversed(conns)):
+            if cancel is not None and not i & 4095 and cancel.is_set():
+                raise SearchCancelled
+            if f.departure_city == des_city:
+                continue
+            if f.destination_city == des_city:
+                arr, nxt = f.actual_arr_min, None
+            else:
+                nxt = best_from(f.destination_city, f.actual_arr_min + min_transfer)
+                if nxt is None:
+                    continue
+                arr = nxt[1]
+            city = f.departure_city
+            lst = entries.setdefault(city, [])
+            if lst and lst[-1][1] <= arr:
+                continue  #被出发更晚、到达不晚的方案支配
+            if lst and lst[-1][0] == f.actual_dep_min:
+                lst.pop()
+                neg_deps[city].pop()
+            lst.append((f.actual_dep_min, arr, f, nxt))
+            neg_deps.setdefault(city, []).append(-f.actual_dep_min)
 
+        results = []
+        for dep, arr, f, nxt in reversed(entries.get(dep_city, [])):
+            path = [f.flight_id]
+            while nxt is not None:
+                path.append(nxt[2].flight_id)
+                nxt = nxt[3]
+            results.append((dep, arr, path))
         return results
 
+#目的城市中在中转时间窗口内出发的航班编码，直接对有序出发数组二分切片
+    def layover_window(self, flt, min_layover=0, max_layover=None):
+        times = self.city_dep_times.get(flt.destination_city)
+        if not times:
+            return ()
+        arr = flt.actual_arr_min
+        start = bisect_left(times, arr + min_layover)
+        end = len(times) if max_layover is None else bisect_right(times, arr + max_layover)
+        nxt = self.city_dep_ids[flt.destination_city][start:end]
+        if flt.departure_city == flt.destination_city:
+            code = self.flight_ids.codes[flt.flight_id]
+            nxt = [c for c in nxt if c != code]
+        return nxt
+
+#反向边：到达出发城市、中转时间不超过max_layover分钟而可衔接到本航班的前序航班编码
+    def feeder_window(self, flt, max_layover=None):
+        times = self.city_arr_times.get(flt.departure_city)
+        if not times:
+            return []
+        dep = flt.actual_dep_min
+        start = 0 if max_layover is None else bisect_left(times, dep - max_layover)
+        end = bisect_right(times, dep)
+        code = self.flight_ids.codes[flt.flight_id]
+        return [c for c in self.city_arr_ids[flt.departure_city][start:end] if c != code]
+
+DATASET_FILE = "flightDataset.txt"
+SNAPSHOT_FILE = "flightDataset.snap"
+WAL_FILE = "flightDataset.wal"
+
+#创建系统并载入数据：快照存在且未过期时直接加载，否则读取文本数据集
+#wal为"off"时不记录日志，否则按该同步方式("always"/"group"/"none")重放并续写WAL_FILE
+#给出db_path时使用SQLite存储：数据库非空则直接从中启动，否则导入数据集；修改由数据库事务持久化，不再写日志
+#metrics: 可选的metrics.Metrics，在读取数据前挂到系统上，读取和建图也计入统计
+def load_system(graph_mode="materialized", use_store=False, wal="group", db_path=None, metrics=None):
+    fms = FlightManagementSystem(graph_mode, use_store, db_path=db_path)
+    if metrics is not None:
+        metrics.attach(fms)
+    if db_path:
+        if not fms.load_storage():
+            fms.read_dataset(DATASET_FILE)
+        return fms
+    if fms.load_snapshot(SNAPSHOT_FILE, DATASET_FILE):
+        base = ["snapshot", *source_signature(SNAPSHOT_FILE)]
+    else:
+        fms.read_dataset(DATASET_FILE)
+        base = ["dataset", *source_signature(DATASET_FILE)]
+    if wal != "off":
+        replayed = fms.open_wal(WAL_FILE, base, wal, SNAPSHOT_FILE, DATASET_FILE)
+        if replayed:
+            print(f"已从日志恢复 {replayed} 个事务")
+    return fms
+
+#分页加载的结果列表：rows为逐行产出字符串的迭代器，只插入首页，滚动接近底部时再取下一页
+#结果总数由调用方单独给出，无需生成全部行
+class ResultView:
+    def __init__(self, parent, page_size=200):
+        self.page_size = page_size
+        self.source = None
+        self.pending = False
+        self.summary = ""
+        self.frame = ttk.Frame(parent)
+        self.frame.rowconfigure(1, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+        self.label = ttk.Label(self.frame, anchor="w")
+        self.label.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.listbox = tk.Listbox(self.frame, exportselection=False)
+        self.listbox.grid(row=1, column=0, sticky="nsew")
+        yscroll = ttk.Scrollbar(self.frame, orient="vertical", command=self.listbox.yview)
+        yscroll.grid(row=1, column=1, sticky="ns")
+        xscroll = ttk.Scrollbar(self.frame, orient="horizontal", command=self.listbox.xview)
+        xscroll.grid(row=2, column=0, sticky="ew")
+        self.yscroll = yscroll
+        self.listbox.configure(yscrollcommand=self._scrolled, xscrollcommand=xscroll.set)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+#清空后显示新结果；total为结果总数，None时不显示计数
+    def show(self, rows, total=None, title="", unit="条"):
+        self.listbox.delete(0, tk.END)
+        self.source = iter(rows)
+        self.summary = title if total is None else f"{title}共 {total} {unit}"
+        self._load_page()
+
+#只显示一行提示
+    def message(self, text, title=""):
+        self.show([text], title=title)
+
+    def _load_page(self):
+        self.pending = False
+        if self.source is None:
+            return
+        rows = list(islice(self.source, self.page_size))
+        if len(rows) < self.page_size:
+            self.source = None
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        more = "，向下滚动加载更多" if self.source is not None else ""
+        self.label.configure(text=self.summary + more)
+
+#滚动条位置变化时回调；可见区域接近已加载部分的底部时在空闲时取下一页
+    def _scrolled(self, first, last):
+        self.yscroll.set(first, last)
+        if self.source is not None and not self.pending and float(last) > 0.9:
+            self.pending = True
+            self.listbox.after_idle(self._load_page)
+
+
 #图像化GUI界面
 class FlightApp:
-    def __init__(self, root):
+    def __init__(self, root, graph_mode="materialized", use_store=False, wal="group", db_path=None,
+                 metrics=None):
         # 设置主窗口
         self.root = root
         self.root.title("飞机票管理系统")
         self.root.geometry("500x700")
 
-        self.fms = FlightManagementSystem()
-        self.fms.read_dataset("flightDataset.txt")
-
-        self.notebook = ttk.Notebook(root)  #创建多页签Notebook
-        self.notebook.pack(fill="both", expand=True)
+        #耗时操作交给单个后台线程依次执行，界面保持响应；操作之间不会并发修改航班图
+        self.fms = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.tasks = []  #[(名称, Future, 完成回调, 取消回调, 取消事件)]
+        self.polling = False
+        self.progress_running = False
+        self.idle_status = ""
+
+        #底部状态栏：当前任务、进度条、取消按钮
+        status_bar = ttk.Frame(root)
+        status_bar.pack(side="bottom", fill="x", padx=5, pady=3)
+        self.status_var = tk.StringVar()
+        ttk.Label(status_bar, textvariable=self.status_var, anchor="w").pack(side="left", fill="x",
+                                                                             expand=True)
+        self.btn_cancel_task = ttk.Button(status_bar, text=" 取消 ", command=self.cancel_tasks,
+                                          state="disabled")
+        self.btn_cancel_task.pack(side="right")
+        self.progress = ttk.Progressbar(status_bar, mode="indeterminate", length=120)
+        self.progress.pack(side="right", padx=5)
+
+        #窗口先显示，数据在后台读取完成后再显示各页面
+        self.placeholder = ttk.Label(root, text="正在读取航班数据……", anchor="center")
+        self.placeholder.pack(fill="both", expand=True)
+        self.run_task("读取航班数据",
+                      lambda: load_system(graph_mode, use_store, wal, db_path, metrics),
+                      self.data_loaded)
+
+        self.notebook = ttk.Notebook(root)  #创建多页签Notebook，数据就绪后显示
 
         #7个功能页面
         self.frame_flight_info = ttk.Frame(self.notebook)
@@ -328,6 +2951,84 @@ class FlightApp:
         self.create_flightid_findUI()
         self.create_alternateUI()
 
+#数据读取完成：显示各页面并填充用户列表
+    def data_loaded(self, fms):
+        self.fms = fms
+        self.placeholder.destroy()
+        self.notebook.pack(fill="both", expand=True)
+        self.load_users()
+        self.idle_status = f"已载入 {len(fms.flights)} 个航班"
+        if fms.load_errors:
+            lineno, reason = fms.load_errors[0]
+            messagebox.showwarning("读取数据集", f"有 {len(fms.load_errors)} 行数据无法解析，已跳过\n"
+                                                f"第{lineno}行: {reason}")
+
+#在后台线程执行func，完成后在主线程调用on_done(结果)；由root.after轮询，不阻塞事件循环
+#cancellable为True时func接收一个threading.Event，点击“取消”后置位，被取消时调用on_cancel()
+    def run_task(self, name, func, on_done, cancellable=False, on_cancel=None):
+        cancel = threading.Event() if cancellable else None
+        future = self.executor.submit(func, cancel) if cancellable else self.executor.submit(func)
+        self.tasks.append((name, future, on_done, on_cancel, cancel))
+        self._update_status()
+        if not self.polling:
+            self.polling = True
+            self.root.after(50, self._poll_tasks)
+
+    def _poll_tasks(self):
+        #回调中可能提交新任务，先取出已完成的再逐个处理
+        finished = [task for task in self.tasks if task[1].done()]
+        for task in finished:
+            self.tasks.remove(task)
+        for name, future, on_done, on_cancel, _ in finished:
+            try:
+                result = future.result()
+            except (SearchCancelled, CancelledError):
+                self.idle_status = f"{name}: 已取消"
+                if on_cancel is not None:
+                    on_cancel()
+                continue
+            except Exception as e:
+                self.idle_status = f"{name}: 失败"
+                messagebox.showerror("错误", f"{name}失败: {e}")
+                continue
+            self.idle_status = f"{name}: 完成"
+            on_done(result)
+        self._update_status()
+        if self.tasks:
+            self.root.after(50, self._poll_tasks)
+        else:
+            self.polling = False
+
+    def _update_status(self):
+        if not self.tasks:
+            self.status_var.set(self.idle_status)
+            if self.progress_running:
+                self.progress.stop()
+                self.progress_running = False
+            self.btn_cancel_task.configure(state="disabled")
+            return
+        names = "、".join(dict.fromkeys(task[0] for task in self.tasks))
+        self.status_var.set(f"正在{names}……")
+        if not self.progress_running:
+            self.progress.start(15)
+            self.progress_running = True
+        cancellable = any(task[4] is not None for task in self.tasks)
+        self.btn_cancel_task.configure(state="normal" if cancellable else "disabled")
+
+#取消可取消的任务：尚未开始的直接撤销，正在执行的由搜索循环检查事件后退出
+    def cancel_tasks(self):
+        for _, future, _, _, cancel in self.tasks:
+            if cancel is not None:
+                cancel.set()
+                future.cancel()
+
+#关闭窗口后：取消后台任务、等待正在执行的操作结束，再关闭预写日志
+    def close(self):
+        self.cancel_tasks()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.fms is not None:
+            self.fms.close_wal()
+
 #航班信息管理界面
     def create_flightUI(self):
         self.frame_flight_info.rowconfigure(99, weight=1)
@@ -364,6 +3065,8 @@ class FlightApp:
         btn_add.pack(side="left", padx=10)
         btn_delete = ttk.Button(btn_frame, text=" 删除航班 ", command=self.delete_flight_action)
         btn_delete.pack(side="left", padx=10)
+        btn_snapshot = ttk.Button(btn_frame, text=" 保存快照 ", command=self.write_snapshot_action)
+        btn_snapshot.pack(side="left", padx=10)
 
 #新增航班
     def add_flight_action(self):
@@ -385,9 +3088,18 @@ class FlightApp:
         if any(len(x) == 0 for x in fields):
             messagebox.showerror("错误", "新增航班需要完整填写所有信息")
             return
-        flt = Flight(*fields)
-        self.fms.add_flight(flt)
-        messagebox.showinfo("成功", f"已添加航班 {flt.flight_id}")
+        try:
+            flt = Flight(*fields)
+        except ValueError as e:
+            messagebox.showerror("错误", f"航班信息格式错误: {e}")
+            return
+
+        def done(added):
+            if not added:
+                messagebox.showerror("错误", f"航班 {flt.flight_id} 已存在")
+                return
+            messagebox.showinfo("成功", f"已添加航班 {flt.flight_id}")
+        self.run_task("新增航班", lambda: self.fms.add_flight(flt), done)
 
 #删除航班
     def delete_flight_action(self):
@@ -395,8 +3107,23 @@ class FlightApp:
         if not fid:
             messagebox.showerror("错误", "删除航班需要航班ID")
             return
-        self.fms.delete_flight_by_id(fid)
-        messagebox.showinfo("成功", f"已删除航班 {fid}")
+
+        def done(deleted):
+            if not deleted:
+                messagebox.showerror("错误", f"航班 {fid} 不存在")
+                return
+            messagebox.showinfo("成功", f"已删除航班 {fid}")
+        self.run_task("删除航班", lambda: self.fms.delete_flight_by_id(fid), done)
+
+#保存当前航班与购票数据的快照，下次启动直接加载
+    def write_snapshot_action(self):
+        def save():
+            if self.fms.wal is not None:
+                self.fms.checkpoint()  #快照已包含日志中的全部修改，同时清空日志
+            else:
+                self.fms.write_snapshot(SNAPSHOT_FILE, DATASET_FILE)
+        self.run_task("保存快照", save,
+                      lambda _: messagebox.showinfo("成功", f"已保存快照 {SNAPSHOT_FILE}"))
 
 #管理航班的延误和取消
     def create_dynamicUI(self):
@@ -406,40 +3133,85 @@ class FlightApp:
         frame = ttk.LabelFrame(self.frame_dynamic, text=" 航班动态管理 ", labelanchor='n')
         frame.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
 
-        lbl_id = ttk.Label(frame, text="航班ID:", anchor='center')
-        lbl_id.grid(row=0, column=0, padx=5, pady=5, sticky="e")
-        self.entry_dyn_flight_id = ttk.Entry(frame, justify='center')
-        self.entry_dyn_flight_id.grid(row=0, column=2, padx=5, pady=5)
+        def _add_label_entry(parent, r, text):
+            lbl = ttk.Label(parent, text=text, anchor='center', justify='center')
+            lbl.grid(row=r, column=0, padx=5, pady=5, sticky="e")
+            ent = ttk.Entry(parent, justify='center')
+            ent.grid(row=r, column=1, padx=5, pady=5)
+            return ent
 
-        lbl_delay = ttk.Label(frame, text="延误时长(分钟):", anchor='center')
-        lbl_delay.grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        self.entry_dyn_delay_time = ttk.Entry(frame, justify='center')
-        self.entry_dyn_delay_time.grid(row=1, column=2, padx=5, pady=5)
+        self.entry_dyn_flight_id = _add_label_entry(frame, 0, "航班ID:")
+        self.entry_dyn_city = _add_label_entry(frame, 1, "城市(出发或到达):")
+        self.entry_dyn_date_from = _add_label_entry(frame, 2, "起始日期(YYYYMMDD):")
+        self.entry_dyn_date_to = _add_label_entry(frame, 3, "截止日期(YYYYMMDD):")
+        self.entry_dyn_delay_time = _add_label_entry(frame, 4, "延误时长(分钟):")
 
         btn_delay = ttk.Button(frame, text=" 设置延误 ", command=self.set_delay_action)
-        btn_delay.grid(row=2, column=1, padx=5, pady=5, sticky="e")
+        btn_delay.grid(row=5, column=0, padx=5, pady=5, sticky="e")
 
         btn_cancel = ttk.Button(frame, text=" 取消航班 ", command=self.cancel_flight_action)
-        btn_cancel.grid(row=2, column=2, padx=5, pady=5, sticky="w")
-
-#设置航班延误
+        btn_cancel.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+
+#延误/取消的选择条件：多个以逗号或空格分隔的航班ID、城市、日期区间，可组合使用；都未填写时返回None
+    def dynamic_selection(self):
+        fids = self.entry_dyn_flight_id.get().replace(",", " ").replace("，", " ").split()
+        selection = {"flight_ids": fids or None,
+                     "city": self.entry_dyn_city.get().strip() or None,
+                     "date_from": self.entry_dyn_date_from.get().strip() or None,
+                     "date_to": self.entry_dyn_date_to.get().strip() or None}
+        return selection if any(v is not None for v in selection.values()) else None
+
+#批量设置延误：按新的实际时刻重新衔接，并列出因此断开的已购行程
     def set_delay_action(self):
-        fid = self.entry_dyn_flight_id.get().strip()
+        selection = self.dynamic_selection()
         dtime = self.entry_dyn_delay_time.get().strip()
-        if not fid or not dtime.isdigit():
-            messagebox.showerror("错误", "请输入航班ID和延误时长(数字)")
+        if selection is None or not dtime.isdigit():
+            messagebox.showerror("错误", "请输入航班ID、城市或日期区间，以及延误时长(数字)")
             return
-        self.fms.delay_flight(fid, int(dtime))
-        messagebox.showinfo("成功", f"已设置航班 {fid} 延误 {dtime} 分钟")
+        self.run_task("设置延误", lambda: self.fms.delay_flights(int(dtime), **selection),
+                      lambda report: self.show_impact_report(report, "航班延误"))
 
-#取消航班：触发自动退票
+#取消航班：触发自动退票，可按航班ID、城市或日期区间批量取消，结果汇总在一个弹窗中
     def cancel_flight_action(self):
-        fid = self.entry_dyn_flight_id.get().strip()
-        if not fid:
-            messagebox.showerror("错误", "请输入航班ID")
+        selection = self.dynamic_selection()
+        if selection is None:
+            messagebox.showerror("错误", "请输入航班ID、城市或日期区间")
             return
-        self.fms.cancel_flight(fid)
-        messagebox.showinfo("成功", f"已取消航班 {fid}")
+        self.run_task("取消航班", lambda: self.fms.cancel_flights(**selection), self.show_impact_report)
+
+    def show_impact_report(self, report, title="航班取消"):
+        lines = []
+        for key, text in (("cancelled", "已取消航班"), ("delayed", "已设置延误的航班")):
+            done = report.get(key)
+            if done:
+                more = f" 等{len(done)}个" if len(done) > 20 else ""
+                lines.append(f"{text} {', '.join(done[:20])}{more}")
+        if not report.get("cancelled") and not report.get("delayed"):
+            lines.append("没有符合条件的航班")
+        if report["missing"]:
+            lines.append(f"航班不存在: {', '.join(report['missing'])}")
+        refunds = report.get("refunds")
+        if refunds:
+            total = sum(sum(d.values()) for d in refunds.values())
+            lines.append(f"共为 {len(refunds)} 位用户自动退票 {total} 张：")
+            for uid, detail in islice(refunds.items(), 20):
+                lines.append(f"用户 {uid}: " + ", ".join(f"{fid} {c} 张" for fid, c in detail.items()))
+            if len(refunds) > 20:
+                lines.append(f"……其余 {len(refunds) - 20} 位用户略")
+        elif report["holders"]:
+            lines.append(f"涉及 {len(report['holders'])} 位持票用户")
+        connections = report["connections"]
+        if connections:
+            more = f" 等{len(connections)}对" if len(connections) > 20 else ""
+            lines.append("航班衔接断开: " + ", ".join(f"{a} -> {b}" for a, b in connections[:20]) + more)
+        broken = report["broken"]
+        if broken:
+            lines.append(f"{len(broken)} 位用户的已购行程衔接断开：")
+            for uid, pairs in islice(broken.items(), 20):
+                lines.append(f"用户 {uid}: " + ", ".join(f"{a} -> {b}" for a, b in pairs))
+            if len(broken) > 20:
+                lines.append(f"……其余 {len(broken) - 20} 位用户略")
+        messagebox.showinfo(title, "\n".join(lines))
 
 #票务管理界面
     def create_ticketUI(self):
@@ -566,7 +3338,9 @@ class FlightApp:
         """
         开始抢票：依次从优先队列中弹出并尝试购票并输出结果
         """
-        results = self.fms.do_priority_queue()
+        self.run_task("处理预约", self.fms.do_priority_queue, self.show_reservation_results)
+
+    def show_reservation_results(self, results):
         self.text_ticket_result.delete("1.0", tk.END)
         if not results:
             self.text_ticket_result.insert(tk.END, "预约队列为空。\n")
@@ -595,17 +3369,17 @@ class FlightApp:
         lbl_info.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
 
         #设置左侧框架的内容和格式
-        left_frame = ttk.Frame(self.frame_user, width=100)
+        left_frame = ttk.Frame(self.frame_user, width=160)
         left_frame.grid_propagate(False)
         left_frame.grid(row=1, column=0, sticky="ns", padx=5, pady=5)
 
-        self.user_listbox = tk.Listbox(left_frame)
-        self.user_listbox.pack(fill="both", expand=True)
-        self.user_listbox.bind("<<ListboxSelect>>", self.user_selected)
+        self.user_view = ResultView(left_frame)
+        self.user_view.pack(fill="both", expand=True)
+        self.user_view.listbox.bind("<<ListboxSelect>>", self.user_selected)
 
         #设置右侧内容
-        self.text_user_info = tk.Text(self.frame_user)
-        self.text_user_info.grid(row=1, column=1, sticky="nsew", padx=5, pady=5)
+        self.user_info_view = ResultView(self.frame_user)
+        self.user_info_view.grid(row=1, column=1, sticky="nsew", padx=5, pady=5)
 
         #底部“刷新用户列表”按钮
         btn_refresh = ttk.Button(
@@ -616,38 +3390,34 @@ class FlightApp:
         btn_refresh.grid(row=2, column=0, columnspan=2, pady=5)
 
         self.frame_user.rowconfigure(1, weight=1)
-        self.frame_user.columnconfigure(1, weight=1)  #左侧固定宽度100，右侧自适应
-        self.load_users()  #刷新用户列表
+        self.frame_user.columnconfigure(1, weight=1)  #左侧固定宽度160，右侧自适应
 
 #刷新用户列表，将所有存在购票信息的用户ID插入Listbox
     def load_users(self):
-        self.user_listbox.delete(0, tk.END)
-        for uid in self.fms.user_tickets:
-            self.user_listbox.insert(tk.END, uid)
+        users = self.fms.tickets.user_ids()  #复制ID列表，分页读取期间有新用户购票不影响迭代
+        self.user_view.show(users, len(users), unit="人")
 
 #当选中某个用户后，右侧显示其已购航班信息
     def user_selected(self, event):
-        idx = self.user_listbox.curselection()
+        idx = self.user_view.listbox.curselection()
         if not idx:
             return
-        user_id = self.user_listbox.get(idx[0])
-
-        self.text_user_info.delete("1.0", tk.END)
-        self.text_user_info.insert(tk.END, f"用户 {user_id} 的已购航班信息：\n\n")
+        user_id = self.user_view.listbox.get(idx[0])
+        title = f"用户 {user_id} 的已购航班信息："
 
-        user_dict = self.fms.user_tickets.get(user_id, {})
+        user_dict = self.fms.tickets.flights(user_id)
         if not user_dict:
-            self.text_user_info.insert(tk.END, "暂无购票记录\n")
+            self.user_info_view.message("暂无购票记录", title)
             return
 
-        for fid, num in user_dict.items():
-            f = self.fms.get_flight_by_id(fid)
-            if f:
-                self.text_user_info.insert(tk.END,
-                                           f"航班 {fid} ({f.departure_city}->{f.destination_city}), 已购 {num} 张\n"
-                                           )
-            else:
-                self.text_user_info.insert(tk.END, f"航班 {fid} (数据缺失)，已购 {num} 张\n")
+        def rows():
+            for fid, num in list(user_dict.items()):
+                f = self.fms.get_flight_by_id(fid)
+                if f:
+                    yield f"航班 {fid} ({f.departure_city}->{f.destination_city}), 已购 {num} 张"
+                else:
+                    yield f"航班 {fid} (数据缺失)，已购 {num} 张"
+        self.user_info_view.show(rows(), len(user_dict), title + " ", "个航班")
 
     #票务查询
     def create_findUI(self):
@@ -667,44 +3437,52 @@ class FlightApp:
         self.entry_find_des = ttk.Entry(frame, justify='center')
         self.entry_find_des.grid(row=1, column=1, padx=5, pady=5)
 
+        lbl_date = ttk.Label(frame, text="出发日期(可选):", anchor='center')
+        lbl_date.grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.entry_find_date = ttk.Entry(frame, justify='center')
+        self.entry_find_date.grid(row=2, column=1, padx=5, pady=5)
+
         lbl_sort = ttk.Label(frame, text="排序依据:", anchor='center')
-        lbl_sort.grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        lbl_sort.grid(row=3, column=0, padx=5, pady=5, sticky="e")
         self.combo_sort_by = ttk.Combobox(frame, values=["票价", "出发时间"], justify='center')
         self.combo_sort_by.current(0)
-        self.combo_sort_by.grid(row=2, column=1, padx=5, pady=5)
+        self.combo_sort_by.grid(row=3, column=1, padx=5, pady=5)
 
         self.only_for_sale_var = tk.BooleanVar(value=False)
         chk_for_sale = ttk.Checkbutton(frame, text="仅查看可购票航班", variable=self.only_for_sale_var)
-        chk_for_sale.grid(row=3, column=0, columnspan=2, pady=5)
+        chk_for_sale.grid(row=4, column=0, columnspan=2, pady=5)
 
         btn_search = ttk.Button(frame, text=" 查询 ", command=self.find_flights_action)
-        btn_search.grid(row=4, column=0, columnspan=2, pady=5)
+        btn_search.grid(row=5, column=0, columnspan=2, pady=5)
 
-        self.text_find_result = tk.Text(frame)
-        self.text_find_result.grid(row=5, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+        self.find_view = ResultView(frame)
+        self.find_view.grid(row=6, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
 
-        frame.rowconfigure(5, weight=1)
+        frame.rowconfigure(6, weight=1)
         frame.columnconfigure(1, weight=1)
 
-#根据输入的出发城市、目的城市、排序方式、可售票筛选进行查询
+#根据输入的出发城市、目的城市、出发日期、排序方式、可售票筛选进行查询
+#给出出发城市时结果直接取自按票价/出发时间排好序的票价汇总，三项都给出时另显示当天的最低票价和余票
     def find_flights_action(self):
         dep = self.entry_find_dep.get().strip()
         des = self.entry_find_des.get().strip()
+        day = self.entry_find_date.get().strip()
         sort_by = self.combo_sort_by.get()
         only_for_sale = self.only_for_sale_var.get()
 
-        flights = self.fms.query_flights(
-            dep=dep if dep else None,
-            des=des if des else None,
-            only_for_sale=only_for_sale,
-            sort_by=sort_by
-        )
-        self.text_find_result.delete("1.0", tk.END)
-        if not flights:
-            self.text_find_result.insert(tk.END, "没有找到符合条件的航班。\n")
+        conditions = dict(dep=dep if dep else None, des=des if des else None,
+                          only_for_sale=only_for_sale, date=day if day else None)
+        total = self.fms.count_flights(**conditions)
+        if not total:
+            self.find_view.message("没有找到符合条件的航班。")
             return
-        for f in flights:
-            self.text_find_result.insert(tk.END, str(f) + "\n")
+        title = ""
+        fares = self.fms.route_fares(dep, des, day) if dep and des and day else None
+        if fares and fares["available"]:
+            title = f"最低票价 {fares['min_price']:g}，可售 {fares['available']} 个航班、余票 {fares['seats']} 张；"
+        #结果按需生成，列表只显示已滚动到的部分
+        self.find_view.show(map(str, self.fms.iter_flights(sort_by=sort_by, **conditions)),
+                            total, title=title, unit="个航班")
 
     #航班查询，输入航班号，点击查询，显示该航班完整信息
     def create_flightid_findUI(self):
@@ -759,42 +3537,160 @@ class FlightApp:
         self.entry_alt_des_city = ttk.Entry(frame, justify='center')
         self.entry_alt_des_city.grid(row=1, column=1, padx=5, pady=5)
 
-        btn_alt = ttk.Button(frame, text=" 查找替代航班 ", command=self.alternate_action)
-        btn_alt.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.text_alternate_result = tk.Text(frame)
-        self.text_alternate_result.grid(row=3, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
-
-        frame.rowconfigure(3, weight=1)
+        #搜索选项：留空的中转上限表示不限制
+        self.alt_options = {}
+        for r, (key, text, default) in enumerate((("max_legs", "最多航段:", "3"),
+                                                  ("min_layover", "最短中转(分钟):", "0"),
+                                                  ("max_layover", "最长中转(分钟):", ""),
+                                                  ("limit", "方案数上限:", "100")), start=2):
+            lbl = ttk.Label(frame, text=text, anchor='center')
+            lbl.grid(row=r, column=0, padx=5, pady=5, sticky="e")
+            ent = ttk.Entry(frame, justify='center')
+            ent.insert(0, default)
+            ent.grid(row=r, column=1, padx=5, pady=5)
+            self.alt_options[key] = ent
+
+        lbl_rank = ttk.Label(frame, text="排序依据:", anchor='center')
+        lbl_rank.grid(row=6, column=0, padx=5, pady=5, sticky="e")
+        self.combo_alt_rank = ttk.Combobox(frame, values=["航段数", "总时长", "总票价"], justify='center')
+        self.combo_alt_rank.current(0)
+        self.combo_alt_rank.grid(row=6, column=1, padx=5, pady=5)
+
+        frame_btn = ttk.Frame(frame)
+        frame_btn.grid(row=7, column=0, columnspan=2, pady=5)
+        btn_alt = ttk.Button(frame_btn, text=" 查找替代航班 ", command=self.alternate_action)
+        btn_alt.grid(row=0, column=0, padx=5)
+        btn_earliest = ttk.Button(frame_btn, text=" 最早到达 ", command=self.earliest_arrival_action)
+        btn_earliest.grid(row=0, column=1, padx=5)
+        btn_profile = ttk.Button(frame_btn, text=" 出发/到达方案 ", command=self.profile_action)
+        btn_profile.grid(row=0, column=2, padx=5)
+
+        self.alternate_view = ResultView(frame)
+        self.alternate_view.grid(row=8, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+
+        frame.rowconfigure(8, weight=1)
         frame.columnconfigure(1, weight=1)
 
 #输出符合要求的推荐航班
     def alternate_action(self):
         dep = self.entry_alt_dep_city.get().strip()
         des = self.entry_alt_des_city.get().strip()
-        self.text_alternate_result.delete("1.0", tk.END)
         if not dep or not des:
-            self.text_alternate_result.insert(tk.END, "请输入出发城市和目的城市。\n")
+            self.alternate_view.message("请输入出发城市和目的城市。")
             return
-
-        path_list = self.fms.alternate_flights(dep, des)
+        values = {k: e.get().strip() for k, e in self.alt_options.items()}
+        if not all(v.isdigit() for k, v in values.items() if v or k != "max_layover"):
+            self.alternate_view.message("搜索选项需为非负整数。")
+            return
+        options = {k: int(v) if v else None for k, v in values.items()}
+        rank_by = {"总时长": "time", "总票价": "price"}.get(self.combo_alt_rank.get())
+
+        self.alternate_view.message("正在搜索……")
+        self.run_task("搜索替代航班",
+                      lambda cancel: self.fms.alternate_flights(dep, des, rank_by=rank_by,
+                                                                cancel=cancel, **options),
+                      self.show_alternates, cancellable=True,
+                      on_cancel=lambda: self.alternate_view.message("搜索已取消。"))
+
+    def show_alternates(self, path_list):
+        stats = self.fms.route_cache.stats()
+        cache = f"缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次; "
         if not path_list:
-            self.text_alternate_result.insert(tk.END, "未找到可行的替代航班组合(时刻顺序)。\n")
+            self.alternate_view.message("未找到可行的替代航班组合(时刻顺序)。", cache)
             return
 
-        for idx, path in enumerate(path_list, start=1):
-            self.text_alternate_result.insert(tk.END, f"方案{idx}:\n")
-            for fid in path:
-                flt = self.fms.flight_map.get(fid)
-                if flt:
-                    self.text_alternate_result.insert(tk.END, "   " + str(flt) + "\n")
-            self.text_alternate_result.insert(tk.END, "\n")
+        #每个方案占若干行，滚动到时才生成
+        def rows():
+            for idx, path in enumerate(path_list, start=1):
+                flts = [self.fms.flight_map[fid] for fid in path if fid in self.fms.flight_map]
+                if not flts:
+                    continue
+                minutes = flts[-1].actual_arr_min - flts[0].actual_dep_min
+                total = sum(f.price for f in flts)
+                yield f"方案{idx}: 总时长 {minutes // 60}小时{minutes % 60}分, 总票价 {total:.2f}"
+                for flt in flts:
+                    yield "   " + str(flt)
+                yield ""
+        self.alternate_view.show(rows(), len(path_list), cache, "个方案")
+
+#读取出发城市、目的城市与最短中转，输入有误时在结果框中提示并返回None
+    def read_route_query(self):
+        dep = self.entry_alt_dep_city.get().strip()
+        des = self.entry_alt_des_city.get().strip()
+        min_transfer = self.alt_options["min_layover"].get().strip() or "0"
+        if not dep or not des:
+            self.alternate_view.message("请输入出发城市和目的城市。")
+            return None
+        if not min_transfer.isdigit():
+            self.alternate_view.message("最短中转需为非负整数。")
+            return None
+        return dep, des, int(min_transfer)
+
+#连接扫描求最早到达目的城市的行程(计入延误)
+    def earliest_arrival_action(self):
+        query = self.read_route_query()
+        if query is None:
+            return
+        self.alternate_view.message("正在搜索……")
+        self.run_task("计算最早到达",
+                      lambda: self.fms.earliest_arrival(*query[:2], min_transfer=query[2]),
+                      self.show_earliest_arrival)
+
+    def show_earliest_arrival(self, result):
+        if result is None:
+            self.alternate_view.message("无法到达目的城市。")
+            return
+        arr, path = result
+        self.alternate_view.show(
+            ["   " + str(self.fms.flight_map[fid]) for fid in path],
+            title=f"最早到达: {(EPOCH + timedelta(minutes=arr)).strftime('%Y-%m-%d %H:%M')}")
+
+#列出所有不被支配的出发/到达时刻组合：出发越晚到达也越晚
+    def profile_action(self):
+        query = self.read_route_query()
+        if query is None:
+            return
+        self.alternate_view.message("正在搜索……")
+        self.run_task("计算出发/到达方案",
+                      lambda cancel: self.fms.profile_routes(*query[:2], min_transfer=query[2],
+                                                             cancel=cancel),
+                      self.show_profile, cancellable=True,
+                      on_cancel=lambda: self.alternate_view.message("搜索已取消。"))
+
+    def show_profile(self, profile):
+        if not profile:
+            self.alternate_view.message("无法到达目的城市。")
+            return
+        self.alternate_view.show(
+            (f"{(EPOCH + timedelta(minutes=dep)).strftime('%Y-%m-%d %H:%M')} 出发 -> "
+             f"{(EPOCH + timedelta(minutes=arr)).strftime('%Y-%m-%d %H:%M')} 到达: "
+             f"{' -> '.join(path)}" for dep, arr, path in profile), len(profile), unit="个方案")
 
 
 def main():  #程序入口
+    parser = argparse.ArgumentParser(description="飞机票管理系统")
+    parser.add_argument("--lazy-graph", action="store_true", help="使用按需生成后继的航班图")
+    parser.add_argument("--columnar", action="store_true", help="使用NumPy列式存储执行航班查询")
+    parser.add_argument("--wal", choices=["off", "always", "group", "none"], default="group",
+                        help="预写日志的落盘方式：关闭/每次fsync/合并fsync/不fsync")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="使用SQLite数据库保存航班和持票记录（不再使用快照和预写日志）")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="记录热点方法的调用次数与耗时，退出时写入该文件(.prom为Prometheus格式，否则为JSON)")
+    parser.add_argument("--profile", metavar="PATH", help="同时用cProfile剖析，退出时保存到该文件")
+    args = parser.parse_args()
+    metrics = None
+    if args.metrics or args.profile:
+        metrics = Metrics(profile=bool(args.profile))
     root = tk.Tk()
-    app = FlightApp(root)
+    app = FlightApp(root, "lazy" if args.lazy_graph else "materialized", args.columnar, args.wal,
+                    args.sqlite, metrics)
     root.mainloop()
+    app.close()
+    if args.metrics:
+        metrics.export(args.metrics)
+    if args.profile:
+        metrics.dump_profile(args.profile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from bisect import bisect_left
+
+#可选的性能统计：替换FlightManagementSystem实例上的热点方法，记录调用次数、出错次数与耗时分布
+#未调用attach时系统中没有任何统计代码，不产生开销；detach后恢复原方法
+#profile=True时同时用cProfile记录这些方法内部的调用，同一时刻只剖析一个线程
+
+INSTRUMENTED = ("read_dataset", "build_flight_graph", "query_flights", "iter_flights",
+                "count_flights", "buy_ticket", "refund_ticket", "do_priority_queue",
+                "alternate_flights", "alternate_flights_batch")
+
+#按需产出结果的方法：累计每次取下一个结果的耗时，取完或被丢弃时记录一次，不计调用方处理结果的时间
+GENERATORS = {"iter_flights"}
+
+#耗时分布的桶上界(秒)，与Prometheus直方图的le标签对应
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, failed=False):
+        with self.lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            if failed:
+                self.errors += 1
+
+#累计计数：每个桶包含所有不超过其上界的调用
+    def cumulative(self):
+        total, result = 0, []
+        for le, c in zip(BUCKETS, self.counts):
+            total += c
+            result.append((le, total))
+        return result
+
+
+class Metrics:
+    def __init__(self, profile=False):
+        self.histograms = {name: Histogram() for name in INSTRUMENTED}
+        self.fms = None
+        self.profiler = cProfile.Profile() if profile else None
+        self.profiling = threading.Lock()  #持有者为正在被剖析的线程
+        self.profiled = threading.local()  #depth: 本线程嵌套的被统计方法层数
+
+#替换实例上的方法；被统计方法之间的内部调用(如load_storage中的build_flight_graph)同样会被记录
+    def attach(self, fms):
+        self.fms = fms
+        for name in INSTRUMENTED:
+            setattr(fms, name, self._wrap(name, getattr(fms, name)))
+        return self
+
+    def detach(self):
+        for name in INSTRUMENTED:
+            self.fms.__dict__.pop(name, None)
+        self.fms = None
+
+    def _wrap(self, name, method):
+        hist = self.histograms[name]
+        if name in GENERATORS:
+            return self._wrap_generator(hist, method)
+        if self.profiler is not None:
+            method = self._profiled(method)
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except BaseException:
+                hist.observe(time.perf_counter() - t0, failed=True)
+                raise
+            hist.observe(time.perf_counter() - t0)
+            return result
+        timed.__wrapped__ = method
+        return timed
+
+    def _wrap_generator(self, hist, method):
+        step = self._profiled(next) if self.profiler is not None else next
+
+        def timed(*args, **kwargs):
+            spent, failed = 0.0, False
+            t0 = time.perf_counter()
+            try:
+                items = method(*args, **kwargs)
+                while True:
+                    try:
+                        item = step(items)
+                    except StopIteration:
+                        break
+                    spent += time.perf_counter() - t0
+                    t0 = None  #交给调用方期间不计时
+                    yield item
+                    t0 = time.perf_counter()
+            except GeneratorExit:
+                raise
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                if t0 is not None:
+                    spent += time.perf_counter() - t0
+                hist.observe(spent, failed)
+        timed.__wrapped__ = method
+        return timed
+
+#只在最外层的被统计方法中开关剖析器；其他线程正在剖析时本次调用只计时
+    def _profiled(self, method):
+        local = self.profiled
+
+        def run(*args, **kwargs):
+            depth = getattr(local, "depth", 0)
+            if depth:
+                local.depth = depth + 1
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    local.depth = depth
+            if not self.profiling.acquire(blocking=False):
+                return method(*args, **kwargs)
+            local.depth = 1
+            try:
+                return self.profiler.runcall(method, *args, **kwargs)
+            finally:
+                local.depth = 0
+                self.profiling.release()
+        return run
+
+    def snapshot(self):
+        calls = {}
+        for name, hist in self.histograms.items():
+            with hist.lock:
+                calls[name] = {
+                    "count": hist.count, "errors": hist.errors, "seconds_total": hist.total,
+                    "buckets": [["+Inf" if le == float("inf") else le, c]
+                                for le, c in hist.cumulative()]}
+        result = {"calls": calls}
+        if self.fms is not None:
+            result["graph"] = self.fms.graph_stats()
+            result["route_cache"] = self.fms.route_cache.stats()
+        return result
+
+    def to_json(self, indent=None):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+#Prometheus文本格式：每个方法一组直方图，图规模和缓存统计为gauge
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = ["# HELP flight_call_seconds FlightManagementSystem method latency.",
+                 "# TYPE flight_call_seconds histogram"]
+        for name, call in snap["calls"].items():
+            for le, c in call["buckets"]:
+                lines.append(f'flight_call_seconds_bucket{{method="{name}",le="{le}"}} {c}')
+            lines.append(f'flight_call_seconds_sum{{method="{name}"}} {call["seconds_total"]}')
+            lines.append(f'flight_call_seconds_count{{method="{name}"}} {call["count"]}')
+        lines += ["# HELP flight_call_errors_total Calls that raised an exception.",
+                  "# TYPE flight_call_errors_total counter"]
+        for name, call in snap["calls"].items():
+            lines.append(f'flight_call_errors_total{{method="{name}"}} {call["errors"]}')
+        for section, title in (("graph", "Flight graph size"), ("route_cache", "Route cache statistic")):
+            for key, value in snap.get(section, {}).items():
+                lines.append(f"# HELP flight_{section}_{key} {title}: {key}.")
+                lines.append(f"# TYPE flight_{section}_{key} gauge")
+                lines.append(f"flight_{section}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+#按扩展名导出：.prom为Prometheus文本格式，其余为JSON
+    def export(self, path):
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json(indent=2)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+#cProfile结果：按累计耗时排序的前limit行文本；未启用剖析时返回空字符串
+    def profile_report(self, limit=30):
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        with self.profiling:
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+#保存cProfile原始数据，可用pstats或snakeviz等工具查看
+    def dump_profile(self, path):
+        if self.profiler is not None:
+            with self.profiling:
+                self.profiler.dump_stats(path)
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from main import EPOCH, load_system
+from metrics import Metrics
+
+#无界面的航班服务：基于asyncio的本地TCP服务，每行一个JSON请求，每行一个JSON响应
+#请求格式 {"op": 操作名, ...参数}，响应格式 {"ok": true, "result": ...} 或 {"ok": false, "error": 说明}
+#查询和行程搜索交给后台线程执行，不阻塞事件循环；购票、退票、预约统一进入写队列，由单个写任务依次交给写线程执行
+
+def minutes_to_str(minutes):
+    return (EPOCH + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M")
+
+def flight_to_dict(flt):
+    return {"flight_id": flt.flight_id, "departure_city": flt.departure_city,
+            "destination_city": flt.destination_city, "departure_date": flt.departure_date,
+            "departure_time": flt.departure_time, "arrival_time": flt.arrival_time,
+            "price": flt.price, "tickets": flt.tickets, "is_delay": flt.is_delay,
+            "delay_time": flt.delay_time, "is_cancelled": flt.is_cancelled,
+            "is_for_sale": flt.is_for_sale}
+
+class FlightService:
+    def __init__(self, fms, metrics=None):
+        self.fms = fms
+        self.instrumentation = metrics  #metrics.Metrics，启用性能统计时可由metrics操作导出
+        #只用一个线程执行查询；写操作淘汰的行程缓存和连接表由锁和版本号保护，
+        #淘汰之前开始的搜索不会把过时的结果写回
+        self.reader = ThreadPoolExecutor(max_workers=1)
+        #写操作在单独的一个线程中逐个执行，落盘和大批量取消/延误不阻塞事件循环
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.writes = None
+        self.writer_task = None
+        self.server = None
+        self.handlers = set()  #各连接的处理任务，关闭时取消
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.writes = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self._writer())
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+#先停止接受新连接，再取消仍在等待请求的连接和写任务并等待它们结束
+    async def close(self):
+        self.server.close()
+        tasks = [*self.handlers, self.writer_task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+        self.reader.shutdown(wait=False)
+        self.writer.shutdown(wait=False)
+
+#单个写任务：按到达顺序把写操作交给写线程，等上一个完成后再交下一个，写操作之间不会交错
+#启用预写日志时写操作不等待落盘，由另一个任务等待日志合并fsync后再答复，后续写操作可并入同一批
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, params, future = await self.writes.get()
+            try:
+                result, tokens = await loop.run_in_executor(self.writer, self._run_write, func, params)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+                continue
+            if tokens:
+                asyncio.create_task(self._reply_when_durable(future, result, tokens))
+            elif not future.cancelled():
+                future.set_result(result)
+
+#在写线程中执行，返回(结果, 未等待落盘的日志凭据)
+    def _run_write(self, func, params):
+        deferred = self.fms.wal_deferred
+        deferred.tokens = tokens = []
+        try:
+            return func(**params), tokens
+        finally:
+            deferred.tokens = None
+
+    async def _reply_when_durable(self, future, result, tokens):
+        await asyncio.get_running_loop().run_in_executor(None, self.fms.wal_sync, tokens)
+        if not future.cancelled():
+            future.set_result(result)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.dispatch(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass  #关闭服务时被取消：正常结束，否则asyncio会把取消当作未处理的异常记录
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+#解析并执行一条请求，返回响应字典
+    async def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            params = dict(request)
+            op = params.pop("op")
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return {"ok": False, "error": "请求需为带op字段的JSON对象"}
+        try:
+            if op in self.READ_OPS:
+                func = getattr(self, op)
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.reader, lambda: func(**params))
+            elif op in self.WRITE_OPS:
+                future = asyncio.get_running_loop().create_future()
+                await self.writes.put((getattr(self, op), params, future))
+                result = await future
+            else:
+                return {"ok": False, "error": f"未知操作: {op}"}
+        except (TypeError, ValueError) as e:
+            return {"ok": False, "error": f"参数错误: {e}"}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, "result": result}
+
+    READ_OPS = {"query", "fares", "flight", "routes", "user", "metrics"}
+    WRITE_OPS = {"buy", "refund", "reserve", "process_reservations", "cancel", "delay"}
+
+    def query(self, dep=None, des=None, only_for_sale=False, sort_by=None, limit=100, date=None):
+        flights = islice(self.fms.iter_flights(dep, des, only_for_sale, sort_by, date), limit)
+        return {"count": self.fms.count_flights(dep, des, only_for_sale, date),
+                "flights": [flight_to_dict(f) for f in flights]}
+
+#航线的票价汇总与最便宜(sort_by为"出发时间"时为最早出发)的前limit个可售航班；date为None时不限日期，不返回汇总
+    def fares(self, dep, des, date=None, limit=10, sort_by="票价"):
+        return {"summary": self.fms.route_fares(dep, des, date) if date is not None else None,
+                "flights": [flight_to_dict(f)
+                            for f in self.fms.cheapest_flights(dep, des, date, int(limit), sort_by)]}
+
+    def flight(self, flight_id):
+        flt = self.fms.get_flight_by_id(flight_id)
+        return flight_to_dict(flt) if flt else None
+
+    def user(self, user_id):
+        return self.fms.tickets.flights(user_id)
+
+#format: "json"返回统计字典，"prometheus"返回文本格式
+    def metrics(self, format="json"):
+        if self.instrumentation is None:
+            raise ValueError("未启用性能统计(--metrics)")
+        if format == "prometheus":
+            return self.instrumentation.to_prometheus()
+        return self.instrumentation.snapshot()
+
+#mode: "alternate"为替代航班组合，"earliest"为最早到达，"profile"为出发/到达帕累托方案
+    def routes(self, dep, des, mode="alternate", **options):
+        if mode == "earliest":
+            found = self.fms.earliest_arrival(dep, des, **options)
+            if found is None:
+                return None
+            return {"arrival": minutes_to_str(found[0]), "flights": found[1]}
+        if mode == "profile":
+            return [{"departure": minutes_to_str(d), "arrival": minutes_to_str(a), "flights": path}
+                    for d, a, path in self.fms.profile_routes(dep, des, **options)]
+        if mode == "alternate":
+            return self.fms.alternate_flights(dep, des, **options)
+        raise ValueError(f"未知的行程模式: {mode}")
+
+    def buy(self, user_id, flight_id, quantity=1):
+        suc, msg = self.fms.buy_ticket(user_id, flight_id, int(quantity))
+        return {"success": suc, "message": msg}
+
+    def refund(self, user_id, flight_id, quantity=1):
+        suc, msg = self.fms.refund_ticket(user_id, flight_id, int(quantity))
+        return {"success": suc, "message": msg}
+
+    def reserve(self, user_id, flight_id, priority=0, quantity=1):
+        suc, msg = self.fms.reserve_ticket(user_id, flight_id, int(priority), int(quantity))
+        return {"success": suc, "message": msg}
+
+    def process_reservations(self, flight_ids=None):
+        return [{"user_id": uid, "flight_id": fid, "quantity": qty, "success": suc, "message": msg}
+                for uid, fid, qty, suc, msg in self.fms.do_priority_queue(flight_ids)]
+
+#批量取消/延误：按航班ID列表、城市(出发或到达)、出发日期区间选择航班，条件可组合
+#返回处理的航班、自动退票、受影响的持票用户及其断开的行程衔接
+    def cancel(self, flight_ids=None, city=None, date_from=None, date_to=None):
+        return self.fms.cancel_flights(flight_ids, city, date_from, date_to)
+
+    def delay(self, delay_time, flight_ids=None, city=None, date_from=None, date_to=None):
+        return self.fms.delay_flights(int(delay_time), flight_ids, city, date_from, date_to)
+
+
+async def serve(host, port, graph_mode, use_store, wal, db_path=None, metrics=None):
+    service = FlightService(load_system(graph_mode, use_store, wal, db_path, metrics), metrics)
+    server = await service.start(host, port)
+    print(f"航班服务已启动: {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="飞机票管理系统(无界面服务)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--lazy-graph", action="store_true", help="使用按需生成后继的航班图")
+    parser.add_argument("--columnar", action="store_true", help="使用NumPy列式存储执行航班查询")
+    parser.add_argument("--wal", choices=["off", "always", "group", "none"], default="group",
+                        help="预写日志的落盘方式：关闭/每次fsync/合并fsync/不fsync")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="使用SQLite数据库保存航班和持票记录（不再使用快照和预写日志）")
+    parser.add_argument("--metrics", action="store_true", help="记录热点方法的调用次数与耗时，可由metrics操作导出")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, "lazy" if args.lazy_graph else "materialized",
+                          args.columnar, args.wal, args.sqlite, Metrics() if args.metrics else None))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+from dataSet import generate_dataset
+import main
+from main import Flight, FlightManagementSystem
+
+
+#多线程随机购票/退票，结束后核对余票守恒、无超卖、每位用户不超过10个航班
+#默认参数让少量航班的余票在0附近反复变化，去掉锁时很快就能暴露超卖
+def stress_booking(n_threads, ops=50000, n_flights=12, n_users=20, tickets=3):
+    fms = FlightManagementSystem("lazy")
+    random.seed(0)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(n_flights)]
+    fms.build_flight_graph()
+    for f in fms.flights:
+        f.tickets = tickets
+        f.is_for_sale = True
+
+    ids = list(fms.flight_map)
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(ops // n_threads):
+                uid = f"U{rng.randrange(n_users)}"
+                fid = rng.choice(ids)
+                if rng.random() < 0.6:
+                    fms.buy_ticket(uid, fid, rng.randint(1, 3))
+                else:
+                    fms.refund_ticket(uid, fid, 1)
+        except Exception as e:
+            errors.append(e)
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  #频繁切换线程，尽量制造竞争
+    try:
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        sys.setswitchinterval(old_interval)
+    assert not errors, f"工作线程异常: {errors[0]!r}"
+
+    sold = {}
+    for uid, owned in fms.tickets.items():
+        assert len(owned) <= 10, f"用户 {uid} 持有 {len(owned)} 个航班"
+        for fid, c in owned.items():
+            sold[fid] = sold.get(fid, 0) + c
+            assert fms.tickets.holders(fid)[uid] == c
+    for fid, flt in fms.flight_map.items():
+        assert flt.tickets >= 0, f"航班 {fid} 超卖"
+        assert flt.tickets + sold.get(fid, 0) == tickets, f"航班 {fid} 余票不守恒"
+    return elapsed
+
+
+@pytest.mark.parametrize("n_threads", [1, 4, 16])
+def test_concurrent_booking_conserves_seats(n_threads):
+    stress_booking(n_threads, ops=4000)
+
+
+#预约队列按优先级(数值小者优先)处理，同优先级先到先得；退票时自动处理的结果同样按此顺序
+def test_reservation_queue_order():
+    fms = FlightManagementSystem("lazy")
+    random.seed(1)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(3)]
+    fms.build_flight_graph()
+    flt = fms.flights[0]
+    fid = flt.flight_id
+    fms.update_flight(fid, tickets=0, is_for_sale=True)
+
+    for uid, priority in (("U0", 1), ("U1", 0), ("U2", 1), ("U3", 0), ("U4", 0), ("U5", 2), ("U6", 1)):
+        assert fms.reserve_ticket(uid, fid, priority)[0]
+    fms.update_flight(fid, tickets=4)
+    results = fms.do_priority_queue([fid])
+    assert [(uid, ok) for uid, _, _, ok, _ in results] == [
+        ("U1", True), ("U3", True), ("U4", True), ("U0", True),
+        ("U2", False), ("U6", False), ("U5", False)]
+    assert flt.tickets == 0 and fid not in fms.reservations
+
+    #余票为0时排队，退票后依次由队首的预约获得
+    fms.update_flight(fid, tickets=2)
+    assert fms.buy_ticket("H", fid, 2)[0]
+    for uid in ("A", "B", "C", "D"):
+        fms.reserve_ticket(uid, fid, 0)
+    fms.refund_ticket("H", fid, 1)
+    assert fms.get_tickets_number("A", fid) == 1 and fms.get_tickets_number("B", fid) == 0
+    fms.refund_ticket("H", fid, 1)
+    results = fms.do_priority_queue([fid])
+    assert [(uid, ok) for uid, _, _, ok, _ in results] == [
+        ("A", True), ("B", True), ("C", False), ("D", False)]
+
+
+#逐个用户扫描得到的{航班ID: {用户ID: 张数}}，与旧版取消航班时遍历全部用户的做法相同
+def scan_holders(fms):
+    result = {}
+    for uid, owned in fms.tickets.items():
+        for fid, c in owned.items():
+            result.setdefault(fid, {})[uid] = c
+    return result
+
+
+#航班 -> 持票人索引与逐用户扫描一致
+def check_holder_index(fms):
+    scanned = scan_holders(fms)
+    book = fms.tickets
+    indexed = {}
+    for fcode, users in book.by_flight.items():
+        codes = [u for (u,) in main.TICKET_ITEM.iter_unpack(users)]
+        assert len(codes) == len(set(codes)), "持票人索引中有重复用户"
+        indexed[fms.flight_ids.names[fcode]] = {book.users.names[u] for u in codes}
+    assert indexed == {fid: set(holders) for fid, holders in scanned.items()}
+    for fid, holders in scanned.items():
+        assert book.holders(fid) == holders
+
+
+#多位用户购票、退票、预约后取消航班：退票结果与持票人索引都与逐用户扫描一致
+def test_cancel_refunds_match_full_scan():
+    fms = FlightManagementSystem("lazy")
+    random.seed(10)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(30)]
+    fms.build_flight_graph()
+    for f in fms.flights:
+        fms.update_flight(f.flight_id, tickets=6, is_for_sale=True)
+    rng = random.Random(10)
+    ids = [f.flight_id for f in fms.flights]
+    for round_ in range(6):
+        for _ in range(150):
+            uid, fid = f"U{rng.randrange(15)}", rng.choice(ids)
+            r = rng.random()
+            if r < 0.55:
+                fms.buy_ticket(uid, fid, rng.randint(1, 3))
+            elif r < 0.8:
+                owned = fms.tickets.flights(uid)
+                if owned:
+                    fid = rng.choice(list(owned))
+                    fms.refund_ticket(uid, fid, rng.randint(1, owned[fid]))
+            elif r < 0.95:
+                fms.reserve_ticket(uid, fid, rng.randint(0, 2), rng.randint(1, 2))
+            else:
+                fms.do_priority_queue()
+        check_holder_index(fms)
+
+        fid = max((f for f in ids if not fms.flight_map[f].is_cancelled),
+                  key=lambda f: len(scan_holders(fms).get(f, {})))
+        expected = scan_holders(fms).get(fid, {})
+        assert expected, "取消的航班应有持票人"
+        refunded = fms.cancel_flight(fid)
+        assert dict(refunded) == expected and len(refunded) == len(expected)
+        assert fid not in scan_holders(fms) and not fms.tickets.holders(fid)
+        assert fms.flight_ids.codes[fid] not in fms.tickets.by_flight
+        check_holder_index(fms)
+
+
+#user_tickets为TicketBook上的只读视图：内容与按原字典写法维护的模型一致，随购票、退票、取消更新，不能直接修改
+def test_user_tickets_view():
+    fms = FlightManagementSystem("lazy")
+    random.seed(11)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(20)]
+    fms.build_flight_graph()
+    for f in fms.flights:
+        fms.update_flight(f.flight_id, tickets=8, is_for_sale=True)
+    rng = random.Random(11)
+    ids = [f.flight_id for f in fms.flights]
+    view = fms.user_tickets
+    model = {}  #原来的user_tickets：用户ID -> {航班ID: 张数}，全部退票后保留空字典
+    for i in range(400):
+        uid, fid, qty = f"U{rng.randrange(8)}", rng.choice(ids), rng.randint(1, 3)
+        r = rng.random()
+        if r < 0.6:
+            if fms.buy_ticket(uid, fid, qty)[0]:
+                owned = model.setdefault(uid, {})
+                owned[fid] = owned.get(fid, 0) + qty
+        elif r < 0.95:
+            if fms.refund_ticket(uid, fid, qty)[0]:
+                model[uid][fid] -= qty
+                if not model[uid][fid]:
+                    del model[uid][fid]
+        elif not fms.flight_map[fid].is_cancelled:
+            fms.cancel_flight(fid)
+            for owned in model.values():
+                owned.pop(fid, None)
+        if i % 50 == 0:
+            assert {uid: dict(owned) for uid, owned in view.items()} == model
+    assert {uid: dict(owned) for uid, owned in fms.user_tickets.items()} == model
+    assert len(view) == len(model) and list(view) == list(model)
+    assert "Nobody" not in view and view.get("Nobody") is None
+    with pytest.raises(KeyError):
+        view["Nobody"]
+    uid = next(iter(model))
+    assert view[uid].get("Nope", 0) == 0
+    for fid, count in model[uid].items():
+        assert view[uid][fid] == fms.get_tickets_number(uid, fid) == count
+    with pytest.raises(TypeError):
+        view[uid] = {}
+    with pytest.raises(TypeError):
+        view[uid][ids[0]] = 5
@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+from dataSet import city_names, generate_dataset, generate_flights, write_dataset
+from main import Flight
+
+
+#相同种子与参数生成相同的数据，不同种子不同；给出种子时不读取也不改变random模块的全局状态
+@pytest.mark.parametrize("options", [{}, {"hub_skew": 1.0, "days": 5, "overnight": 0.2, "num_cities": 30}])
+def test_seed_determinism(options):
+    random.seed(1)
+    state = random.getstate()
+    first = generate_dataset(500, seed=7, **options)
+    assert random.getstate() == state
+    random.seed(2)
+    assert generate_dataset(500, seed=7, **options) == first
+    assert generate_dataset(500, seed=8, **options) != first
+    #不给种子时使用全局状态：重新设置全局种子后结果相同
+    random.seed(3)
+    unseeded = generate_dataset(200, **options)
+    random.seed(3)
+    assert generate_dataset(200, **options) == unseeded
+    assert list(generate_flights(200, seed=7, **options)) == first[:200]
+
+
+#第k个城市的出发次数约与1/k^hub_skew成正比；hub_skew为0时均匀分布；出发与到达城市不同
+@pytest.mark.parametrize("skew", [0.0, 1.0, 2.0])
+def test_hub_skew(skew):
+    n, num_cities = 40000, 6
+    names = city_names(num_cities)
+    lines = [line.split() for line in generate_dataset(n, num_cities=num_cities, seed=11, hub_skew=skew)]
+    assert all(parts[1] != parts[2] for parts in lines)
+    assert {parts[1] for parts in lines} == set(names)
+    counts = Counter(parts[1] for parts in lines)
+    weights = [1 / k ** skew for k in range(1, num_cities + 1)]
+    for name, weight in zip(names, weights):
+        assert counts[name] / n == pytest.approx(weight / sum(weights), rel=0.1), name
+
+
+#days: 出发日期在start_date起的days天内且每天都有航班，出发时刻在06:00至23:55之间，当天到达
+def test_days_spread():
+    start, days = date(2024, 2, 27), 4
+    lines = generate_dataset(2000, seed=5, days=days, start_date=start)
+    expected = {(start + timedelta(days=d)).strftime("%Y%m%d") for d in range(days)}
+    assert {line.split()[4] for line in lines} == expected
+    for line in lines:
+        f = Flight(*line.split())
+        assert "06:00" <= f.departure_time <= "23:55" and f.departure_time[-1] in "05"
+        assert f.departure_time < f.arrival_time
+        assert 45 <= f.arr_min - f.dep_min <= 180
+    #不给days时沿用原时间线：每天10个航班，出发时刻递增
+    timeline = [line.split() for line in generate_dataset(30, seed=5)]
+    assert [parts[4] for parts in timeline] == [f"2024010{1 + i // 10}" for i in range(1, 31)]
+
+
+#overnight: 约该比例的航班22:00以后出发、次日到达，其余当天到达
+@pytest.mark.parametrize("share", [0.0, 0.25, 1.0])
+def test_overnight_share(share):
+    lines = generate_dataset(4000, seed=9, days=3, overnight=share)
+    flights = [Flight(*line.split()) for line in lines]
+    red_eye = [f for f in flights if f.arrival_time < f.departure_time]
+    assert len(red_eye) / len(flights) == pytest.approx(share, abs=0.03)
+    if share == 1.0:
+        assert len(red_eye) == len(flights)
+    for f in red_eye:
+        assert f.departure_time >= "22:00"
+        assert f.arrival_dt.date() == f.departure_dt.date() + timedelta(days=1)
+        assert 60 <= f.arr_min - f.dep_min <= 24 * 60
+    assert all(f.arr_min > f.dep_min for f in flights)
+
+
+def test_write_dataset_matches_generate(tmp_path):
+    path = tmp_path / "flights.txt"
+    assert write_dataset(str(path), 250, batch=40, seed=3, days=2) == 250
+    assert path.read_text(encoding="utf-8").splitlines() == generate_dataset(250, seed=3, days=2)
+    with pytest.raises(ValueError):
+        city_names(1)
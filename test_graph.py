@@ -0,0 +1,514 @@
+import random
+import threading
+from datetime import datetime
+
+import pytest
+
+from dataSet import cities, generate_dataset
+from main import EPOCH, Flight, FlightManagementSystem, iter_flight_chunks
+
+
+#随机生成一个航班（用于增删改测试）
+def random_flight(fid):
+    dep = random.choice(cities)
+    des = random.choice([c for c in cities if c != dep])
+    day = f"202401{random.randint(1, 28):02d}"
+    h, m = random.randint(0, 21), random.randint(0, 59)
+    return Flight(fid, dep, des, "None", day, f"{h:02d}:{m:02d}",
+                  f"{h + random.randint(1, 2):02d}:{m:02d}", random.randint(200, 1000),
+                  random.randint(50, 200), 0, 0, 0, 1)
+
+
+#旧版双层循环建图，作为对照(与现在的图一样按计入延误的实际时刻衔接)；benchmark.py用它对比耗时
+def build_flight_graph_naive(flights):
+    graph = {f.flight_id: [] for f in flights}
+    for f1 in flights:
+        for f2 in flights:
+            if f1.flight_id == f2.flight_id:
+                continue
+            if (f1.destination_city == f2.departure_city and
+                    f2.actual_dep_min >= f1.actual_arr_min):
+                graph[f1.flight_id].append(f2.flight_id)
+    return graph
+
+
+#建图结果与逐对比较全部航班的旧算法一致，含延误航班与跨日到达的航班
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_graph_matches_naive_pairwise(mode):
+    random.seed(5)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(400, num_cities=6, days=2, overnight=0.2)]
+    for f in fms.flights[::7]:
+        f.is_delay, f.delay_time = True, random.randint(10, 300)
+    assert any(f.arr_min - f.dep_min >= 1440 - f.dep_min % 1440 for f in fms.flights), "数据中应有跨日到达的航班"
+    fms.build_flight_graph()
+    naive = build_flight_graph_naive(fms.flights)
+    assert sum(map(len, naive.values())) > 0
+    for fid, nxt in naive.items():
+        assert sorted(fms.successors(fid)) == sorted(nxt), f"航班 {fid} 的邻接表不一致"
+
+
+#随机增删改后，增量维护的航班图应与全量重建完全一致
+def check_incremental_graph(fms, ops):
+    for i in range(ops):
+        r = random.random()
+        if r < 0.4 or not fms.flights:
+            fms.add_flight(random_flight(f"X{i}"))
+        elif r < 0.7:
+            fms.delete_flight_by_id(random.choice(fms.flights).flight_id)
+        else:
+            f = random.choice(fms.flights)
+            tmp = random_flight(f.flight_id)
+            field = random.choice(["departure_city", "destination_city", "departure_date",
+                                   "departure_time", "arrival_time", "price"])
+            fms.update_flight(f.flight_id, **{field: getattr(tmp, field)})
+    full = FlightManagementSystem(fms.graph_mode)
+    full.flights = list(fms.flights)
+    full.build_flight_graph()
+    #两边的航班编码不同(增量一侧含已删除航班的编码)，比较解码后的航班ID
+    for f in full.flights:
+        assert fms.successors(f.flight_id) == full.successors(f.flight_id), "增量维护的航班图与全量重建不一致"
+    names, full_names = fms.flight_ids.names, full.flight_ids.names
+    for city, codes in full.city_dep_ids.items():
+        assert [names[c] for c in fms.city_dep_ids[city]] == [full_names[c] for c in codes], \
+            f"城市 {city} 的出发索引不一致"
+
+
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_incremental_matches_rebuild(mode):
+    random.seed(2)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(300)]
+    fms.build_flight_graph()
+    check_incremental_graph(fms, 300)
+
+
+#查询与计数须与对全部航班的线性筛选一致(顺序为航班列表顺序，排序为稳定排序)，索引桶与按航班列表重建的相同
+def check_indexes(fms):
+    for name, key in (("dep_index", lambda f: f.departure_city),
+                      ("route_index", lambda f: (f.departure_city, f.destination_city)),
+                      ("date_index", lambda f: f.departure_date)):
+        rebuilt = {}
+        for f in fms.flights:
+            rebuilt.setdefault(key(f), []).append(f.flight_id)
+        assert {k: list(bucket) for k, bucket in getattr(fms, name).items()} == rebuilt, name
+
+    names = sorted({f.departure_city for f in fms.flights} | {f.destination_city for f in fms.flights})
+    dates = sorted({f.departure_date for f in fms.flights})
+    filters = [(None, None, None), (None, None, dates[0]), (None, names[1], None), ("Nowhere", None, None)]
+    filters += [(dep, des, date) for dep in names for des in (None, names[0], names[-1]) if dep != des
+                for date in (None, dates[0], dates[-1])]
+    for dep, des, date in filters:
+        for only_for_sale in (False, True):
+            want = [f for f in fms.flights
+                    if (dep is None or f.departure_city == dep) and (des is None or f.destination_city == des)
+                    and (date is None or f.departure_date == date)
+                    and (not only_for_sale or (f.tickets > 0 and not f.is_cancelled and f.is_for_sale))]
+            assert fms.count_flights(dep, des, only_for_sale, date) == len(want), (dep, des, date, only_for_sale)
+            for sort_by, key in ((None, None), ("票价", lambda f: f.price), ("出发时间", lambda f: f.departure_time)):
+                expected = sorted(want, key=key) if key else want
+                got = fms.query_flights(dep, des, only_for_sale, sort_by, date)
+                assert [f.flight_id for f in got] == [f.flight_id for f in expected], \
+                    (dep, des, date, only_for_sale, sort_by)
+    for date in dates:
+        assert fms.flights_on_date(date) == [f for f in fms.flights if f.departure_date == date]
+
+
+#增、删、改(城市、日期、时刻、票价、余票)与取消之后，出发城市/航线/日期索引与票价汇总仍与线性筛选一致
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_indexes_match_linear_filter(mode):
+    random.seed(12)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(200, num_cities=5, days=3)]
+    fms.build_flight_graph()
+    names = sorted({f.departure_city for f in fms.flights})
+    dates = sorted({f.departure_date for f in fms.flights})
+    check_indexes(fms)
+    for i in range(60):
+        fid = random.choice(fms.flights).flight_id
+        step = i % 6
+        if step == 0:
+            base = fms.flight_map[fid]
+            fms.add_flight(Flight(f"N{i}", random.choice(names), base.departure_city, "None",
+                                  random.choice(dates), "06:00", "08:00", random.randint(200, 900),
+                                  random.randint(0, 3), 0, 0, 0, 1))
+        elif step == 1:
+            assert fms.delete_flight_by_id(fid)
+        elif step == 2:
+            field = random.choice(["departure_city", "destination_city"])
+            city = random.choice([c for c in names if c != getattr(fms.flight_map[fid], field)])
+            fms.update_flight(fid, **{field: city})
+        elif step == 3:
+            fms.update_flight(fid, departure_date=random.choice(dates),
+                              departure_time=f"{random.randint(0, 23):02d}:{random.randint(0, 59):02d}")
+        elif step == 4:
+            fms.update_flight(fid, price=float(random.randint(200, 900)), tickets=random.randint(0, 2))
+        else:
+            fms.cancel_flights(flight_ids=[fid])
+        check_indexes(fms)
+    #按城市与日期范围批量取消
+    fms.cancel_flights(city=names[0], date_from=dates[0], date_to=dates[1])
+    check_indexes(fms)
+
+
+#批量延误/取消报告的断开衔接应与逐对比较变更前后时刻的结果一致
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+@pytest.mark.parametrize("op", ["delay", "cancel"])
+def test_bulk_impact_matches_pairwise(mode, op):
+    random.seed(3)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(200, num_cities=5, days=1)]
+    fms.build_flight_graph()
+    city = fms.flights[0].departure_city
+
+    def connected(max_layover):
+        return {(a.flight_id, b.flight_id) for a in fms.flights for b in fms.flights
+                if a is not b and a.destination_city == b.departure_city
+                and not a.is_cancelled and not b.is_cancelled
+                and 0 <= b.actual_dep_min - a.actual_arr_min <= max_layover}
+
+    fms.delay_flights(30, flight_ids=[f.flight_id for f in fms.flights[::7]])
+    before = connected(240)
+    if op == "delay":
+        report = fms.delay_flights(90, city=city)
+    else:
+        report = fms.cancel_flights(city=city)
+    touched = {f.flight_id for f in fms.flights if city in (f.departure_city, f.destination_city)}
+    after = {(a, b) for a, b in before
+             if not fms.flight_map[a].is_cancelled and not fms.flight_map[b].is_cancelled
+             and fms.flight_map[a].actual_arr_min <= fms.flight_map[b].actual_dep_min}
+    expected = sorted(pair for pair in before - after if touched & set(pair))
+    assert expected and report["connections"] == expected
+
+
+#枚举全部满足条件的航班序列(与search_routes相同的衔接规则)，返回{航班ID路径: (总时长, 总票价)}
+def brute_force_routes(fms, dep, des, max_legs, min_layover, max_layover):
+    found = {}
+
+    def extend(path):
+        last = path[-1]
+        if last.destination_city == des:
+            found[tuple(f.flight_id for f in path)] = (
+                last.actual_arr_min - path[0].actual_dep_min, sum(f.price for f in path))
+            return
+        if len(path) >= max_legs:
+            return
+        for nxt in fms.flights:
+            gap = nxt.actual_dep_min - last.actual_arr_min
+            if (nxt is not last and not nxt.is_cancelled and nxt.departure_city == last.destination_city
+                    and gap >= min_layover and (max_layover is None or gap <= max_layover)):
+                extend(path + [nxt])
+
+    for f in fms.flights:
+        if f.departure_city == dep and not f.is_cancelled:
+            extend([f])
+    return found
+
+
+#前K个最优方案与穷举结果排序后的前K个代价一致；limit为0时两种输出方式都返回全部方案
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_top_k_routes_match_brute_force(mode):
+    random.seed(5)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(120, num_cities=6, days=2)]
+    fms.build_flight_graph()
+    fms.cancel_flights(flight_ids=[f.flight_id for f in fms.flights[::9]])
+    names = sorted({f.departure_city for f in fms.flights})
+    checked = 0
+    for dep in names:
+        for des in names:
+            if dep == des:
+                continue
+            for min_layover, max_layover in ((0, None), (30, 360)):
+                brute = brute_force_routes(fms, dep, des, 3, min_layover, max_layover)
+                for rank_by, which in (("time", 0), ("price", 1)):
+                    costs = sorted(c[which] for c in brute.values())
+                    for k in (1, 5, 0):
+                        routes = fms.search_routes(dep, des, 3, min_layover, max_layover,
+                                                   limit=k, rank_by=rank_by)
+                        got = [brute[tuple(path)][which] for path in routes]
+                        assert got == (costs[:k] if k else costs)
+                        assert len({tuple(path) for path in routes}) == len(routes)
+                everything = fms.search_routes(dep, des, 3, min_layover, max_layover, limit=0)
+                assert sorted(map(tuple, everything)) == sorted(brute)
+                assert [len(path) for path in everything] == sorted(len(path) for path in everything)
+                checked += bool(brute)
+    assert checked > 20
+
+
+#沿航班图(successors)广度优先求depart_after之后出发的最早到达时刻，只乘未取消且在售的航班
+def bfs_earliest_arrival(fms, dep, des, depart_after, min_transfer):
+    usable = lambda f: not f.is_cancelled and f.is_for_sale
+    queue = [f for f in fms.flights if f.departure_city == dep and usable(f)
+             and f.actual_dep_min >= depart_after]
+    seen = {f.flight_id for f in queue}
+    best = None
+    while queue:
+        f = queue.pop()
+        if f.destination_city == des:
+            best = f.actual_arr_min if best is None else min(best, f.actual_arr_min)
+            continue
+        for fid in fms.successors(f.flight_id):
+            nxt = fms.flight_map[fid]
+            if fid not in seen and usable(nxt) and nxt.actual_dep_min >= f.actual_arr_min + min_transfer:
+                seen.add(fid)
+                queue.append(nxt)
+    return best
+
+
+#检查最早到达与帕累托方案：结果与沿航班图的搜索一致，返回的路径可乘且衔接
+def check_connection_scan(fms, pairs, min_transfer):
+    for dep, des in pairs:
+        starts = sorted({f.actual_dep_min for f in fms.flights if f.departure_city == dep})
+        frontier = []
+        for t in reversed(starts):
+            arr = bfs_earliest_arrival(fms, dep, des, t, min_transfer)
+            if arr is not None and (not frontier or arr < frontier[-1][1]):
+                frontier.append((t, arr))
+        for t in starts[::3] + [None]:
+            found = fms.earliest_arrival(dep, des, t, min_transfer)
+            want = bfs_earliest_arrival(fms, dep, des, float("-inf") if t is None else t, min_transfer)
+            assert (found and found[0]) == want, (dep, des, t)
+            if found:
+                path = [fms.flight_map[fid] for fid in found[1]]
+                assert path[0].departure_city == dep and path[-1].destination_city == des
+                assert path[-1].actual_arr_min == found[0]
+                assert all(not f.is_cancelled and f.is_for_sale for f in path)
+                assert all(b.departure_city == a.destination_city and
+                           b.actual_dep_min >= a.actual_arr_min + min_transfer
+                           for a, b in zip(path, path[1:]))
+        profile = fms.profile_routes(dep, des, min_transfer)
+        assert [(d, a) for d, a, _ in profile] == frontier[::-1], (dep, des)
+
+
+#连接扫描的结果与沿航班图的搜索一致；延误、取消、停售后连接表须重建
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_connection_scan_matches_graph_search(mode):
+    random.seed(6)
+    fms = FlightManagementSystem(mode)
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(250, num_cities=6, days=2)]
+    fms.build_flight_graph()
+    names = sorted({f.departure_city for f in fms.flights})
+    pairs = [(a, b) for a in names for b in names if a != b]
+    for min_transfer in (0, 45):
+        check_connection_scan(fms, pairs, min_transfer)
+
+    fms.delay_flights(120, flight_ids=[f.flight_id for f in fms.flights[::4]])
+    check_connection_scan(fms, pairs, 30)
+    fms.cancel_flights(city=names[0], date_from=fms.flights[0].departure_date,
+                       date_to=fms.flights[0].departure_date)
+    check_connection_scan(fms, pairs, 30)
+    for f in fms.flights[1::5]:
+        fms.update_flight(f.flight_id, is_for_sale=False)
+    fms.delay_flight(fms.flights[2].flight_id, 300)
+    check_connection_scan(fms, pairs, 0)
+
+
+#航班增删改、延误、取消之后，缓存中的替代航班结果应与不使用缓存的重新搜索一致
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_route_cache_matches_fresh_search(mode):
+    random.seed(7)
+    lines = generate_dataset(150, num_cities=6, days=2)
+    cached, fresh = FlightManagementSystem(mode), FlightManagementSystem(mode, route_cache_size=0)
+    for fms in (cached, fresh):
+        fms.flights = [Flight(*line.split()) for line in lines]
+        fms.build_flight_graph()
+    names = sorted({f.departure_city for f in cached.flights})
+    queries = [(a, b, options) for a in names for b in names if a != b
+               for options in ({}, {"rank_by": "time", "limit": 5},
+                               {"rank_by": "price", "limit": 5, "min_layover": 30},
+                               {"max_legs": 2, "max_layover": 240})]
+
+    def mutate(fms, i, rng):
+        fid = rng.choice(fms.flights).flight_id
+        r = rng.random()
+        if r < 0.2:
+            fms.add_flight(random_flight(f"C{i}"))
+        elif r < 0.45:
+            tmp = random_flight(fid)
+            field = rng.choice(["departure_city", "destination_city", "departure_date",
+                                "departure_time", "arrival_time", "price"])
+            fms.update_flight(fid, **{field: getattr(tmp, field)})
+        elif r < 0.6:
+            fms.delay_flight(fid, rng.randint(10, 180))
+        elif r < 0.7:
+            fms.delay_flights(rng.randint(10, 120), city=rng.choice(names))
+        elif r < 0.85:
+            fms.cancel_flight(fid)
+        elif r < 0.9:
+            fms.cancel_flights(flight_ids=[f.flight_id for f in rng.sample(fms.flights, 3)])
+        else:
+            fms.delete_flight_by_id(fid)
+
+    for i in range(40):
+        for dep, des, options in queries[i % 7::7]:
+            assert cached.alternate_flights(dep, des, **options) == \
+                fresh.alternate_flights(dep, des, **options), (i, dep, des, options)
+        state = random.getstate()
+        for fms in (cached, fresh):
+            random.setstate(state)
+            mutate(fms, i, random)
+    for dep, des, options in queries:
+        assert cached.alternate_flights(dep, des, **options) == fresh.alternate_flights(dep, des, **options)
+    stats = cached.route_cache.stats()
+    assert stats["hits"] and stats["invalidations"]
+    assert not fresh.route_cache.stats()["size"]
+
+
+#多进程建图、读取数据集与批量替代航班的结果应与单进程完全一致
+#另有一个线程在运行(如界面后台线程、日志落盘线程)时同样可用
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_parallel_matches_serial(tmp_path, mode):
+    random.seed(8)
+    lines = generate_dataset(400, num_cities=8, days=2)
+    path = tmp_path / "flights.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    stop = threading.Event()
+    busy = threading.Thread(target=stop.wait)
+    busy.start()
+    try:
+        serial, parallel = FlightManagementSystem(mode), FlightManagementSystem(mode)
+        serial.read_dataset(str(path))
+        parallel.read_dataset(str(path), chunk_size=50, workers=2)
+        for full in (serial, parallel):
+            assert [f.flight_id for f in full.flights] == [f.flight_id for f in serial.flights]
+            for f in serial.flights:
+                assert full.successors(f.flight_id) == serial.successors(f.flight_id)
+
+        parallel.build_flight_graph(workers=3)
+        assert parallel.graph_stats() == serial.graph_stats()
+        for f in serial.flights:
+            assert parallel.successors(f.flight_id) == serial.successors(f.flight_id)
+        for attr in ("city_dep_ids", "city_arr_ids", "city_dep_times", "city_arr_times"):
+            assert getattr(parallel, attr) == getattr(serial, attr), attr
+
+        names = sorted({f.departure_city for f in serial.flights})
+        pairs = [(a, b) for a in names for b in names if a != b]
+        parallel.cancel_flights(flight_ids=[f.flight_id for f in parallel.flights[::11]])
+        serial.cancel_flights(flight_ids=[f.flight_id for f in serial.flights[::11]])
+        for options in ({"max_layover": 600}, {"rank_by": "price", "limit": 5}):
+            found = parallel.alternate_flights_batch(pairs, workers=2, **options)
+            assert found == {pair: serial.alternate_flights(*pair, **options) for pair in pairs}
+            #结果已写入缓存，再次调用直接取缓存
+            assert parallel.alternate_flights_batch(pairs[:3], workers=2, **options) == \
+                {pair: found[pair] for pair in pairs[:3]}
+    finally:
+        stop.set()
+        busy.join()
+    #没有其他线程时fork，子进程直接继承航班图
+    parallel.route_cache.clear()
+    assert parallel.alternate_flights_batch(pairs, workers=2, **options) == found
+
+
+def minutes(dt):
+    return int((dt - EPOCH).total_seconds()) // 60
+
+
+#到达时刻早于出发时刻视为次日到达，包括跨月、跨年
+@pytest.mark.parametrize("day, dep, arr, arrival", [
+    ("20240115", "08:30", "10:45", datetime(2024, 1, 15, 10, 45)),
+    ("20240115", "23:10", "01:20", datetime(2024, 1, 16, 1, 20)),
+    ("20240229", "22:00", "00:00", datetime(2024, 3, 1, 0, 0)),
+    ("20231231", "23:59", "00:05", datetime(2024, 1, 1, 0, 5)),
+    ("20240115", "12:00", "12:00", datetime(2024, 1, 15, 12, 0)),
+])
+def test_flight_overnight_arrival(day, dep, arr, arrival):
+    f = Flight("T1", "A", "B", "None", day, dep, arr, "500", "10", "0", "0", "0", "1")
+    assert f.dep_min == minutes(datetime.strptime(day + dep, "%Y%m%d%H:%M"))
+    assert f.arr_min == minutes(arrival) and f.arrival_dt == arrival
+    assert (f.actual_dep_min, f.actual_arr_min) == (f.dep_min, f.arr_min)
+
+
+#实际时刻只在有延误标记时计入延误时长，修改标记、时长或计划时刻后随之更新
+def test_flight_delay_adjusts_actual_times():
+    f = Flight("T2", "A", "B", "None", "20240115", "23:00", "01:00", "500", "10", "1", "45", "0", "1")
+    assert (f.actual_dep_min - f.dep_min, f.actual_arr_min - f.arr_min) == (45, 45)
+    assert f.arr_min - f.dep_min == 120
+    f.is_delay = False
+    assert (f.actual_dep_min, f.actual_arr_min) == (f.dep_min, f.arr_min)
+    f.delay_time = 90
+    assert f.actual_dep_min == f.dep_min  #没有延误标记时只记下时长
+    f.is_delay = True
+    assert (f.actual_dep_min, f.actual_arr_min) == (f.dep_min + 90, f.arr_min + 90)
+    f.departure_time = "22:00"
+    assert f.dep_min == minutes(datetime(2024, 1, 15, 22, 0)) and f.actual_dep_min == f.dep_min + 90
+    assert f.arr_min == minutes(datetime(2024, 1, 16, 1, 0)) and f.actual_arr_min == f.arr_min + 90
+    #延误标记为"0"时忽略数据中的延误时长
+    g = Flight("T3", "A", "B", "None", "20240115", "08:00", "09:00", "500", "10", "0", "30", "0", "1")
+    assert g.actual_dep_min == g.dep_min and g.delay_time == 30
+
+
+#修改日期或时刻时重新解析；格式错误时抛出ValueError，航班保持原值
+@pytest.mark.parametrize("field, value", [
+    ("departure_date", "2024-01-15"), ("departure_date", "20241315"), ("departure_date", "20240230"),
+    ("departure_date", "2024011"), ("departure_time", "8:5x"), ("departure_time", "24:00"),
+    ("departure_time", "0800"), ("arrival_time", "12:60"), ("arrival_time", ""),
+])
+def test_flight_setters_reject_malformed(field, value):
+    f = Flight("T4", "A", "B", "None", "20240115", "23:00", "01:00", "500", "10", "1", "15", "0", "1")
+    before = (f.departure_date, f.departure_time, f.arrival_time,
+              f.dep_min, f.arr_min, f.actual_dep_min, f.actual_arr_min)
+    with pytest.raises(ValueError):
+        setattr(f, field, value)
+    assert (f.departure_date, f.departure_time, f.arrival_time,
+            f.dep_min, f.arr_min, f.actual_dep_min, f.actual_arr_min) == before
+    with pytest.raises(ValueError):
+        Flight("T5", "A", "B", "None", *{"departure_date": (value, "08:00", "09:00"),
+                                         "departure_time": ("20240115", value, "09:00"),
+                                         "arrival_time": ("20240115", "08:00", value)}[field],
+               "500", "10", "0", "0", "0", "1")
+
+
+def test_flight_setters_reparse():
+    f = Flight("T6", "A", "B", "None", "20240115", "08:00", "09:30", "500", "10", "0", "0", "0", "1")
+    f.departure_date = "20240301"
+    assert f.dep_min == minutes(datetime(2024, 3, 1, 8, 0)) and f.departure_date == "20240301"
+    f.arrival_time = "07:15"  #早于出发时刻：次日到达
+    assert f.arr_min == minutes(datetime(2024, 3, 2, 7, 15))
+    f.departure_time = "06:00"
+    assert f.arr_min == minutes(datetime(2024, 3, 1, 7, 15))
+
+
+#字段过少、过多、时刻或日期格式错误的行被拒绝并报告行号(从1起，空行也计数)；重复ID同样报告
+#按块解析时行号跨块连续，单进程与多进程的解析结果一致
+def test_parse_rejects_malformed_lines(tmp_path):
+    random.seed(3)
+    lines = generate_dataset(60, num_cities=5, days=1)
+    first = lines[0].split()
+    bad = {
+        4: " ".join(first[:12]),
+        9: lines[1] + " extra",
+        17: " ".join(first[:5] + ["25:00"] + first[6:]).replace(first[0], "BAD1", 1),
+        23: " ".join(first[:6] + ["08:60"] + first[7:]).replace(first[0], "BAD2", 1),
+        31: " ".join(first[:4] + ["2024011"] + first[5:]).replace(first[0], "BAD3", 1),
+        40: "",
+        52: lines[2],
+        61: "X1",
+    }
+    expected = {
+        4: "字段数应为13，实际为12", 9: "字段数应为13，实际为14", 17: "时间格式错误: 25:00",
+        23: "时间格式错误: 08:60", 31: "日期格式错误: 2024011",
+        52: f"航班ID重复: {lines[2].split()[0]}", 61: "字段数应为13，实际为1",
+    }
+    rows = list(lines)
+    for lineno in sorted(bad):
+        rows.insert(lineno - 1, bad[lineno])
+    path = tmp_path / "flights.txt"
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    found = {}
+    for workers in (0, 2):
+        with open(path, encoding="utf-8") as f:
+            chunks = list(iter_flight_chunks(f, chunk_size=7, workers=workers))
+        parsed = [(lineno, flt.flight_id) for p, _ in chunks for lineno, flt in p]
+        rejected = [item for _, bad_lines in chunks for item in bad_lines]
+        #重复ID在解析阶段合法，由read_dataset拒绝
+        assert [n for n, _ in parsed] == [n for n in range(1, len(rows) + 1) if n not in bad or n == 52]
+        assert [fid for _, fid in parsed] == [rows[n - 1].split()[0] for n, _ in parsed]
+        assert dict(rejected) == {n: r for n, r in expected.items() if n != 52}
+        fms = FlightManagementSystem("lazy")
+        assert fms.read_dataset(str(path), chunk_size=7, workers=workers) == sorted(expected.items())
+        assert fms.load_errors == sorted(expected.items())
+        assert [f.flight_id for f in fms.flights] == [line.split()[0] for line in lines]
+        found[workers] = parsed, rejected, [(f.flight_id, f.dep_min, f.arr_min) for f in fms.flights]
+    assert found[0] == found[2]
@@ -0,0 +1,143 @@
+import random
+import re
+import time
+
+import pytest
+
+import metrics
+from dataSet import generate_dataset
+from main import Flight, FlightManagementSystem
+from metrics import BUCKETS, Histogram, Metrics
+
+
+def make_fms():
+    random.seed(9)
+    fms = FlightManagementSystem("lazy")
+    fms.flights = [Flight(*line.split()) for line in generate_dataset(50)]
+    fms.build_flight_graph()
+    return fms
+
+
+#attach只替换实例上的方法，detach后恢复为类上的原方法
+def test_attach_detach_restores_methods():
+    fms = make_fms()
+    originals = {name: getattr(fms, name) for name in metrics.INSTRUMENTED}
+    m = Metrics().attach(fms)
+    for name in metrics.INSTRUMENTED:
+        assert name in vars(fms) and getattr(fms, name) != originals[name]
+    fid = fms.flights[0].flight_id
+    assert fms.buy_ticket("U1", fid, 1)[0]
+    assert fms.buy_ticket("U1", fid, 0) == (False, "购票数量需为正数")
+    fms.query_flights(fms.flights[0].departure_city)
+    calls = m.snapshot()["calls"]
+    assert calls["buy_ticket"]["count"] == 2 and calls["query_flights"]["count"] == 1
+    assert calls["refund_ticket"]["count"] == 0
+
+    m.detach()
+    for name in metrics.INSTRUMENTED:
+        assert name not in vars(fms)
+        assert getattr(fms, name) == originals[name]
+    fms.buy_ticket("U1", fid, 1)
+    assert m.snapshot()["calls"]["buy_ticket"]["count"] == 2
+
+
+#每次观测落入第一个上界不小于耗时的桶，累计计数逐桶不减，最后一桶等于总次数
+def test_histogram_buckets():
+    hist = Histogram()
+    for seconds in (0.00005, 0.0001, 0.0002, 0.003, 0.003, 0.7, 42.0):
+        hist.observe(seconds)
+    hist.observe(0.01, failed=True)
+    expected = [0] * len(BUCKETS)
+    for i in (0, 0, 1, 5, 5, 12, 16, 6):
+        expected[i] += 1
+    assert hist.counts == expected
+    assert (hist.count, hist.errors) == (8, 1)
+    assert hist.total == pytest.approx(0.00005 + 0.0001 + 0.0002 + 0.006 + 0.7 + 42.0 + 0.01)
+    cumulative = hist.cumulative()
+    assert [le for le, _ in cumulative] == list(BUCKETS)
+    assert [c for _, c in cumulative] == [sum(expected[:i + 1]) for i in range(len(BUCKETS))]
+
+
+#按需产出的方法：只取一部分就丢弃时记录一次，耗时只含取结果的时间，不含调用方在两次取结果之间的时间
+def test_generator_timing_on_partial_consumption(monkeypatch):
+    fms = make_fms()
+
+    def slow_iter(*args, **kwargs):
+        for f in fms.flights:
+            time.sleep(0.02)
+            yield f
+    monkeypatch.setattr(fms, "iter_flights", slow_iter)
+    m = Metrics().attach(fms)
+    hist = m.histograms["iter_flights"]
+
+    items = fms.iter_flights()
+    assert hist.count == 0  #尚未开始取结果
+    next(items)
+    time.sleep(0.2)
+    next(items)
+    time.sleep(0.2)
+    items.close()
+    assert hist.count == 1 and hist.errors == 0
+    assert 0.04 <= hist.total < 0.2
+
+    #全部取完同样只记一次；中途抛出异常时计为出错
+    assert len(list(fms.iter_flights())) == len(fms.flights)
+    assert hist.count == 2
+
+    def failing(*args, **kwargs):
+        yield fms.flights[0]
+        raise RuntimeError("boom")
+    m.detach()
+    monkeypatch.setattr(fms, "iter_flights", failing)
+    m.attach(fms)
+    with pytest.raises(RuntimeError):
+        list(fms.iter_flights())
+    assert hist.count == 3 and hist.errors == 1
+
+
+#Prometheus文本格式：每个指标先有HELP和TYPE，直方图的le桶累计且以+Inf结尾，+Inf桶等于_count，另有_sum
+def test_prometheus_output_well_formed():
+    fms = make_fms()
+    m = Metrics().attach(fms)
+    for f in fms.flights[:5]:
+        fms.buy_ticket("U1", f.flight_id, 1)
+    fms.alternate_flights(fms.flights[0].departure_city, fms.flights[1].destination_city)
+    text = m.to_prometheus()
+    assert text.endswith("\n")
+
+    helped, typed, samples = set(), {}, []
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split()[2])
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert name in helped and kind in ("histogram", "counter", "gauge")
+            typed[name] = kind
+        else:
+            match = re.fullmatch(r'([a-z_]+)(?:\{(.*)\})? (\S+)', line)
+            assert match, line
+            float(match.group(3))
+            samples.append(match.groups())
+
+    buckets = {}
+    for name, labels, value in samples:
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in typed else name
+        assert family in typed, name
+        if typed[family] == "histogram":
+            labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+            series = buckets.setdefault(labels["method"], {"le": [], "sum": None, "count": None})
+            if name.endswith("_bucket"):
+                series["le"].append((labels["le"], float(value)))
+            else:
+                series[name.rsplit("_", 1)[1]] = float(value)
+
+    assert set(buckets) == set(metrics.INSTRUMENTED)
+    for method, series in buckets.items():
+        les = [le for le, _ in series["le"]]
+        counts = [c for _, c in series["le"]]
+        assert les[-1] == "+Inf" and [float(le) for le in les] == sorted(float(le) for le in les)
+        assert counts == sorted(counts) and counts[-1] == series["count"]
+        assert series["sum"] is not None and series["sum"] >= 0
+    assert buckets["buy_ticket"]["count"] == 5
+    assert typed["flight_call_errors_total"] == "counter"
+    assert typed["flight_graph_flights"] == "gauge"
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import pytest
+
+import main
+from main import read_wal
+from service import FlightService
+from test_storage import dataset, state  # noqa: F401 (dataset为fixture)
+
+
+#一个客户端连接：逐行发送请求并读取响应
+class Client:
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def call(self, op, **params):
+        self.writer.write(json.dumps({"op": op, **params}).encode() + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+#在端口0上启动服务，执行scenario(服务, 端口)后关闭；关闭时不应有未处理的异常被记录
+def run_service(fms, scenario, caplog):
+    async def runner():
+        service = FlightService(fms)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            await scenario(service, port)
+        finally:
+            await service.close()
+        assert not service.handlers
+
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        asyncio.run(runner())
+    assert not caplog.records, caplog.text
+
+
+#读写操作往返；启用日志时写操作的答复须在其事务写入日志之后才发出
+@pytest.mark.parametrize("wal", ["off", "group"])
+def test_service_round_trip(dataset, caplog, monkeypatch, wal):
+    fms = main.load_system("lazy", wal=wal)
+    #放慢落盘，过早答复时日志中必然还没有该事务
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (time.sleep(0.05), fsync(fd)))
+    flt = next(f for f in fms.flights if f.is_for_sale and not f.is_cancelled)
+    fid, dep, des = flt.flight_id, flt.departure_city, flt.destination_city
+    fms.update_flight(fid, tickets=3)
+
+    def logged():
+        return len(read_wal(main.WAL_FILE)[1]) if wal != "off" else None
+
+    async def scenario(service, port):
+        client = await Client.connect(port)
+        reply = await client.call("query", dep=dep, des=des)
+        assert reply["ok"] and fid in [f["flight_id"] for f in reply["result"]["flights"]]
+        assert reply["result"]["count"] == fms.count_flights(dep, des)
+
+        before = logged()
+        reply = await client.call("buy", user_id="A", flight_id=fid, quantity=2)
+        assert reply == {"ok": True, "result": {"success": True, "message": "购票成功"}}
+        if wal != "off":
+            assert logged() == before + 1
+        assert (await client.call("buy", user_id="B", flight_id=fid, quantity=2))["result"]["success"] is False
+        assert (await client.call("reserve", user_id="B", flight_id=fid, quantity=2))["result"]["success"]
+        assert (await client.call("reserve", user_id="C", flight_id=fid))["result"]["success"]
+
+        #退票后余票3张：队首的B获得2张，C留在队列中，处理预约时补上
+        reply = await client.call("refund", user_id="A", flight_id=fid, quantity=2)
+        assert reply["result"]["success"]
+        reply = await client.call("process_reservations", flight_ids=[fid])
+        assert [(r["user_id"], r["success"]) for r in reply["result"]] == [("B", True), ("C", True)]
+        assert (await client.call("user", user_id="B"))["result"] == {fid: 2}
+        assert (await client.call("flight", flight_id=fid))["result"]["tickets"] == 0
+
+        before = logged()
+        reply = await client.call("cancel", flight_ids=[fid])
+        assert reply["result"]["cancelled"] == [fid]
+        assert reply["result"]["refunds"] == {"B": {fid: 2}, "C": {fid: 1}}
+        if wal != "off":
+            assert logged() == before + 1
+        assert (await client.call("user", user_id="C"))["result"] == {}
+
+        assert (await client.call("nope"))["error"] == "未知操作: nope"
+        assert (await client.call("buy", flight_id=fid))["error"].startswith("参数错误")
+        assert not (await client.call("metrics"))["ok"]
+        #留一个空闲连接，关闭服务时由close取消
+        await Client.connect(port)
+        await client.close()
+
+    run_service(fms, scenario, caplog)
+    expected = state(fms)
+    fms.close_wal()
+    if wal != "off":
+        assert state(main.load_system("lazy", wal="off")) != expected
+        restored = main.load_system("lazy", wal=wal)
+        assert state(restored) == expected
+        restored.close_wal()
+
+
+#多个连接同时抢购：写操作由单个写任务依次执行，不超卖；日志中的事务顺序重放后得到相同结果
+def test_service_single_writer(dataset, caplog):
+    fms = main.load_system("materialized", wal="group")
+    fids = [f.flight_id for f in fms.flights if f.is_for_sale and not f.is_cancelled][:3]
+    for fid in fids:
+        fms.update_flight(fid, tickets=5)
+
+    async def scenario(service, port):
+        clients = [await Client.connect(port) for _ in range(8)]
+
+        async def shopper(i, client):
+            for k in range(12):
+                fid = fids[(i + k) % len(fids)]
+                if k % 4 == 3:
+                    await client.call("refund", user_id=f"U{i}", flight_id=fid)
+                else:
+                    await client.call("buy", user_id=f"U{i}", flight_id=fid, quantity=1 + k % 2)
+
+        await asyncio.gather(*(shopper(i, c) for i, c in enumerate(clients)))
+        for client in clients:
+            await client.close()
+
+    run_service(fms, scenario, caplog)
+    for fid in fids:
+        held = sum(fms.tickets.holders(fid).values())
+        assert fms.flight_map[fid].tickets >= 0 and fms.flight_map[fid].tickets + held == 5
+    expected = state(fms)
+    fms.close_wal()
+    restored = main.load_system("materialized", wal="group")
+    assert state(restored) == expected
+    restored.close_wal()
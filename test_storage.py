@@ -0,0 +1,216 @@
+import json
+import os
+import random
+
+import pytest
+
+import main
+from dataSet import write_dataset
+from main import FlightManagementSystem
+
+
+#航班、持票记录和候补队列的可比较形式
+def state(fms):
+    flights = sorted((f.flight_id, f.departure_city, f.destination_city, f.departure_date,
+                      f.departure_time, f.arrival_time, f.price, f.tickets, f.is_delay,
+                      f.delay_time, f.is_cancelled, f.is_for_sale) for f in fms.flights)
+    tickets = sorted((uid, fid, c) for uid, owned in fms.tickets.items() for fid, c in owned.items())
+    reservations = {fid: [(p, uid, qty) for p, _, uid, qty in sorted(queue)]
+                    for fid, queue in fms.reservations.items()}
+    return flights, tickets, reservations
+
+
+#在tmp_path下生成数据集，并让load_system读写这里的文件
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    random.seed(4)
+    write_dataset(main.DATASET_FILE, 300)
+    return tmp_path
+
+
+#截断或损坏的快照应返回False，且不改动已加载的数据；load_system随后改用文本读取
+@pytest.mark.parametrize("keep", [0.1, 0.5, 0.9, 0.999])
+def test_truncated_snapshot_falls_back(dataset, keep):
+    fms = main.load_system("lazy", wal="off")
+    fms.buy_ticket("U1", fms.flights[0].flight_id, 2)
+    fms.write_snapshot(main.SNAPSHOT_FILE, main.DATASET_FILE)
+    expected = state(fms)
+    assert state(main.load_system("lazy", wal="off")) == expected
+
+    with open(main.SNAPSHOT_FILE, "rb") as f:
+        data = f.read()
+    with open(main.SNAPSHOT_FILE, "wb") as f:
+        f.write(data[:int(len(data) * keep)])
+    #截断改变不了源文件签名，快照仍被当作最新版本读取
+    assert not fms.load_snapshot(main.SNAPSHOT_FILE, main.DATASET_FILE)
+    assert state(fms) == expected
+
+    fresh = main.load_system("lazy", wal="off")
+    assert len(fresh.flights) == 300 and not fresh.tickets.user_ids()
+
+
+#随机执行会写日志的各类操作：购票、退票、预约、修改、延误、取消、增删航班
+def random_ops(fms, ops, seed):
+    rng = random.Random(seed)
+    for i in range(ops):
+        ids = list(fms.flight_map)
+        fid = rng.choice(ids)
+        uid = f"U{rng.randrange(8)}"
+        r = rng.random()
+        if r < 0.35:
+            fms.buy_ticket(uid, fid, rng.randint(1, 3))
+        elif r < 0.5:
+            owned = fms.tickets.flights(uid)
+            if owned:
+                fms.refund_ticket(uid, rng.choice(list(owned)), 1)
+        elif r < 0.6:
+            fms.reserve_ticket(uid, fid, rng.randint(0, 2), rng.randint(1, 2))
+        elif r < 0.7:
+            fms.update_flight(fid, price=float(rng.randint(200, 1000)), tickets=rng.randint(0, 3))
+        elif r < 0.78:
+            fms.delay_flights(rng.randint(10, 90), flight_ids=rng.sample(ids, 3))
+        elif r < 0.84:
+            fms.cancel_flights(flight_ids=[fid])
+        elif r < 0.9:
+            flt = fms.flight_map[fid]
+            fms.add_flight(main.Flight(f"W{seed}_{i}", flt.destination_city, flt.departure_city,
+                                       "None", flt.departure_date, "06:00", "08:30", 500, 5, 0, 0, 0, 1))
+        elif r < 0.95:
+            fms.delete_flight_by_id(fid)
+        else:
+            fms.do_priority_queue()
+
+
+#日志重放：重新启动后航班、持票记录和预约队列应与关闭前一致
+@pytest.mark.parametrize("sync", ["always", "group", "none"])
+def test_wal_replay_after_restart(dataset, sync):
+    fms = main.load_system("lazy", wal=sync)
+    random_ops(fms, 300, 1)
+    expected = state(fms)
+    fms.close_wal()
+
+    again = main.load_system("lazy", wal=sync)
+    assert state(again) == expected
+    #续写后再次重启，两段日志依次重放
+    random_ops(again, 100, 2)
+    expected = state(again)
+    again.close_wal()
+    third = main.load_system("lazy", wal=sync)
+    assert state(third) == expected
+    third.close_wal()
+
+
+#最后一个事务只写了一半(崩溃)：重放到前一个事务为止，续写时截掉残缺部分
+def test_wal_torn_last_record(dataset):
+    fms = main.load_system("materialized", wal="always")
+    random_ops(fms, 100, 3)
+    before = state(fms)
+    flt = next(f for f in fms.flights if f.is_for_sale and not f.is_cancelled and f.tickets)
+    assert fms.buy_ticket("U9", flt.flight_id, 1)[0]
+    after = state(fms)
+    fms.close_wal()
+
+    with open(main.WAL_FILE, "rb") as f:
+        data = f.read()
+    last = data.rindex(b"\n", 0, len(data) - 1) + 1
+    with open(main.WAL_FILE, "wb") as f:
+        f.write(data[:last + (len(data) - last) // 2])
+    again = main.load_system("materialized", wal="always")
+    assert state(again) == before != after
+
+    again.buy_ticket("U9", flt.flight_id, 1)
+    again.close_wal()
+    assert state(main.load_system("materialized", wal="always")) == after
+
+
+#日志首行记录的数据签名与当前数据不符时不重放，日志改名为.stale
+def test_wal_stale_base(dataset):
+    fms = main.load_system("lazy", wal="always")
+    random_ops(fms, 50, 4)
+    fms.close_wal()
+    fresh = main.load_system("lazy", wal="off")
+
+    #数据集被替换：签名改变，旧日志不能套用到新数据上
+    with open(main.DATASET_FILE, "a", encoding="utf-8") as f:
+        f.write("\n")
+    again = main.load_system("lazy", wal="always")
+    assert os.path.exists(main.WAL_FILE + ".stale")
+    assert state(again) == state(fresh)
+    assert not again.tickets.user_ids() and not again.reservations
+    again.close_wal()
+
+
+#日志事务数超过阈值时自动写快照并压缩日志，重启后从快照加压缩后的日志恢复
+def test_wal_auto_checkpoint(dataset):
+    fms = main.load_system("lazy", wal="off")
+    base = ["dataset", *main.source_signature(main.DATASET_FILE)]
+    fms.open_wal(main.WAL_FILE, base, "always", main.SNAPSHOT_FILE, main.DATASET_FILE, compact_every=20)
+    random_ops(fms, 200, 5)
+    expected = state(fms)
+    assert os.path.exists(main.SNAPSHOT_FILE)
+    fms.close_wal()
+
+    with open(main.WAL_FILE, "rb") as f:
+        header = json.loads(f.readline())
+    assert header["base"] == ["snapshot", *main.source_signature(main.SNAPSHOT_FILE)]
+    again = main.load_system("lazy", wal="always")
+    assert state(again) == expected
+    again.close_wal()
+
+
+#执行同样的随机操作后，使用存储后端的系统与纯内存实现的各种查询结果和顺序应一致
+def check_store_queries(store, memory):
+    assert state(store) == state(memory)
+    sample = memory.flights[0]
+    filters = [(None, None, None), (sample.departure_city, None, None),
+               (sample.departure_city, sample.destination_city, None),
+               (None, sample.destination_city, None),
+               (sample.departure_city, None, sample.departure_date), ("Nowhere", None, None)]
+    for dep, des, date in filters:
+        for only_for_sale in (False, True):
+            assert store.count_flights(dep, des, only_for_sale, date) == \
+                memory.count_flights(dep, des, only_for_sale, date)
+            for sort_by in (None, "票价", "出发时间"):
+                got = [f.flight_id for f in store.query_flights(dep, des, only_for_sale, sort_by, date)]
+                want = [f.flight_id for f in memory.query_flights(dep, des, only_for_sale, sort_by, date)]
+                assert got == want, (dep, des, date, only_for_sale, sort_by)
+
+
+#列式FlightStore(需要NumPy)与内存实现的查询结果一致，删除过半触发压缩后仍一致
+def test_flight_store_matches_memory(dataset):
+    pytest.importorskip("numpy")
+    memory = FlightManagementSystem("lazy")
+    columnar = FlightManagementSystem("lazy", use_store=True)
+    assert isinstance(columnar.store, main.FlightStore)
+    for fms in (memory, columnar):
+        fms.read_dataset(main.DATASET_FILE)
+        random_ops(fms, 300, 7)
+    check_store_queries(columnar, memory)
+
+    for fms in (memory, columnar):
+        for f in list(fms.flights[::2]):
+            fms.delete_flight_by_id(f.flight_id)
+        random_ops(fms, 100, 8)
+    check_store_queries(columnar, memory)
+
+
+#SQLite存储与内存实现的查询一致，从数据库重新启动后数据不变
+@pytest.mark.parametrize("mode", ["lazy", "materialized"])
+def test_sqlite_matches_memory(dataset, mode):
+    memory = FlightManagementSystem(mode)
+    db = FlightManagementSystem(mode, db_path=str(dataset / "flights.db"))
+    for fms in (memory, db):
+        fms.read_dataset(main.DATASET_FILE)
+        random_ops(fms, 300, 6)
+    check_store_queries(db, memory)
+    db.store.close()
+
+    #预约队列只在内存中，不随数据库保存
+    restored = FlightManagementSystem(mode, db_path=str(dataset / "flights.db"))
+    assert restored.load_storage()
+    assert state(restored)[:2] == state(memory)[:2]
+    assert [f.flight_id for f in restored.flights] == [f.flight_id for f in memory.flights]
+    for f in memory.flights:
+        assert restored.successors(f.flight_id) == memory.successors(f.flight_id)
+    restored.store.close()